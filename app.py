@@ -1,16 +1,145 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, g, send_file, abort, \
+    make_response, Response, stream_with_context, has_request_context
 from flask_sqlalchemy import SQLAlchemy
-from PIL import Image
+from markupsafe import Markup
 import os
-import cv2
-import numpy as np
+import csv
+import gzip
+import io
 import json
-from sqlalchemy import text, inspect
-from datetime import datetime, timezone
+import random
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import multiprocessing
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, OrderedDict, namedtuple
+from functools import wraps
+from sqlalchemy import text, inspect, func, event, select, bindparam
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone, timedelta
+from werkzeug.utils import import_string, safe_join
+from metrics import MetricsRegistry, COUNT_BUCKETS
+from storage import original_key, thumbnail_key, image_mimetype
+from assets import AssetManifest, precompressed_variant, load_vendor_lock, DIST_DIR, MANIFEST_NAME, MIMETYPES
+from qr_decoder import decode_qr, decode_qr_multi, decode_path, DecodeResult, DetectedCode, MultiDecodeResult
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
+# База данных: DATABASE_URL переключает те же модели на другой SQL-бэкенд (например, PostgreSQL)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///users.db'). \
+    replace('postgres://', 'postgresql://', 1)
 app.config['SECRET_KEY'] = 'your_secret_key'
+# PRAGMA для каждого нового соединения SQLite: WAL (чтение не ждет записи), ожидание блокировки
+# до busy_timeout мс вместо ошибки "database is locked", кэш страниц (КиБ при отрицательном значении) и mmap
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 10000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+# Пул соединений на процесс: не меньше числа потоков gunicorn (--threads в Procfile)
+app.config['DB_POOL_SIZE'] = 16
+app.config['DB_POOL_MAX_OVERFLOW'] = 4
+app.config['DB_POOL_TIMEOUT'] = 30
+app.config['DB_POOL_RECYCLE'] = 1800
+# Повтор транзакции при временной блокировке: число попыток и пауза в секундах (растет вдвое до максимума)
+app.config['DB_RETRY_ATTEMPTS'] = 5
+app.config['DB_RETRY_DELAY'] = 0.05
+app.config['DB_RETRY_MAX_DELAY'] = 1.0
+# Метрики (/metrics): запросов к базе за один HTTP-запрос, после которых пишется предупреждение о N+1;
+# если задан METRICS_TOKEN, /metrics требует заголовок Authorization: Bearer <токен>
+app.config['METRICS_QUERY_BUDGET'] = 30
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# Кэш пользователей и компаний (на процесс): размер и время жизни записи в секундах
+app.config['IDENTITY_CACHE_SIZE'] = 1024
+app.config['IDENTITY_CACHE_TTL'] = 60
+# Пакетная загрузка: число процессов распознавания и ограничения на пакет
+app.config['DECODE_POOL_WORKERS'] = os.cpu_count() or 2
+app.config['BATCH_UPLOAD_MAX_FILES'] = 500
+app.config['BATCH_UPLOAD_MAX_FILE_SIZE'] = 50 * 1024 * 1024
+# Кэш результатов распознавания по хешу файла: в памяти процесса и в общем для всех процессов файле SQLite
+app.config['DECODE_CACHE_SIZE'] = 4096
+app.config['DECODE_CACHE_TTL'] = 24 * 3600
+app.config['DECODE_CACHE_PATH'] = os.path.join(app.instance_path, 'decode_cache.db')
+app.config['DECODE_CACHE_MAX_AGE'] = 30 * 24 * 3600
+# Кэш отрисованных таблиц страниц: записей в памяти процесса, их время жизни и наибольший размер записи
+# в памяти (байт); общий для процессов файл (None — только память) и срок хранения записей в нем
+app.config['FRAGMENT_CACHE_SIZE'] = 256
+app.config['FRAGMENT_CACHE_TTL'] = 3600
+app.config['FRAGMENT_CACHE_MAX_ENTRY'] = 8 * 1024 * 1024
+app.config['FRAGMENT_CACHE_PATH'] = os.path.join(app.instance_path, 'fragment_cache.db')
+app.config['FRAGMENT_CACHE_MAX_AGE'] = 7 * 24 * 3600
+# Очередь фонового распознавания (upload_qr с async=1), обрабатывается процессами decode_worker.py
+app.config['DECODE_JOB_WORKERS'] = os.cpu_count() or 2
+app.config['DECODE_JOB_DIR'] = os.path.join(app.instance_path, 'decode_jobs')
+app.config['DECODE_JOB_POLL_INTERVAL'] = 0.5
+app.config['DECODE_JOB_TIMEOUT'] = 300
+app.config['DECODE_JOB_MAX_ATTEMPTS'] = 3
+app.config['DECODE_JOB_MAX_QUEUE'] = 1000
+app.config['DECODE_JOB_RETENTION'] = 24 * 3600
+# Хранилище изображений товаров: класс бэкенда и его параметры
+app.config['UPLOAD_STORAGE_BACKEND'] = 'storage.LocalStorage'
+app.config['UPLOAD_STORAGE_OPTIONS'] = {'root': 'uploads'}
+app.config['UPLOAD_IMAGE_MAX_AGE'] = 365 * 24 * 3600
+# Массовые операции с товарами: максимум товаров в одном запросе
+app.config['BULK_PRODUCTS_MAX'] = 1000
+# Импорт товаров из CSV/NDJSON: строк в одной пачке (один executemany и одна транзакция), ошибок в отчете
+app.config['IMPORT_BATCH_SIZE'] = 2000
+app.config['IMPORT_MAX_ERRORS'] = 100
+# Пакеты сканирования со страницы сканера: максимум записей в одном запросе
+app.config['SCAN_BATCH_MAX'] = 500
+# Поток событий заявок (SSE): интервалы в секундах. Соединение закрывается через SSE_MAX_DURATION,
+# браузер переподключается сам и продолжает с Last-Event-ID. Каждое соединение занимает поток gunicorn
+# (Procfile: gthread, --workers 2 --threads 16), поэтому на процесс их не больше SSE_MAX_STREAMS — 4 из 16
+# потоков; остальным — 503, страница повторит подключение позже
+app.config['SSE_HEARTBEAT'] = 15
+app.config['SSE_POLL_INTERVAL'] = 2
+app.config['SSE_MAX_DURATION'] = 30
+app.config['SSE_MAX_STREAMS'] = 4
+app.config['SSE_RETRY_MS'] = 3000
+app.config['REQUEST_EVENT_RETENTION'] = 7 * 24 * 3600
+# Собранные статические ресурсы (python assets.py build): каталог сборки и срок кэширования в браузере.
+# В имени файла хеш содержимого, поэтому срок максимальный, а новая версия получает новый адрес
+app.config['ASSET_DIST_DIR'] = DIST_DIR
+app.config['ASSET_MAX_AGE'] = 365 * 24 * 3600
+def database_engine_options(uri):
+    """Параметры движка SQLAlchemy для выбранного бэкенда"""
+    if uri.startswith('sqlite') and (':memory:' in uri or uri.rstrip('/') == 'sqlite:'):
+        # База в памяти живет в одном соединении, пул не настраивается
+        return {}
+    options = {
+        'pool_size': app.config['DB_POOL_SIZE'],
+        'max_overflow': app.config['DB_POOL_MAX_OVERFLOW'],
+        'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+        'pool_recycle': app.config['DB_POOL_RECYCLE'],
+    }
+    if uri.startswith('sqlite'):
+        # Соединение из пула используют разные потоки по очереди, не одновременно
+        options['connect_args'] = {'check_same_thread': False}
+    else:
+        # Сетевой сервер может закрыть простаивающее соединение
+        options['pool_pre_ping'] = True
+    return options
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', database_engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
 db = SQLAlchemy(app)
+@event.listens_for(Engine, 'connect')
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
 # Модели
 class Company(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -41,15 +170,51 @@ class Product(db.Model):
     company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
     shelf_id = db.Column(db.Integer, db.ForeignKey('shelf.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # SHA-256 снимка, с которого добавлен товар (ключ в хранилище изображений)
+    image_hash = db.Column(db.String(64), nullable=True)
+    # Идемпотентный ключ сканирования, сгенерированный клиентом: повтор пакета не создает дубликатов
+    scan_key = db.Column(db.String(64), nullable=True)
+    # Товарная позиция: разобранное содержимое QR, общее для всех единиц с одинаковой этикеткой
+    sku_id = db.Column(db.Integer, db.ForeignKey('sku.id'), nullable=True)
     requests = db.relationship('Request', backref='product', lazy=True)
+    # Индексы под основные выборки: по компании, работнику, полке и дате
+    __table_args__ = (
+        db.Index('ix_product_company_id_id', 'company_id', 'id'),
+        db.Index('ix_product_company_user_id', 'company_id', 'user_id', 'id'),
+        db.Index('ix_product_company_shelf_id', 'company_id', 'shelf_id', 'id'),
+        db.Index('ix_product_company_created', 'company_id', 'created_at'),
+        db.Index('ix_product_company_image', 'company_id', 'image_hash'),
+        db.Index('ix_product_company_scan_key', 'company_id', 'scan_key', unique=True),
+        db.Index('ix_product_company_sku_shelf', 'company_id', 'sku_id', 'shelf_id'),
+    )
     def __repr__(self):
         return f'<Product {self.qr_content}>'
+class Sku(db.Model):
+    """Товарная позиция компании: поля QR-этикетки, разобранные один раз; key_hash — SHA-1 нормализованного JSON"""
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
+    key_hash = db.Column(db.String(40), nullable=False)
+    article = db.Column(db.String(255), nullable=False, default='')
+    name = db.Column(db.String(255), nullable=False, default='')
+    price = db.Column(db.String(64), nullable=False, default='')
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    products = db.relationship('Product', backref='sku', lazy=True)
+    __table_args__ = (
+        db.UniqueConstraint('company_id', 'key_hash', name='unique_sku_per_company'),
+        db.Index('ix_sku_company_article', 'company_id', 'article'),
+    )
+    def __repr__(self):
+        return f'<Sku {self.article}>'
 class Shelf(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
     products = db.relationship('Product', backref='shelf', lazy=True)
+    __table_args__ = (
+        db.Index('ix_shelf_company_user', 'company_id', 'user_id'),
+    )
     def __repr__(self):
         return f'<Shelf {self.name}>'
 class Request(db.Model):
@@ -62,34 +227,1368 @@ class Request(db.Model):
     request_type = db.Column(db.String(50), default='order')
     priority = db.Column(db.String(20), default='medium')
     description = db.Column(db.Text)
+    __table_args__ = (
+        db.Index('ix_request_company_id_id', 'company_id', 'id'),
+        db.Index('ix_request_company_status_id', 'company_id', 'status', 'id'),
+        db.Index('ix_request_company_customer_id', 'company_id', 'customer_id', 'id'),
+        # Одна заявка заказчика на товар; заявки без товара (product_id NULL) не ограничены
+        db.Index('ix_request_customer_product_unique', 'customer_id', 'product_id', unique=True),
+    )
     def __repr__(self):
         return f'<Request {self.id}>'
-# Папка для загрузок
-UPLOAD_FOLDER = 'uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+class StatCounter(db.Model):
+    """Счетчики для дашбордов, обновляются в той же транзакции, что и данные"""
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
+    scope = db.Column(db.String(40), nullable=False)
+    name = db.Column(db.String(64), nullable=False, default='')
+    value = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.UniqueConstraint('company_id', 'scope', 'name', name='unique_stat_counter'),)
+    def __repr__(self):
+        return f'<StatCounter {self.company_id}:{self.scope}:{self.name}={self.value}>'
+class DataVersion(db.Model):
+    """Версия данных компании (name — 'products') или пользователя ('products:5'): растет при каждой записи"""
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
+    name = db.Column(db.String(64), nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (db.UniqueConstraint('company_id', 'name', name='unique_data_version'),)
+    def __repr__(self):
+        return f'<DataVersion {self.company_id}:{self.name}={self.version}>'
+class RequestEvent(db.Model):
+    """Журнал изменений заявок для потока SSE; id события передается клиенту как Last-Event-ID"""
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    request_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # created, updated, cancelled
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    __table_args__ = (
+        db.Index('ix_request_event_company_id', 'company_id', 'id'),
+        db.Index('ix_request_event_company_customer_id', 'company_id', 'customer_id', 'id'),
+    )
+    def __repr__(self):
+        return f'<RequestEvent {self.id} {self.kind} {self.request_id}>'
+class DecodeJob(db.Model):
+    """Задание фонового распознавания: файл сохранен на диск, результат — JSON ответа upload_qr"""
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    mode = db.Column(db.String(10), nullable=False, default='single')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    path = db.Column(db.String(255), nullable=False)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    __table_args__ = (db.Index('ix_decode_job_status_id', 'status', 'id'),)
+    def __repr__(self):
+        return f'<DecodeJob {self.id} {self.status}>'
+class TTLCache:
+    """Потокобезопасный LRU-кэш с ограничением размера и временем жизни записей"""
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+    def pop_where(self, predicate):
+        """Удалить записи, для ключей которых predicate(key) истинно; возвращает их число"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    def __len__(self):
+        return len(self._data)
+# Идентификация пользователя: снимки записей вместо ORM-объектов, чтобы их можно было держать в кэше
+CachedUser = namedtuple('CachedUser', 'id email role company_id')
+CachedCompany = namedtuple('CachedCompany', 'id domain name')
+identity_cache = TTLCache(app.config['IDENTITY_CACHE_SIZE'], app.config['IDENTITY_CACHE_TTL'])
+def get_cached_user(user_id):
+    key = ('user', user_id)
+    cached = identity_cache.get(key)
+    if cached is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        cached = CachedUser(user.id, user.email, user.role, user.company_id)
+        identity_cache.set(key, cached)
+    return cached
+def cache_company(company):
+    cached = CachedCompany(company.id, company.domain, company.name)
+    identity_cache.set(('company', company.id), cached)
+    identity_cache.set(('domain', company.domain), cached)
+    return cached
+def get_cached_company(company_id):
+    cached = identity_cache.get(('company', company_id))
+    if cached is None:
+        company = db.session.get(Company, company_id)
+        if company is None:
+            return None
+        cached = cache_company(company)
+    return cached
+def get_company_by_domain(domain):
+    cached = identity_cache.get(('domain', domain))
+    if cached is None:
+        company = Company.query.filter_by(domain=domain).first()
+        if company is None:
+            return None
+        cached = cache_company(company)
+    return cached
+def invalidate_user(user_id):
+    identity_cache.pop(('user', user_id))
+def invalidate_company(company_id, domain=None):
+    identity_cache.pop(('company', company_id))
+    if domain is not None:
+        identity_cache.pop(('domain', domain))
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def user_changed(mapper, connection, target):
+    invalidate_user(target.id)
+@event.listens_for(Company, 'after_update')
+@event.listens_for(Company, 'after_delete')
+def company_changed(mapper, connection, target):
+    # Домен мог измениться: сбрасываем и старый, и новый ключ
+    history = db.inspect(target).attrs.domain.history
+    for domain in list(history.deleted or []) + [target.domain]:
+        invalidate_company(target.id, domain)
+def load_identity():
+    user_id = session.get('user_id')
+    company_id = session.get('company_id')
+    if user_id is None or company_id is None:
+        return None
+    user = get_cached_user(user_id)
+    if user is None or user.company_id != company_id:
+        return None
+    return user
+def current_user():
+    """Пользователь текущего запроса (или None); загружается один раз на запрос"""
+    if 'identity' not in g:
+        g.identity = load_identity()
+    return g.identity
+def login_required(role=None, json_response=None):
+    """Проверка входа и роли. Для API-маршрутов json_response задает ответ вместо редиректа"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            user = current_user()
+            if user is None:
+                if json_response is not None:
+                    return jsonify(json_response)
+                flash('Пожалуйста, войдите в систему.', 'danger')
+                return redirect(url_for('login'))
+            if role is not None and user.role != role:
+                if json_response is not None:
+                    return jsonify(json_response)
+                flash('У вас нет доступа к этой странице.', 'danger')
+                return redirect(url_for('login'))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+# Повтор транзакций при временной блокировке базы (SQLite: busy_timeout истек, PostgreSQL: deadlock
+# или конфликт сериализации). Транзакция откатывается и выполняется заново после паузы с разбросом,
+# чтобы конкурирующие процессы не повторяли попытки одновременно.
+def is_transient_db_error(error):
+    message = str(getattr(error, 'orig', error)).lower()
+    return any(marker in message for marker in ('database is locked', 'database table is locked',
+                                            'deadlock detected', 'could not serialize'))
+def retry_delays():
+    delay = app.config['DB_RETRY_DELAY']
+    for _ in range(app.config['DB_RETRY_ATTEMPTS'] - 1):
+        yield delay * random.uniform(0.5, 1.5)
+        delay = min(delay * 2, app.config['DB_RETRY_MAX_DELAY'])
+def run_with_db_retry(work, before_retry=None):
+    delays = retry_delays()
+    while True:
+        try:
+            return work()
+        except OperationalError as e:
+            db.session.rollback()
+            delay = next(delays, None)
+            if delay is None or not is_transient_db_error(e):
+                raise
+            app.logger.warning("Transient database error, retrying in %.2fs: %s", delay, e.orig)
+            time.sleep(delay)
+            if before_retry is not None:
+                before_retry()
+def commit_with_retry(work):
+    """Выполнить work() и commit; при временной блокировке откатить и повторить work() целиком"""
+    def attempt():
+        result = work()
+        db.session.commit()
+        return result
+    return run_with_db_retry(attempt)
+def rewind_uploads():
+    for _, file in request.files.items(multi=True):
+        file.stream.seek(0)
+def retry_on_lock(view):
+    """Повторить изменяющий маршрут целиком при временной блокировке базы (маршрут сам делает commit)"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        return run_with_db_retry(lambda: view(*args, **kwargs), rewind_uploads)
+    return wrapped
+# Метрики: время ответа по маршрутам, число и время SQL-запросов на запрос, распознавание QR.
+# Запросы к базе считаются через события движка; запросы потоковых ответов (SSE, выгрузка),
+# выполненные после отправки заголовков, попадают только в общие счетчики маршрута.
+metrics = MetricsRegistry()
+http_requests = metrics.counter('http_requests_total', 'HTTP-запросы по маршруту, методу и статусу')
+http_duration = metrics.histogram('http_request_duration_seconds', 'Время ответа по маршруту')
+db_queries = metrics.counter('db_queries_total', 'SQL-запросы по маршруту')
+db_query_seconds = metrics.counter('db_query_seconds_total', 'Суммарное время SQL-запросов по маршруту')
+db_queries_per_request = metrics.histogram('db_queries_per_request', 'SQL-запросов на HTTP-запрос', COUNT_BUCKETS)
+db_time_per_request = metrics.histogram('db_time_per_request_seconds', 'Время SQL-запросов на HTTP-запрос')
+db_budget_exceeded = metrics.counter('db_query_budget_exceeded_total',
+                                     'HTTP-запросы, превысившие METRICS_QUERY_BUDGET (вероятный N+1)')
+qr_decodes = metrics.counter('qr_decode_total', 'Распознавания QR по режиму, результату и уровню кэша')
+qr_decode_duration = metrics.histogram('qr_decode_duration_seconds', 'Время распознавания QR')
+def metrics_endpoint():
+    if not has_request_context():
+        return 'background'
+    return request.endpoint or 'unmatched'
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop('query_started', time.perf_counter())
+    endpoint = metrics_endpoint()
+    db_queries.inc(endpoint=endpoint)
+    db_query_seconds.inc(elapsed, endpoint=endpoint)
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_time += elapsed
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_time = 0.0
+def record_request_metrics(status):
+    if 'request_started' not in g:
+        return
+    endpoint = metrics_endpoint()
+    http_requests.inc(endpoint=endpoint, method=request.method, status=str(status))
+    http_duration.observe(time.perf_counter() - g.pop('request_started'), endpoint=endpoint, method=request.method)
+    db_queries_per_request.observe(g.db_queries, endpoint=endpoint)
+    db_time_per_request.observe(g.db_time, endpoint=endpoint)
+    if g.db_queries > app.config['METRICS_QUERY_BUDGET']:
+        db_budget_exceeded.inc(endpoint=endpoint)
+        app.logger.warning("Query budget exceeded: %s %s issued %d queries (%.1fms), possible N+1",
+                           request.method, request.path, g.db_queries, g.db_time * 1000)
+@app.after_request
+def finish_request_metrics(response):
+    record_request_metrics(response.status_code)
+    return response
+@app.teardown_request
+def finish_failed_request_metrics(error):
+    # after_request не вызывается, если маршрут упал с исключением
+    if error is not None:
+        record_request_metrics(500)
+def record_decode(mode, found, elapsed_ms, cache):
+    """Учесть распознавание: found — код найден (True/False) или None при ошибке чтения файла"""
+    result = 'error' if found is None else ('success' if found else 'failure')
+    qr_decodes.inc(mode=mode, result=result, cache=cache or 'miss')
+    if found is not None:
+        qr_decode_duration.observe(elapsed_ms / 1000, mode=mode, cache=cache or 'miss')
+# Версии данных для условных GET. Каждая запись товара, полки или заявки увеличивает версию ресурса
+# компании и версию владельца записи; по ним read-API отдают ETag/Last-Modified и отвечают 304,
+# не выполняя выборку. Версия читается до выборки: при гонке клиент получит новые данные со старым
+# ETag и просто запросит их еще раз.
+def dialect_insert():
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+def bump_data_versions(connection, keys):
+    """keys — набор (company_id, ресурс, user_id); user_id=None — только версия компании"""
+    names = set()
+    for company_id, resource, user_id in keys:
+        names.add((company_id, resource))
+        if user_id is not None:
+            names.add((company_id, f'{resource}:{user_id}'))
+    now = datetime.now(timezone.utc)
+    insert = dialect_insert()
+    # Фрагменты этих компаний в памяти процесса удаляются после commit (drop_changed_fragments)
+    db.session.info.setdefault('changed_companies', set()).update(company_id for company_id, _ in names)
+    for company_id, name in sorted(names):
+        stmt = insert(DataVersion).values(company_id=company_id, name=name, version=1, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['company_id', 'name'],
+            set_={'version': DataVersion.version + 1, 'updated_at': now}
+        )
+        connection.execute(stmt)
+def data_version_key(obj):
+    if isinstance(obj, Product):
+        return obj.company_id, 'products', obj.user_id
+    if isinstance(obj, Shelf):
+        return obj.company_id, 'shelves', obj.user_id
+    if isinstance(obj, Request):
+        return obj.company_id, 'requests', obj.customer_id
+    return None
+@event.listens_for(Session, 'after_flush')
+def data_changed(session, flush_context):
+    keys = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        key = data_version_key(obj)
+        if key is not None:
+            keys.add(key)
+    if keys:
+        bump_data_versions(session.connection(), keys)
+# События заявок. Строки request_event пишутся в той же транзакции, что и заявка; после commit
+# потоки SSE этого процесса будят сразу, потоки других процессов gunicorn находят события опросом таблицы.
+class EventBroker:
+    """Оповещение потоков SSE текущего процесса о закоммиченных событиях"""
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.generation = 0
+    def publish(self):
+        with self._condition:
+            self.generation += 1
+            self._condition.notify_all()
+    def wait(self, generation, timeout):
+        """Ждать событий новее generation не дольше timeout секунд"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.generation != generation, timeout)
+            return self.generation
+request_event_broker = EventBroker()
+class StreamSlots:
+    """Счетчик открытых потоков SSE процесса: не больше SSE_MAX_STREAMS потоков gunicorn заняты ими"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+    def acquire(self):
+        with self._lock:
+            if self.active >= app.config['SSE_MAX_STREAMS']:
+                return False
+            self.active += 1
+            return True
+    def release(self):
+        with self._lock:
+            self.active -= 1
+sse_streams = StreamSlots()
+def request_event_kind(session, request_item):
+    if request_item in session.new:
+        return 'created'
+    if request_item in session.deleted:
+        return None
+    if not session.is_modified(request_item, include_collections=False):
+        return None
+    return 'cancelled' if request_item.status == 'cancelled' else 'updated'
+@event.listens_for(Session, 'after_flush')
+def record_request_events(session, flush_context):
+    now = datetime.now(timezone.utc)
+    rows = []
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Request):
+            kind = request_event_kind(session, obj)
+            if kind:
+                rows.append({'company_id': obj.company_id, 'customer_id': obj.customer_id,
+                             'request_id': obj.id, 'kind': kind, 'created_at': now})
+    if rows:
+        session.connection().execute(RequestEvent.__table__.insert(), rows)
+        session.info['request_events'] = True
+@event.listens_for(Session, 'after_commit')
+def publish_request_events(session):
+    if session.info.pop('request_events', False):
+        request_event_broker.publish()
+@event.listens_for(Session, 'after_rollback')
+def discard_request_events(session):
+    session.info.pop('request_events', None)
+def load_data_versions(company_id, names):
+    rows = db.session.query(DataVersion.name, DataVersion.version, DataVersion.updated_at). \
+        filter(DataVersion.company_id == company_id, DataVersion.name.in_(names)).all()
+    return {row.name: (row.version, row.updated_at) for row in rows}
+def versioned(*names):
+    """Условный GET для JSON-маршрута. names — ресурсы ('products', 'shelves:{user_id}')
+    или одна функция user -> список ресурсов. Ставится после login_required."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            user = current_user()
+            resources = names[0](user) if callable(names[0]) else [name.format(user_id=user.id) for name in names]
+            versions = load_data_versions(session['company_id'], resources)
+            tag = '-'.join(str(versions.get(name, (0, None))[0]) for name in resources)
+            etag = f"{user.id}-{tag}-{zlib.crc32(request.query_string):x}"
+            updated = [updated_at for _, updated_at in versions.values() if updated_at is not None]
+            last_modified = max(updated).replace(tzinfo=timezone.utc) if updated else None
+            not_modified = etag in request.if_none_match
+            # If-Modified-Since с точностью до секунды учитываем, только если клиент не прислал ETag
+            if not request.if_none_match and last_modified and request.if_modified_since:
+                not_modified = last_modified.replace(microsecond=0) <= request.if_modified_since
+            response = make_response('', 304) if not_modified else make_response(view(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                if last_modified:
+                    response.last_modified = last_modified
+                # Кэшировать можно, но перед использованием браузер обязан перепроверить
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            return response
+        return wrapped
+    return decorator
+EMPTY_PAGE = {"items": [], "next_cursor": None, "has_more": False}
+NOT_LOGGED_IN = {"success": False, "message": "Пожалуйста, войдите в систему."}
+# Хранилище загруженных снимков (один экземпляр на процесс)
+_storage = None
+def get_storage():
+    global _storage
+    if _storage is None:
+        backend = import_string(app.config['UPLOAD_STORAGE_BACKEND'])
+        _storage = backend(**app.config['UPLOAD_STORAGE_OPTIONS'])
+    return _storage
+def image_url(image_hash, thumbnail=False):
+    if not image_hash:
+        return None
+    if thumbnail:
+        return url_for('product_image', image_hash=image_hash, variant='thumb')
+    return url_for('product_image', image_hash=image_hash)
+asset_manifest = AssetManifest(os.path.join(app.config['ASSET_DIST_DIR'], MANIFEST_NAME))
+@app.template_global()
+def asset_url(name):
+    """Адрес статического ресурса: собранный файл с хешем из манифеста, без сборки — исходный файл"""
+    # В режиме отладки манифест перечитывается после каждой сборки
+    built = asset_manifest.lookup(name, reload=app.debug)
+    if built:
+        return url_for('asset_file', filename=built)
+    return url_for('static', filename=name)
+vendor_lock = load_vendor_lock(app.static_folder)
+@app.template_global()
+def vendor_script(name):
+    """<script> библиотеки сканера: файл из static/vendor (или его сборка), а пока библиотека не скачана —
+    адрес CDN из vendor.lock.json с integrity, если хеш закреплен"""
+    if os.path.isfile(os.path.join(app.static_folder, name)):
+        return Markup('<script src="%s"></script>') % asset_url(name)
+    entry = vendor_lock[name]
+    if entry.get('integrity'):
+        return Markup('<script src="%s" integrity="%s" crossorigin="anonymous"></script>') % (
+            entry['url'], entry['integrity'])
+    return Markup('<script src="%s"></script>') % entry['url']
 def init_database():
     """Инициализация базы данных с правильной структурой"""
     with app.app_context():
         db.create_all()
+        ensure_product_search_index()
         print("✅ База данных инициализирована успешно!")
-def decode_qr_code(image):
+# Кэш распознавания. Ключ — режим и SHA-256 содержимого файла; повторная загрузка того же снимка
+# (повтор запроса сканером, повторная отправка фото) не распознается заново.
+# Версия входит в ключ: после изменения движка распознавания старые записи просто перестают находиться.
+DECODE_CACHE_VERSION = 1
+decode_memory_cache = TTLCache(app.config['DECODE_CACHE_SIZE'], app.config['DECODE_CACHE_TTL'])
+decode_cache_counters = Counter()
+_decode_cache_local = threading.local()
+_decode_cache_lock = threading.Lock()
+def decode_cache_key(content, mode):
+    return f"{mode}:{DECODE_CACHE_VERSION}:{hashlib.sha256(content).hexdigest()}"
+def get_decode_cache_db():
+    """Соединение с файлом кэша для текущего потока; WAL позволяет читать и писать из разных процессов"""
+    conn = getattr(_decode_cache_local, 'conn', None)
+    if conn is None:
+        path = app.config['DECODE_CACHE_PATH']
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS decode_cache ("
+                     "key TEXT PRIMARY KEY, result TEXT NOT NULL, created_at REAL NOT NULL)")
+        _decode_cache_local.conn = conn
+    return conn
+def encode_decode_result(result):
+    if isinstance(result, MultiDecodeResult):
+        return json.dumps({"codes": [[code.data, code.points] for code in result.codes], "stage": result.stage})
+    return json.dumps({"data": result.data, "stage": result.stage})
+def load_decode_result(value, elapsed_ms):
+    value = json.loads(value)
+    if 'codes' in value:
+        return MultiDecodeResult([DetectedCode(data, points) for data, points in value['codes']],
+                                 value['stage'], elapsed_ms)
+    return DecodeResult(value['data'], value['stage'], elapsed_ms)
+def count_decode_cache(name):
+    with _decode_cache_lock:
+        decode_cache_counters[name] += 1
+        return decode_cache_counters[name]
+def cached_decode(content, mode, decode):
+    """Результат распознавания из кэша (память, затем файл) или decode(content) с записью в оба уровня.
+    Возвращает (результат, уровень: 'memory', 'disk' или None). Кэш необязателен: ошибки файла кэша
+    только пишутся в журнал."""
+    started = time.perf_counter()
+    key = decode_cache_key(content, mode)
+    value = decode_memory_cache.get(key)
+    if value is not None:
+        count_decode_cache('memory_hits')
+        return load_decode_result(value, (time.perf_counter() - started) * 1000), 'memory'
     try:
-        if isinstance(image, Image.Image):
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            img_np = np.array(image)
-            img_np = cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR)
-        else:
-            img_np = image
-        detector = cv2.QRCodeDetector()
-        data, bbox, _ = detector.detectAndDecode(img_np)
-        if data and bbox is not None:
-            return data
+        row = get_decode_cache_db().execute("SELECT result FROM decode_cache WHERE key = ?", (key,)).fetchone()
+    except sqlite3.Error as e:
+        app.logger.warning("Decode cache read failed: %s", e)
+        row = None
+    if row is not None:
+        count_decode_cache('disk_hits')
+        decode_memory_cache.set(key, row[0])
+        return load_decode_result(row[0], (time.perf_counter() - started) * 1000), 'disk'
+    count_decode_cache('misses')
+    result = decode(content)
+    value = encode_decode_result(result)
+    decode_memory_cache.set(key, value)
+    try:
+        get_decode_cache_db().execute(
+            "INSERT OR REPLACE INTO decode_cache (key, result, created_at) VALUES (?, ?, ?)",
+            (key, value, time.time())
+        )
+        if count_decode_cache('writes') % 1000 == 0:
+            prune_decode_cache()
+    except sqlite3.Error as e:
+        app.logger.warning("Decode cache write failed: %s", e)
+    return result, None
+def prune_decode_cache():
+    """Удалить из файла кэша записи старше DECODE_CACHE_MAX_AGE"""
+    cutoff = time.time() - app.config['DECODE_CACHE_MAX_AGE']
+    return get_decode_cache_db().execute("DELETE FROM decode_cache WHERE created_at < ?", (cutoff,)).rowcount
+def clear_decode_cache():
+    decode_memory_cache.clear()
+    get_decode_cache_db().execute("DELETE FROM decode_cache")
+def decode_cache_stats():
+    with _decode_cache_lock:
+        counters = dict(decode_cache_counters)
+    lookups = counters.get('memory_hits', 0) + counters.get('disk_hits', 0) + counters.get('misses', 0)
+    hits = lookups - counters.get('misses', 0)
+    return {
+        "memory_hits": counters.get('memory_hits', 0),
+        "disk_hits": counters.get('disk_hits', 0),
+        "misses": counters.get('misses', 0),
+        "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        "memory_size": len(decode_memory_cache)
+    }
+# Кэш отрисованных фрагментов страниц (таблицы товаров). Слот кэша — шаблон фрагмента, компания и
+# уточнение (пользователь, вид страницы); в слоте хранится HTML и тег: хеш шаблона и версии данных, из
+# которых фрагмент отрисован. Запись товара, полки или заявки увеличивает версию (DataVersion), и при
+# следующем запросе слот перерисовывается. Версии читаются до выборки, как в versioned(): при гонке
+# с записью новый HTML сохранится со старым тегом и просто будет перерисован еще раз.
+fragment_memory_cache = TTLCache(app.config['FRAGMENT_CACHE_SIZE'], app.config['FRAGMENT_CACHE_TTL'])
+fragment_cache_counters = Counter()
+fragment_template_digests = {}
+_fragment_cache_local = threading.local()
+_fragment_cache_lock = threading.Lock()
+def get_fragment_cache_db():
+    """Соединение с файлом кэша фрагментов для текущего потока; None, если файл отключен"""
+    path = app.config['FRAGMENT_CACHE_PATH']
+    if not path:
         return None
+    conn = getattr(_fragment_cache_local, 'conn', None)
+    if conn is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS fragment_cache ("
+                     "key TEXT PRIMARY KEY, tag TEXT NOT NULL, html BLOB NOT NULL, created_at REAL NOT NULL)")
+        _fragment_cache_local.conn = conn
+    return conn
+def fragment_template_digest(template):
+    """Хеш исходника шаблона: после выката нового шаблона старые записи общего файла не подходят"""
+    digest = fragment_template_digests.get(template)
+    if digest is None or app.debug:
+        source, _, _ = app.jinja_env.loader.get_source(app.jinja_env, template)
+        digest = hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]
+        fragment_template_digests[template] = digest
+    return digest
+def count_fragment_cache(template, name):
+    with _fragment_cache_lock:
+        fragment_cache_counters[(template, name)] += 1
+        return fragment_cache_counters[(template, name)]
+def cached_fragment(template, key, resources, context):
+    """HTML фрагмента для компании текущей сессии: из памяти, из файла или render_template(template,
+    **context()) с записью в оба уровня. key — уточнение слота (кортеж), resources — версии данных
+    фрагмента. Кэш необязателен: ошибки файла кэша только пишутся в журнал."""
+    company_id = session['company_id']
+    versions = load_data_versions(company_id, resources)
+    # Время изменения в теге: после пересоздания базы версии начинаются заново и совпали бы со старыми
+    updated = max((updated_at for _, updated_at in versions.values()), default=None)
+    tag = fragment_template_digest(template) + ':' + '-'.join(
+        str(versions.get(name, (0, None))[0]) for name in resources) + ':' + (updated.isoformat() if updated else '')
+    slot = (template, company_id) + tuple(key)
+    item = fragment_memory_cache.get(slot)
+    if item is not None and item[0] == tag:
+        count_fragment_cache(template, 'memory_hits')
+        return Markup(item[1])
+    disk_key = ':'.join(str(part) for part in slot)
+    try:
+        conn = get_fragment_cache_db()
+        row = conn and conn.execute("SELECT html FROM fragment_cache WHERE key = ? AND tag = ?",
+                                    (disk_key, tag)).fetchone()
+    except sqlite3.Error as e:
+        app.logger.warning("Fragment cache read failed: %s", e)
+        conn, row = None, None
+    if row:
+        count_fragment_cache(template, 'disk_hits')
+        html = zlib.decompress(row[0]).decode('utf-8')
+    else:
+        count_fragment_cache(template, 'misses')
+        html = render_template(template, **context())
+        try:
+            if conn is not None:
+                conn.execute("INSERT OR REPLACE INTO fragment_cache (key, tag, html, created_at) VALUES (?, ?, ?, ?)",
+                             (disk_key, tag, zlib.compress(html.encode('utf-8')), time.time()))
+                if count_fragment_cache(template, 'writes') % 1000 == 0:
+                    prune_fragment_cache()
+        except sqlite3.Error as e:
+            app.logger.warning("Fragment cache write failed: %s", e)
+    # Очень большие таблицы держим только в файле, чтобы несколько компаний не съели память процесса
+    if len(html) <= app.config['FRAGMENT_CACHE_MAX_ENTRY']:
+        fragment_memory_cache.set(slot, (tag, html))
+    return Markup(html)
+def invalidate_fragments(company_ids):
+    """Удалить из памяти процесса фрагменты компаний; в файле записи вытесняются по тегу версий"""
+    dropped = fragment_memory_cache.pop_where(lambda slot: slot[1] in company_ids)
+    if dropped:
+        with _fragment_cache_lock:
+            fragment_cache_counters[(None, 'invalidations')] += dropped
+    return dropped
+@event.listens_for(Session, 'after_commit')
+def drop_changed_fragments(session):
+    company_ids = session.info.pop('changed_companies', None)
+    if company_ids:
+        invalidate_fragments(company_ids)
+@event.listens_for(Session, 'after_rollback')
+def keep_unchanged_fragments(session):
+    session.info.pop('changed_companies', None)
+def prune_fragment_cache():
+    """Удалить из файла кэша записи старше FRAGMENT_CACHE_MAX_AGE"""
+    cutoff = time.time() - app.config['FRAGMENT_CACHE_MAX_AGE']
+    return get_fragment_cache_db().execute("DELETE FROM fragment_cache WHERE created_at < ?", (cutoff,)).rowcount
+def fragment_cache_stats():
+    """Обращения к кэшу фрагментов по шаблонам: попадания в память и в файл, промахи, доля попаданий"""
+    with _fragment_cache_lock:
+        counters = dict(fragment_cache_counters)
+    fragments = {}
+    for (template, name), value in counters.items():
+        if template is not None and name != 'writes':
+            fragments.setdefault(template, {"memory_hits": 0, "disk_hits": 0, "misses": 0})[name] = value
+    for row in fragments.values():
+        lookups = row['memory_hits'] + row['disk_hits'] + row['misses']
+        row['hit_rate'] = round((lookups - row['misses']) / lookups, 3) if lookups else 0.0
+    return {
+        "fragments": fragments,
+        "invalidations": counters.get((None, 'invalidations'), 0),
+        "memory_size": len(fragment_memory_cache)
+    }
+def read_upload(source):
+    """Содержимое загруженного файла: байты для хеширования; изображения в памяти не кэшируются"""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, 'read'):
+        return source.read()
+    return None
+def decode_qr_code(image):
+    """Распознать QR-код (байты, файл, PIL.Image или массив numpy); возвращает текст или None"""
+    try:
+        return decode_qr_result(image).data
     except Exception as e:
         print(f"QR decoding error: {e}")
         return None
+def decode_qr_result(source):
+    """То же с подробностями: стадия, на которой код прочитан, и время распознавания"""
+    content = read_upload(source)
+    try:
+        if content is None:
+            result, cache = decode_qr(source), None
+        else:
+            result, cache = cached_decode(content, 'single', decode_qr)
+    except Exception:
+        record_decode('single', None, 0, None)
+        raise
+    record_decode('single', result.data is not None, result.elapsed_ms, cache)
+    app.logger.info("QR decode: stage=%s time=%.1fms cache=%s",
+                    result.stage or 'failed', result.elapsed_ms, cache or 'miss')
+    return result
+def decode_qr_codes(source):
+    """Все QR-коды на снимке (паллета, полка) с углами каждого кода"""
+    content = read_upload(source)
+    try:
+        if content is None:
+            result, cache = decode_qr_multi(source), None
+        else:
+            result, cache = cached_decode(content, 'multi', decode_qr_multi)
+    except Exception:
+        record_decode('multi', None, 0, None)
+        raise
+    record_decode('multi', bool(result.codes), result.elapsed_ms, cache)
+    app.logger.info("QR multi decode: codes=%d stage=%s time=%.1fms cache=%s",
+                    len(result.codes), result.stage or 'failed', result.elapsed_ms, cache or 'miss')
+    return result
+def decode_info(result):
+    return {"stage": result.stage, "ms": round(result.elapsed_ms, 1)}
+def qr_product_data(qr_content):
+    """Данные товара из содержимого QR: JSON или просто артикул"""
+    try:
+        return json.loads(qr_content)
+    except ValueError:
+        return {"article": qr_content, "name": f"Товар (QR: {qr_content})", "price": "0"}
+# Каталог SKU. Содержимое QR разбирается один раз при записи товара: одинаковые по смыслу этикетки
+# (JSON с другим порядком ключей или пробелами) дают один key_hash и одну строку sku.
+SkuFields = namedtuple('SkuFields', 'key_hash article name price payload')
+def sku_value(value):
+    if value is None:
+        return ''
+    return value.strip() if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+def sku_fields(qr_content):
+    """Нормализованные поля SKU из содержимого QR"""
+    data = qr_product_data(qr_content)
+    if not isinstance(data, dict):
+        # Корректный JSON, но не объект (число, список) — как и обычный текст, это артикул
+        data = {"article": qr_content.strip(), "name": f"Товар (QR: {qr_content})", "price": "0"}
+    data = {key: value.strip() if isinstance(value, str) else value for key, value in data.items()}
+    payload = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return SkuFields(hashlib.sha1(payload.encode('utf-8')).hexdigest(), sku_value(data.get('article'))[:255],
+                     sku_value(data.get('name'))[:255], sku_value(data.get('price'))[:64], payload)
+def resolve_skus(connection, company_id, qr_contents):
+    """{qr_content: sku_id} для набора содержимого QR; недостающие SKU создаются (INSERT ... ON CONFLICT DO NOTHING)"""
+    fields = {qr_content: sku_fields(qr_content) for qr_content in set(qr_contents)}
+    if not fields:
+        return {}
+    unique = {f.key_hash: f for f in fields.values()}
+    now = datetime.now(timezone.utc)
+    insert = dialect_insert()
+    stmt = insert(Sku.__table__).on_conflict_do_nothing(index_elements=['company_id', 'key_hash'])
+    connection.execute(stmt, [dict(f._asdict(), company_id=company_id, created_at=now) for f in unique.values()])
+    ids = dict(connection.execute(select(Sku.key_hash, Sku.id).where(
+        Sku.company_id == company_id, Sku.key_hash.in_(list(unique)))).all())
+    return {qr_content: ids[f.key_hash] for qr_content, f in fields.items()}
+@event.listens_for(Session, 'before_flush')
+def assign_product_skus(session, flush_context, instances):
+    """Новым товарам и товарам с измененным qr_content назначается SKU до записи"""
+    pending = {}
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Product) or not obj.qr_content or obj.company_id is None:
+            continue
+        if obj.sku_id is None or db.inspect(obj).attrs.qr_content.history.has_changes():
+            pending.setdefault(obj.company_id, []).append(obj)
+    for company_id, products in pending.items():
+        skus = resolve_skus(session.connection(), company_id, [product.qr_content for product in products])
+        for product in products:
+            product.sku_id = skus[product.qr_content]
+def decode_upload_payload(source, multi=False):
+    """Распознать загруженный файл; возвращает тело JSON-ответа upload_qr"""
+    try:
+        if multi:
+            result = decode_qr_codes(source)
+            if not result.codes:
+                return {"success": False, "message": "QR-коды не найдены", "decode": decode_info(result)}
+            codes = [{"qr_content": code.data, "product": qr_product_data(code.data), "points": code.points}
+                     for code in result.codes]
+            return {"success": True, "codes": codes, "decode": decode_info(result)}
+        result = decode_qr_result(source)
+        qr_content = result.data
+        if qr_content:
+            return {"success": True, "product": qr_product_data(qr_content), "qr_content": qr_content,
+                    "decode": decode_info(result)}
+        else:
+            return {"success": False, "message": "QR-код не найден", "decode": decode_info(result)}
+    except Exception as e:
+        return {"success": False, "message": f"Ошибка при обработке файла: {str(e)}"}
+# Очередь фонового распознавания в таблице decode_job. Веб-процесс только сохраняет файл и ставит задание,
+# распознают процессы decode_worker.py; клиент опрашивает /api/decode_jobs/<id>.
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+def enqueue_decode_job(file, user, multi=False):
+    directory = app.config['DECODE_JOB_DIR']
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, uuid.uuid4().hex)
+    file.save(path)
+    job = DecodeJob(company_id=session['company_id'], user_id=user.id, mode='multi' if multi else 'single',
+                    status=JOB_QUEUED, path=path)
+    db.session.add(job)
+    db.session.commit()
+    return job
+def decode_queue_depth():
+    return DecodeJob.query.filter_by(status=JOB_QUEUED).count()
+def decode_queue_stats():
+    """Глубина очереди: задания по статусам и возраст самого старого ожидающего задания"""
+    counts = dict(db.session.query(DecodeJob.status, func.count(DecodeJob.id)).group_by(DecodeJob.status).all())
+    oldest = db.session.query(func.min(DecodeJob.created_at)).filter(DecodeJob.status == JOB_QUEUED).scalar()
+    oldest_age = 0.0
+    if oldest is not None:
+        oldest_age = (datetime.now(timezone.utc) - oldest.replace(tzinfo=timezone.utc)).total_seconds()
+    return {
+        "queued": counts.get(JOB_QUEUED, 0),
+        "running": counts.get(JOB_RUNNING, 0),
+        "done": counts.get(JOB_DONE, 0),
+        "failed": counts.get(JOB_FAILED, 0),
+        "oldest_queued_s": round(oldest_age, 1),
+        "workers": app.config['DECODE_JOB_WORKERS']
+    }
+def claim_decode_job():
+    """Взять следующее задание. Условие status='queued' в UPDATE гарантирует, что задание
+    достанется только одному из конкурирующих процессов."""
+    while True:
+        job_id = db.session.query(DecodeJob.id).filter_by(status=JOB_QUEUED).order_by(DecodeJob.id).limit(1).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+        claimed = commit_with_retry(lambda: DecodeJob.query.filter_by(id=job_id, status=JOB_QUEUED).update({
+            DecodeJob.status: JOB_RUNNING,
+            DecodeJob.started_at: datetime.now(timezone.utc),
+            DecodeJob.attempts: DecodeJob.attempts + 1
+        }, synchronize_session=False))
+        if claimed:
+            return db.session.get(DecodeJob, job_id)
+def run_decode_job(job):
+    result = error = None
+    try:
+        with open(job.path, 'rb') as f:
+            result = json.dumps(decode_upload_payload(f, job.mode == 'multi'))
+    except OSError as e:
+        error = str(e)
+    def finish():
+        job.status = JOB_FAILED if error else JOB_DONE
+        job.result = result
+        job.error = error
+        job.finished_at = datetime.now(timezone.utc)
+    commit_with_retry(finish)
+    if os.path.exists(job.path):
+        os.remove(job.path)
+def requeue_stale_decode_jobs():
+    """Вернуть в очередь задания, зависшие в running (процесс обработчика упал или был остановлен)"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=app.config['DECODE_JOB_TIMEOUT'])
+    stale = DecodeJob.query.filter(DecodeJob.status == JOB_RUNNING, DecodeJob.started_at < cutoff).all()
+    for job in stale:
+        if job.attempts >= app.config['DECODE_JOB_MAX_ATTEMPTS']:
+            job.status = JOB_FAILED
+            job.error = 'Превышено число попыток распознавания'
+            job.finished_at = datetime.now(timezone.utc)
+        else:
+            job.status = JOB_QUEUED
+    db.session.commit()
+    return len(stale)
+def prune_decode_jobs():
+    """Удалить завершенные задания старше DECODE_JOB_RETENTION вместе с файлами"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=app.config['DECODE_JOB_RETENTION'])
+    old = DecodeJob.query.filter(DecodeJob.status.in_([JOB_DONE, JOB_FAILED]), DecodeJob.finished_at < cutoff).all()
+    for job in old:
+        if os.path.exists(job.path):
+            os.remove(job.path)
+        db.session.delete(job)
+    db.session.commit()
+    return len(old)
+def run_decode_worker(stop=None, maintenance_interval=60):
+    """Цикл обработчика очереди; stop — threading.Event/multiprocessing.Event для остановки"""
+    last_maintenance = 0.0
+    while stop is None or not stop.is_set():
+        if time.monotonic() - last_maintenance > maintenance_interval:
+            requeue_stale_decode_jobs()
+            prune_decode_jobs()
+            last_maintenance = time.monotonic()
+        job = claim_decode_job()
+        if job is None:
+            time.sleep(app.config['DECODE_JOB_POLL_INTERVAL'])
+            continue
+        started = time.perf_counter()
+        run_decode_job(job)
+        app.logger.info("Decode job %s: %s in %.1fms", job.id, job.status, (time.perf_counter() - started) * 1000)
+        db.session.remove()
+# Пакетное распознавание в пуле процессов (один пул на процесс gunicorn, создается при первом вызове).
+# Процессы запускаются через spawn: fork из многопоточного gunicorn копировал бы захваченные блокировки
+# и соединения с базой; decode_path живет в qr_decoder и не требует импорта app.
+_decode_pool = None
+_decode_pool_lock = threading.Lock()
+def get_decode_pool():
+    global _decode_pool
+    with _decode_pool_lock:
+        if _decode_pool is None:
+            _decode_pool = ProcessPoolExecutor(max_workers=app.config['DECODE_POOL_WORKERS'],
+                                               mp_context=multiprocessing.get_context('spawn'))
+        return _decode_pool
+def decode_batch(paths):
+    """Распознать файлы параллельно; результаты в порядке paths"""
+    global _decode_pool
+    if not paths:
+        return []
+    chunksize = max(1, len(paths) // (app.config['DECODE_POOL_WORKERS'] * 4))
+    try:
+        results = list(get_decode_pool().map(decode_path, paths, chunksize=chunksize))
+    except BrokenProcessPool:
+        # Процесс пула упал: пересоздадим пул при следующем вызове, а этот пакет распознаем здесь
+        with _decode_pool_lock:
+            _decode_pool = None
+        app.logger.warning("Decode pool is broken, decoding batch in-process")
+        results = [decode_path(path) for path in paths]
+    for outcome in results:
+        record_decode('batch', None if outcome['error'] else bool(outcome['data']), outcome['ms'], None)
+    return results
+def stage_batch_files(files, directory):
+    """Сохранить загруженные файлы (или содержимое ZIP-архивов) на диск; возвращает [(имя, путь)]"""
+    max_files = app.config['BATCH_UPLOAD_MAX_FILES']
+    staged = []
+    def next_path():
+        if len(staged) >= max_files:
+            raise ValueError(f'Слишком много файлов в пакете (максимум {max_files})')
+        return os.path.join(directory, f'{len(staged):05d}')
+    for file in files:
+        if not file or file.filename == '':
+            continue
+        path = next_path()
+        file.save(path)
+        if not zipfile.is_zipfile(path):
+            staged.append((file.filename, path))
+            continue
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.infolist():
+                if member.is_dir():
+                    continue
+                if member.file_size > app.config['BATCH_UPLOAD_MAX_FILE_SIZE']:
+                    staged.append((member.filename, None))
+                    continue
+                # Имена из архива не используются как пути на диске
+                member_path = next_path() + '.member'
+                with archive.open(member) as source, open(member_path, 'wb') as target:
+                    shutil.copyfileobj(source, target)
+                staged.append((member.filename, member_path))
+        os.remove(path)
+    return staged
+# Постраничная выдача списков (keyset по id)
+PAGE_DEFAULT_LIMIT = 50
+PAGE_MAX_LIMIT = 200
+def parse_datetime_arg(name, end_of_day=False):
+    """Разбор даты из query-параметра (ISO 8601) в naive UTC"""
+    value = request.args.get(name, '').strip()
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Некорректная дата в параметре {name}')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    if end_of_day and len(value) == 10:
+        parsed = parsed + timedelta(days=1)
+    return parsed
+def parse_page_args():
+    """Разбор общих параметров списка: limit, after, order, created_from, created_to"""
+    try:
+        limit = int(request.args.get('limit', PAGE_DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError('Некорректный параметр limit')
+    after = request.args.get('after', '').strip()
+    if after:
+        try:
+            after = int(after)
+        except ValueError:
+            raise ValueError('Некорректный параметр after')
+    else:
+        after = None
+    order = request.args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('Параметр order должен быть asc или desc')
+    return {
+        'limit': max(1, min(limit, PAGE_MAX_LIMIT)),
+        'after': after,
+        'order': order,
+        'created_from': parse_datetime_arg('created_from'),
+        'created_to': parse_datetime_arg('created_to', end_of_day=True)
+    }
+def apply_created_range(query, column, page_args):
+    if page_args['created_from'] is not None:
+        query = query.filter(column >= page_args['created_from'])
+    if page_args['created_to'] is not None:
+        query = query.filter(column < page_args['created_to'])
+    return query
+def keyset_page(query, id_column, page_args):
+    """Одна страница запроса, упорядоченного по id (первый столбец выборки); возвращает (строки, следующий курсор)"""
+    if page_args['order'] == 'desc':
+        if page_args['after'] is not None:
+            query = query.filter(id_column < page_args['after'])
+        query = query.order_by(id_column.desc())
+    else:
+        if page_args['after'] is not None:
+            query = query.filter(id_column > page_args['after'])
+        query = query.order_by(id_column.asc())
+    rows = query.limit(page_args['limit'] + 1).all()
+    next_cursor = None
+    if len(rows) > page_args['limit']:
+        rows = rows[:page_args['limit']]
+        next_cursor = rows[-1][0]
+    return rows, next_cursor
+def page_response(items, next_cursor):
+    return jsonify({"items": items, "next_cursor": next_cursor, "has_more": next_cursor is not None})
+# Полнотекстовый поиск товаров (SQLite FTS5, триграммы)
+SEARCH_MIN_LENGTH = 3
+SEARCH_PAGE_SIZE = 50
+SEARCH_SUGGEST_LIMIT = 10
+# Артикул и название берутся из JSON в QR-коде; для не-JSON артикулом считается сам текст,
+# так же как в upload_qr
+PRODUCT_SEARCH_FIELDS = """
+    new.qr_content,
+    CASE WHEN json_valid(new.qr_content) THEN json_extract(new.qr_content, '$.article') ELSE new.qr_content END,
+    CASE WHEN json_valid(new.qr_content) THEN json_extract(new.qr_content, '$.name') END,
+    new.company_id
+"""
+PRODUCT_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        qr_content, article, name, company_id UNINDEXED, tokenize='trigram')""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_fts_insert AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts (rowid, qr_content, article, name, company_id) VALUES (new.id, {PRODUCT_SEARCH_FIELDS});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_delete AFTER DELETE ON product BEGIN
+        DELETE FROM product_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_fts_update AFTER UPDATE OF qr_content, company_id ON product BEGIN
+        DELETE FROM product_fts WHERE rowid = old.id;
+        INSERT INTO product_fts (rowid, qr_content, article, name, company_id) VALUES (new.id, {PRODUCT_SEARCH_FIELDS});
+    END""",
+]
+def ensure_product_search_index(rebuild=False):
+    """Создать FTS-индекс товаров и триггеры синхронизации; rebuild=True переиндексирует все товары"""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    with db.engine.begin() as conn:
+        created = not conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'")).first()
+        for ddl in PRODUCT_SEARCH_DDL:
+            conn.execute(text(ddl))
+        if created or rebuild:
+            conn.execute(text("DELETE FROM product_fts"))
+            conn.execute(text(
+                "INSERT INTO product_fts (rowid, qr_content, article, name, company_id) "
+                "SELECT id, " + PRODUCT_SEARCH_FIELDS.replace('new.', '') + " FROM product"))
+    return True
+def drop_product_search_index():
+    with db.engine.begin() as conn:
+        for name in ('product_fts_insert', 'product_fts_delete', 'product_fts_update'):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        conn.execute(text("DROP TABLE IF EXISTS product_fts"))
+def product_search_available():
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    return db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'")).first() is not None
+def build_match_query(search_query, prefix=False):
+    """Преобразовать пользовательский ввод в выражение FTS5 MATCH (None, если запрос короче триграммы).
+    Весь запрос — одна фраза: триграммная фраза ищет подстроку, поэтому короткие слова ('M8', '4') не теряются"""
+    phrase = ' '.join(search_query.split())
+    if len(phrase) < SEARCH_MIN_LENGTH:
+        return None
+    phrase = '"' + phrase.replace('"', '""') + '"'
+    if prefix:
+        # Подсказки: артикул или название начинается с запроса
+        return '{article name} : ^' + phrase
+    return phrase
+def search_products(company_id, search_query, limit=SEARCH_PAGE_SIZE, offset=0):
+    """Ранжированный поиск товаров компании; возвращает (строки Product/Shelf/User, всего найдено)"""
+    match = build_match_query(search_query)
+    if match is None or not product_search_available():
+        # Короткие запросы и СУБД без FTS5 — обычный поиск подстроки
+        query = product_rows_query(company_id).filter(Product.qr_content.ilike(f'%{search_query}%'))
+        rows = query.order_by(Product.id.desc()).offset(offset).limit(limit)
+        return [product_row(row) for row in rows], query.count()
+    params = {'match': match, 'company_id': company_id, 'limit': limit, 'offset': offset}
+    ranked_ids = [row[0] for row in db.session.execute(text(
+        "SELECT rowid FROM product_fts WHERE product_fts MATCH :match AND company_id = :company_id "
+        "ORDER BY bm25(product_fts, 1.0, 5.0, 3.0), rowid DESC LIMIT :limit OFFSET :offset"), params)]
+    total = db.session.execute(text(
+        "SELECT count(*) FROM product_fts WHERE product_fts MATCH :match AND company_id = :company_id"),
+        params).scalar()
+    if not ranked_ids:
+        return [], total
+    rows = [product_row(row) for row in product_rows_query(company_id).filter(Product.id.in_(ranked_ids))]
+    position = {product_id: i for i, product_id in enumerate(ranked_ids)}
+    rows.sort(key=lambda row: position[row.id])
+    return rows, total
+def suggest_products(company_id, search_query, limit=SEARCH_SUGGEST_LIMIT):
+    """Подсказки при наборе: первые limit артикулов, начинающихся с запроса, с количеством штук"""
+    if not product_search_available():
+        return []
+    match = build_match_query(search_query, prefix=True)
+    params = {'match': match, 'company_id': company_id, 'limit': limit, 'scan_limit': limit * 50}
+    if match is None:
+        # Запрос короче триграммы индекс не найдет: начало артикула или названия через LIKE
+        params['prefix'] = ' '.join(search_query.split()).replace('\\', '\\\\').replace('%', '\\%'). \
+            replace('_', '\\_') + '%'
+        matched = ("SELECT article, name FROM product_fts WHERE company_id = :company_id"
+                   "  AND (article LIKE :prefix ESCAPE '\\' OR name LIKE :prefix ESCAPE '\\') LIMIT :scan_limit")
+    else:
+        matched = ("SELECT article, name FROM product_fts WHERE product_fts MATCH :match AND company_id = :company_id"
+                   "  ORDER BY rank LIMIT :scan_limit")
+    rows = db.session.execute(text(
+        f"SELECT article, name, count(*) AS quantity FROM ({matched}) "
+        "GROUP BY article, name ORDER BY quantity DESC LIMIT :limit"), params)
+    return [{'article': row[0], 'name': row[1], 'quantity': row[2]} for row in rows]
+def search_row_to_dict(product):
+    return {
+        'id': product.id,
+        'qr_content': product.qr_content,
+        'shelf': product.shelf._asdict() if product.shelf else None,
+        'shelf_name': product.shelf.name if product.shelf else None,
+        'owner_email': product.owner_email,
+        'created_at': product.created_at.isoformat() if product.created_at else None
+    }
+# Счетчики статистики
+STAT_PRODUCTS = 'products'
+STAT_PRODUCTS_SHELF = 'products_shelf'
+STAT_PRODUCTS_DAY = 'products_day'
+STAT_PRODUCTS_QR = 'products_qr'
+STAT_PRODUCTS_UNIQUE_QR = 'products_unique_qr'
+STAT_USER_PRODUCTS = 'user_products'
+STAT_REQUESTS_STATUS = 'requests_status'
+STAT_CUSTOMER_REQUESTS_STATUS = 'customer_requests_status'
+def bump_stat(company_id, scope, name, delta):
+    """Атомарно изменить счетчик (upsert) в текущей транзакции; возвращает новое значение"""
+    if not delta:
+        return None
+    insert = dialect_insert()
+    stmt = insert(StatCounter).values(company_id=company_id, scope=scope, name=name, value=delta)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['company_id', 'scope', 'name'],
+        set_={'value': StatCounter.value + delta}
+    ).returning(StatCounter.value)
+    return db.session.execute(stmt).scalar()
+def shelf_stat_name(shelf_id):
+    return str(shelf_id) if shelf_id else 'none'
+def qr_stat_name(qr_content):
+    return hashlib.sha1(qr_content.encode('utf-8')).hexdigest()
+def bump_qr_stat(company_id, qr_content, delta):
+    value = bump_stat(company_id, STAT_PRODUCTS_QR, qr_stat_name(qr_content), delta)
+    # Число уникальных QR меняется, только когда счетчик строки переходит через ноль
+    if delta > 0 and value == delta:
+        bump_stat(company_id, STAT_PRODUCTS_UNIQUE_QR, '', 1)
+    elif delta < 0 and value == 0:
+        bump_stat(company_id, STAT_PRODUCTS_UNIQUE_QR, '', -1)
+def bump_qr_stats(company_id, deltas):
+    """Пакетный вариант bump_qr_stat: deltas — {qr_content: delta}, один executemany на все строки"""
+    values = {qr_stat_name(qr_content): delta for qr_content, delta in deltas.items() if delta}
+    if not values:
+        return
+    insert = dialect_insert()
+    stmt = insert(StatCounter.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['company_id', 'scope', 'name'],
+        set_={'value': StatCounter.value + stmt.excluded.value}
+    ).returning(StatCounter.name, StatCounter.value)
+    rows = db.session.connection().execute(stmt, [
+        {'company_id': company_id, 'scope': STAT_PRODUCTS_QR, 'name': name, 'value': delta}
+        for name, delta in values.items()
+    ])
+    # Как в bump_qr_stat: уникальный QR появляется, когда счетчик равен прибавленному, и исчезает на нуле
+    unique_delta = 0
+    for name, value in rows:
+        delta = values[name]
+        if delta > 0 and value == delta:
+            unique_delta += 1
+        elif delta < 0 and value == 0:
+            unique_delta -= 1
+    bump_stat(company_id, STAT_PRODUCTS_UNIQUE_QR, '', unique_delta)
+def record_products_added(products, delta=1):
+    """Учесть добавление (delta=1) или удаление (delta=-1) товаров; одинаковые счетчики суммируются.
+    products — объекты Product или строки с теми же полями"""
+    # created_at новых объектов заполняется при flush
+    if any(isinstance(product, Product) and product.id is None for product in products):
+        db.session.flush()
+    counters = Counter()
+    qr_counters = {}
+    for product in products:
+        counters[(product.company_id, STAT_PRODUCTS, '')] += delta
+        counters[(product.company_id, STAT_PRODUCTS_SHELF, shelf_stat_name(product.shelf_id))] += delta
+        if product.created_at:
+            counters[(product.company_id, STAT_PRODUCTS_DAY, product.created_at.date().isoformat())] += delta
+        counters[(product.company_id, STAT_USER_PRODUCTS, str(product.user_id))] += delta
+        company_qr = qr_counters.setdefault(product.company_id, Counter())
+        company_qr[product.qr_content] += delta
+    for (company_id, scope, name), value in counters.items():
+        bump_stat(company_id, scope, name, value)
+    for company_id, deltas in qr_counters.items():
+        if len(deltas) == 1:
+            bump_qr_stat(company_id, *next(iter(deltas.items())))
+        else:
+            bump_qr_stats(company_id, deltas)
+def add_products(products):
+    """Добавить новые товары в сессию и учесть их в счетчиках"""
+    db.session.add_all(products)
+    record_products_added(products)
+def record_product_added(product):
+    record_products_added([product])
+def record_product_removed(product):
+    record_products_added([product], delta=-1)
+def record_products_moved(company_id, old_shelf_id, new_shelf_id, count=1):
+    if old_shelf_id == new_shelf_id or not count:
+        return
+    bump_stat(company_id, STAT_PRODUCTS_SHELF, shelf_stat_name(old_shelf_id), -count)
+    bump_stat(company_id, STAT_PRODUCTS_SHELF, shelf_stat_name(new_shelf_id), count)
+def record_product_qr_changed(company_id, old_qr_content, new_qr_content, count=1):
+    if old_qr_content == new_qr_content or not count:
+        return
+    bump_qr_stat(company_id, old_qr_content, -count)
+    bump_qr_stat(company_id, new_qr_content, count)
+def record_request_status(request_item, status, delta):
+    bump_stat(request_item.company_id, STAT_REQUESTS_STATUS, status, delta)
+    bump_stat(request_item.company_id, STAT_CUSTOMER_REQUESTS_STATUS,
+              f'{request_item.customer_id}:{status}', delta)
+def record_request_added(request_item):
+    record_request_status(request_item, request_item.status, 1)
+def record_request_status_changed(request_item, old_status):
+    if old_status == request_item.status:
+        return
+    record_request_status(request_item, old_status, -1)
+    record_request_status(request_item, request_item.status, 1)
+def load_stats(company_id, customer_id=None, user_id=None):
+    """Сводная статистика компании из счетчиков, без обхода товаров и заявок"""
+    week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).date().isoformat()
+    counters = StatCounter.query.filter(
+        StatCounter.company_id == company_id,
+        StatCounter.scope.in_([
+            STAT_PRODUCTS, STAT_PRODUCTS_SHELF, STAT_PRODUCTS_UNIQUE_QR, STAT_REQUESTS_STATUS
+        ])
+    ).all()
+    counters += StatCounter.query.filter(
+        StatCounter.company_id == company_id,
+        StatCounter.scope == STAT_PRODUCTS_DAY,
+        StatCounter.name >= week_ago
+    ).all()
+    if customer_id is not None:
+        counters += StatCounter.query.filter(
+            StatCounter.company_id == company_id,
+            StatCounter.scope == STAT_CUSTOMER_REQUESTS_STATUS,
+            StatCounter.name.like(f'{customer_id}:%')
+        ).all()
+    if user_id is not None:
+        counters += StatCounter.query.filter_by(
+            company_id=company_id, scope=STAT_USER_PRODUCTS, name=str(user_id)
+        ).all()
+    stats = {
+        'total_products': 0,
+        'products_without_shelf': 0,
+        'products_by_shelf': {},
+        'unique_products': 0,
+        'new_products_7d': 0,
+        'requests_by_status': {},
+        'total_requests': 0
+    }
+    # Счетчики, дошедшие до нуля, в словари не попадают: rebuild_stats таких строк не создает,
+    # и результат не должен зависеть от того, пересчитывалась ли статистика
+    for counter in counters:
+        if counter.scope == STAT_PRODUCTS:
+            stats['total_products'] = counter.value
+        elif counter.scope == STAT_PRODUCTS_SHELF:
+            if counter.name == 'none':
+                stats['products_without_shelf'] = counter.value
+            elif counter.value:
+                stats['products_by_shelf'][counter.name] = counter.value
+        elif counter.scope == STAT_PRODUCTS_UNIQUE_QR:
+            stats['unique_products'] = counter.value
+        elif counter.scope == STAT_PRODUCTS_DAY:
+            stats['new_products_7d'] += counter.value
+        elif counter.scope == STAT_REQUESTS_STATUS:
+            if counter.value:
+                stats['requests_by_status'][counter.name] = counter.value
+            stats['total_requests'] += counter.value
+        elif counter.scope == STAT_CUSTOMER_REQUESTS_STATUS:
+            status = counter.name.split(':', 1)[1]
+            if counter.value:
+                stats.setdefault('my_requests_by_status', {})[status] = counter.value
+            stats['my_requests_total'] = stats.get('my_requests_total', 0) + counter.value
+        elif counter.scope == STAT_USER_PRODUCTS:
+            stats['my_products'] = counter.value
+    if customer_id is not None:
+        stats.setdefault('my_requests_by_status', {})
+        stats.setdefault('my_requests_total', 0)
+    if user_id is not None:
+        stats.setdefault('my_products', 0)
+    return stats
+def rebuild_stats(company_id=None):
+    """Пересчитать все счетчики с нуля по таблицам товаров и заявок"""
+    companies = [company_id] if company_id is not None else \
+        [row[0] for row in db.session.query(Company.id).all()]
+    for cid in companies:
+        StatCounter.query.filter_by(company_id=cid).delete()
+        rows = []
+        def add(scope, name, value):
+            if value:
+                rows.append({'company_id': cid, 'scope': scope, 'name': name, 'value': value})
+        product_filter = Product.company_id == cid
+        add(STAT_PRODUCTS, '', db.session.query(func.count(Product.id)).filter(product_filter).scalar())
+        for shelf_id, count in db.session.query(Product.shelf_id, func.count(Product.id)). \
+                filter(product_filter).group_by(Product.shelf_id):
+            add(STAT_PRODUCTS_SHELF, shelf_stat_name(shelf_id), count)
+        for day, count in db.session.query(func.date(Product.created_at), func.count(Product.id)). \
+                filter(product_filter).group_by(func.date(Product.created_at)):
+            if day:
+                add(STAT_PRODUCTS_DAY, str(day), count)
+        for user_id, count in db.session.query(Product.user_id, func.count(Product.id)). \
+                filter(product_filter).group_by(Product.user_id):
+            add(STAT_USER_PRODUCTS, str(user_id), count)
+        unique_qr = 0
+        for qr_content, count in db.session.query(Product.qr_content, func.count(Product.id)). \
+                filter(product_filter).group_by(Product.qr_content):
+            add(STAT_PRODUCTS_QR, qr_stat_name(qr_content), count)
+            unique_qr += 1
+        add(STAT_PRODUCTS_UNIQUE_QR, '', unique_qr)
+        for customer_id, status, count in db.session.query(Request.customer_id, Request.status, func.count(Request.id)). \
+                filter(Request.company_id == cid).group_by(Request.customer_id, Request.status):
+            add(STAT_CUSTOMER_REQUESTS_STATUS, f'{customer_id}:{status}', count)
+        for status, count in db.session.query(Request.status, func.count(Request.id)). \
+                filter(Request.company_id == cid).group_by(Request.status):
+            add(STAT_REQUESTS_STATUS, status, count)
+        if rows:
+            db.session.execute(StatCounter.__table__.insert(), rows)
+    db.session.commit()
+    return len(companies)
+def backfill_skus(batch_size=5000, progress=None):
+    """Назначить SKU товарам без sku_id (записанным до появления каталога); пачка — одна транзакция.
+    Возвращает число обновленных товаров; progress(total) вызывается после каждой пачки"""
+    table = Product.__table__
+    update = table.update().where(table.c.id == bindparam('product_id')).values(sku_id=bindparam('sku'))
+    total = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Product.id, Product.company_id, Product.user_id, Product.qr_content). \
+            filter(Product.sku_id.is_(None), Product.id > last_id).order_by(Product.id).limit(batch_size).all()
+        if not rows:
+            break
+        connection = db.session.connection()
+        by_company = {}
+        for row in rows:
+            by_company.setdefault(row.company_id, []).append(row)
+        params = []
+        for company_id, company_rows in by_company.items():
+            skus = resolve_skus(connection, company_id, [row.qr_content for row in company_rows])
+            params += [{'product_id': row.id, 'sku': skus[row.qr_content]} for row in company_rows]
+        connection.execute(update, params)
+        bump_data_versions(connection, {(row.company_id, 'products', row.user_id) for row in rows})
+        db.session.commit()
+        total += len(rows)
+        last_id = rows[-1].id
+        if progress is not None:
+            progress(total)
+    return total
 # Главная страница
 @app.route("/")
 def index():
@@ -112,7 +1611,7 @@ def register():
             return render_template("register.html")
         try:
             # Проверяем и создаем компанию если нужно
-            company = Company.query.filter_by(domain=domain).first()
+            company = get_company_by_domain(domain)
             if not company:
                 company = Company(
                     domain=domain,
@@ -120,6 +1619,7 @@ def register():
                 )
                 db.session.add(company)
                 db.session.commit()
+                company = cache_company(company)
             # Проверяем уникальность email в рамках компании
             existing_user = User.query.filter_by(
                 email=email,
@@ -172,7 +1672,7 @@ def login():
             flash('Все поля обязательны для заполнения!', 'danger')
             return render_template("login.html")
         # Находим компанию
-        company = Company.query.filter_by(domain=domain).first()
+        company = get_company_by_domain(domain)
         if not company:
             flash('Компания с таким доменом не найдена!', 'danger')
             return render_template("login.html")
@@ -212,181 +1712,717 @@ def logout():
     return redirect(url_for('login'))
 # Маршрут для страницы four
 @app.route("/four")
+@login_required()
 def four():
-    if 'user_email' not in session or 'company_id' not in session:
-        flash('Пожалуйста, войдите в систему.', 'danger')
-        return redirect(url_for('login'))
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
     return render_template("four.html")
 # API маршруты для данных
+# Модели чтения для списков: только нужные столбцы, полка и владелец присоединяются в том же запросе,
+# строки — именованные кортежи вместо ORM-объектов. Шаблон, читающий product.shelf или владельца,
+# не вызывает ленивую загрузку на каждую строку: страница списка — один запрос на товары и один на полки.
+ShelfRef = namedtuple('ShelfRef', 'id name')
+ProductRow = namedtuple('ProductRow', 'id qr_content image_hash created_at shelf owner_email')
+RequestRow = namedtuple('RequestRow', 'id status created_at request_type priority description '
+                                      'customer_email product_id product_qr_content')
+def product_rows_query(company_id, user_id=None):
+    query = db.session.query(Product.id, Product.qr_content, Product.image_hash, Product.created_at,
+                             Shelf.id, Shelf.name, User.email). \
+        outerjoin(Shelf, Product.shelf_id == Shelf.id). \
+        join(User, Product.user_id == User.id). \
+        filter(Product.company_id == company_id)
+    if user_id is not None:
+        query = query.filter(Product.user_id == user_id)
+    return query
+def product_row(row):
+    product_id, qr_content, image_hash, created_at, shelf_id, shelf_name, owner_email = row
+    shelf = ShelfRef(shelf_id, shelf_name) if shelf_id is not None else None
+    return ProductRow(product_id, qr_content, image_hash, created_at, shelf, owner_email)
+def load_product_rows(company_id, user_id=None):
+    """Товары компании (или работника user_id) для страниц списков"""
+    return [product_row(row) for row in product_rows_query(company_id, user_id).order_by(Product.id)]
+def load_shelf_rows(company_id, user_id=None):
+    query = db.session.query(Shelf.id, Shelf.name).filter(Shelf.company_id == company_id)
+    if user_id is not None:
+        query = query.filter(Shelf.user_id == user_id)
+    return [ShelfRef(*row) for row in query.order_by(Shelf.id)]
+# Сгруппированные остатки: количество единиц каждого SKU на каждой полке (одна агрегирующая выборка)
+SkuGroup = namedtuple('SkuGroup', 'sku_id article name price shelf quantity product_id')
+def sku_groups_query(company_id, user_id=None):
+    """product_id группы — первая единица SKU на полке (на нее заказчик подает заявку)"""
+    query = db.session.query(Sku.id, Sku.article, Sku.name, Sku.price, Shelf.id, Shelf.name,
+                             func.count(Product.id), func.min(Product.id)). \
+        join(Product, Product.sku_id == Sku.id). \
+        outerjoin(Shelf, Product.shelf_id == Shelf.id). \
+        filter(Sku.company_id == company_id, Product.company_id == company_id)
+    if user_id is not None:
+        query = query.filter(Product.user_id == user_id)
+    return query
+def sku_groups(query):
+    rows = query.group_by(Sku.id, Sku.article, Sku.name, Sku.price, Shelf.id, Shelf.name). \
+        order_by(Sku.article, Sku.id, Shelf.name)
+    return [SkuGroup(sku_id, article, name, price, ShelfRef(shelf_id, shelf_name) if shelf_id is not None else None,
+                     quantity, product_id)
+            for sku_id, article, name, price, shelf_id, shelf_name, quantity, product_id in rows]
+def load_sku_groups(company_id, user_id=None):
+    return sku_groups(sku_groups_query(company_id, user_id))
+def sku_group_dict(group):
+    return {
+        'sku_id': group.sku_id,
+        'article': group.article,
+        'name': group.name,
+        'price': group.price,
+        'shelf': group.shelf._asdict() if group.shelf else None,
+        'quantity': group.quantity,
+        'product_id': group.product_id
+    }
+def request_rows_query(company_id, customer_id=None):
+    query = db.session.query(Request.id, Request.status, Request.created_at, Request.request_type,
+                             Request.priority, Request.description, User.email, Product.id, Product.qr_content). \
+        join(User, Request.customer_id == User.id). \
+        outerjoin(Product, Request.product_id == Product.id). \
+        filter(Request.company_id == company_id)
+    if customer_id is not None:
+        query = query.filter(Request.customer_id == customer_id)
+    return query
+def product_dict(product):
+    return {
+        'id': product.id,
+        'qr_content': product.qr_content,
+        'shelf': {
+            'id': product.shelf.id,
+            'name': product.shelf.name
+        } if product.shelf else None,
+        'owner_email': product.owner_email,
+        'thumbnail_url': image_url(product.image_hash, thumbnail=True),
+        'created_at': product.created_at.isoformat() if product.created_at else datetime.now(
+            timezone.utc).isoformat()
+    }
+def products_versions(user):
+    # Работник видит только свои товары и полки
+    if user.role == 'worker':
+        return [f'products:{user.id}', f'shelves:{user.id}']
+    return ['products', 'shelves']
+def stats_versions(user):
+    if user.role == 'owner':
+        return ['products', 'requests']
+    if user.role == 'customer':
+        return ['products', f'requests:{user.id}']
+    return [f'products:{user.id}']
 @app.route('/get_products')
+@login_required(json_response=EMPTY_PAGE)
+@versioned(products_versions)
 def get_products():
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify([])
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    if user.role == 'owner' or user.role == 'customer':
-        products_data = db.session.query(Product, Shelf, User). \
-            outerjoin(Shelf, Product.shelf_id == Shelf.id). \
-            join(User, Product.user_id == User.id). \
-            filter(Product.company_id == session['company_id']). \
-            all()
-        products_list = []
-        for row in products_data:
-            product = row[0]
-            shelf = row[1]
-            owner = row[2]
-            products_list.append({
-                'id': product.id,
-                'qr_content': product.qr_content,
-                'shelf': {
-                    'id': shelf.id if shelf else None,
-                    'name': shelf.name if shelf else None
-                } if shelf else None,
-                'owner_email': owner.email,
-                'created_at': product.created_at.isoformat() if product.created_at else datetime.now(
-                    timezone.utc).isoformat()
-            })
-        return jsonify(products_list)
-    else:
-        products = Product.query.filter_by(
-            user_id=user.id,
-            company_id=session['company_id']
-        ).all()
-        products_list = []
-        for product in products:
-            products_list.append({
-                'id': product.id,
-                'qr_content': product.qr_content,
-                'shelf': {
-                    'id': product.shelf.id if product.shelf else None,
-                    'name': product.shelf.name if product.shelf else None
-                } if product.shelf else None,
-                'owner_email': user.email,
-                'created_at': product.created_at.isoformat() if product.created_at else datetime.now(
-                    timezone.utc).isoformat()
-            })
-        return jsonify(products_list)
+    user = current_user()
+    try:
+        page_args = parse_page_args()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    # Работник видит только свои товары
+    worker_id = user.id if user.role != 'owner' and user.role != 'customer' else None
+    query = product_rows_query(session['company_id'], worker_id)
+    try:
+        query = apply_shelf_filter(query)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    query = apply_created_range(query, Product.created_at, page_args)
+    products_data, next_cursor = keyset_page(query, Product.id, page_args)
+    products_list = [product_dict(product_row(row)) for row in products_data]
+    return page_response(products_list, next_cursor)
+def apply_shelf_filter(query):
+    """Фильтр товаров по полке из query-параметра shelf_id (none — товары без полки)"""
+    shelf_arg = request.args.get('shelf_id', '').strip()
+    if shelf_arg == 'none':
+        return query.filter(Product.shelf_id.is_(None))
+    if shelf_arg:
+        try:
+            return query.filter(Product.shelf_id == int(shelf_arg))
+        except ValueError:
+            raise ValueError('Некорректный параметр shelf_id')
+    return query
+def apply_request_filters(query):
+    """Фильтры заявок по статусу и приоритету из query-параметров"""
+    status = request.args.get('status', '').strip()
+    if status and status != 'all':
+        query = query.filter(Request.status == status)
+    priority = request.args.get('priority', '').strip()
+    if priority and priority != 'all':
+        query = query.filter(Request.priority == priority)
+    return query
+def customer_request_dict(req):
+    has_product = req.product_id is not None
+    product_info = {
+        'name': req.product_qr_content if has_product else 'Общая заявка',
+        'quantity': 1
+    }
+    return {
+        'id': req.id,
+        'status': req.status,
+        'created_at': req.created_at.isoformat() if req.created_at else datetime.now(timezone.utc).isoformat(),
+        'type': req.request_type,
+        'priority': req.priority,
+        'description': req.description,
+        'product_qr_content': req.product_qr_content if has_product else 'Общая заявка',
+        'product_id': req.product_id,
+        'products': [product_info]
+    }
+def owner_request_dict(req):
+    return {
+        'id': req.id,
+        'status': req.status,
+        'created_at': req.created_at.isoformat() if req.created_at else datetime.now(timezone.utc).isoformat(),
+        'type': req.request_type,
+        'priority': req.priority,
+        'description': req.description,
+        'customer_email': req.customer_email,
+        'product_qr_content': req.product_qr_content if req.product_id is not None else 'Общая заявка',
+        'product_id': req.product_id
+    }
 @app.route('/api/customer_requests')
+@login_required(role='customer', json_response=EMPTY_PAGE)
+@versioned('requests:{user_id}', 'products')
 def api_customer_requests():
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify([])
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    if user.role != 'customer':
-        return jsonify([])
-    requests_data = db.session.query(Request, Product). \
-        outerjoin(Product, Request.product_id == Product.id). \
-        filter(
-        Request.customer_id == user.id,
-        Request.company_id == session['company_id']
-    ).all()
-    requests_list = []
-    for row in requests_data:
-        req = row[0]
-        product = row[1]
-        product_info = {
-            'name': product.qr_content if product else 'Общая заявка',
-            'quantity': 1
-        } if product else {
-            'name': 'Общая заявка',
-            'quantity': 1
-        }
-        requests_list.append({
-            'id': req.id,
-            'status': req.status,
-            'created_at': req.created_at.isoformat() if req.created_at else datetime.now(timezone.utc).isoformat(),
-            'type': req.request_type,
-            'priority': req.priority,
-            'description': req.description,
-            'product_qr_content': product.qr_content if product else 'Общая заявка',
-            'product_id': product.id if product else None,
-            'products': [product_info]
-        })
-    return jsonify(requests_list)
+    user = current_user()
+    try:
+        page_args = parse_page_args()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    query = request_rows_query(session['company_id'], customer_id=user.id)
+    query = apply_request_filters(query)
+    query = apply_created_range(query, Request.created_at, page_args)
+    requests_data, next_cursor = keyset_page(query, Request.id, page_args)
+    requests_list = [customer_request_dict(RequestRow(*row)) for row in requests_data]
+    return page_response(requests_list, next_cursor)
 @app.route('/api/owner_requests')
+@login_required(role='owner', json_response=EMPTY_PAGE)
+@versioned('requests', 'products')
 def api_owner_requests():
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify([])
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
+    try:
+        page_args = parse_page_args()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    query = request_rows_query(session['company_id'])
+    query = apply_request_filters(query)
+    query = apply_created_range(query, Request.created_at, page_args)
+    requests_data, next_cursor = keyset_page(query, Request.id, page_args)
+    requests_list = [owner_request_dict(RequestRow(*row)) for row in requests_data]
+    return page_response(requests_list, next_cursor)
+def request_events_query(company_id, customer_id=None):
+    query = RequestEvent.query.filter(RequestEvent.company_id == company_id)
+    if customer_id is not None:
+        query = query.filter(RequestEvent.customer_id == customer_id)
+    return query
+def load_request_events(company_id, customer_id, after_id, limit=100):
+    """События после after_id вместе с текущим состоянием заявок (одна выборка на пачку событий)"""
+    events = request_events_query(company_id, customer_id). \
+        filter(RequestEvent.id > after_id).order_by(RequestEvent.id).limit(limit).all()
+    if not events:
+        return []
+    rows = [RequestRow(*row) for row in request_rows_query(company_id, customer_id).
+            filter(Request.id.in_({event.request_id for event in events}))]
+    to_dict = owner_request_dict if customer_id is None else customer_request_dict
+    items = {row.id: to_dict(row) for row in rows}
+    return [(event.id, {"kind": event.kind, "request": items.get(event.request_id, {"id": event.request_id})})
+            for event in events]
+_request_events_pruned = 0.0
+def prune_request_events():
+    """Удалить события старше REQUEST_EVENT_RETENTION (не чаще раза в час на процесс)"""
+    global _request_events_pruned
+    if time.monotonic() - _request_events_pruned < 3600:
+        return
+    _request_events_pruned = time.monotonic()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=app.config['REQUEST_EVENT_RETENTION'])
+    RequestEvent.query.filter(RequestEvent.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+@app.route('/api/requests/stream')
+@login_required(json_response=NOT_LOGGED_IN)
+def requests_stream():
+    """Поток SSE: владелец получает события всех заявок компании, заказчик — только своих"""
+    user = current_user()
+    if user.role not in ('owner', 'customer'):
+        return jsonify({"success": False, "message": "Нет доступа."}), 403
+    company_id = session['company_id']
+    customer_id = user.id if user.role == 'customer' else None
+    prune_request_events()
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_id = None
+    if last_id is None:
+        # Новое подключение: только события, которые произойдут дальше
+        last_id = request_events_query(company_id, customer_id). \
+            with_entities(func.max(RequestEvent.id)).scalar() or 0
+    db.session.rollback()
+    if not sse_streams.acquire():
+        # Браузер переподключится по таймеру страницы; retry — для клиентов, читающих тело ответа
+        response = Response(f"retry: {app.config['SSE_RETRY_MS']}\n\n", 503, mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(max(1, app.config['SSE_RETRY_MS'] // 1000))
+        return response
+    def stream(last_id):
+        yield f"retry: {app.config['SSE_RETRY_MS']}\n\n"
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < app.config['SSE_MAX_DURATION']:
+            # Поколение запоминаем до выборки, чтобы не пропустить commit между выборкой и ожиданием
+            generation = request_event_broker.generation
+            events = load_request_events(company_id, customer_id, last_id)
+            db.session.rollback()
+            for event_id, payload in events:
+                yield f"id: {event_id}\nevent: request\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                last_id = event_id
+            if events:
+                last_sent = time.monotonic()
+                continue
+            if time.monotonic() - last_sent >= app.config['SSE_HEARTBEAT']:
+                yield ": heartbeat\n\n"
+                last_sent = time.monotonic()
+            request_event_broker.wait(generation, app.config['SSE_POLL_INTERVAL'])
+    response = Response(stream_with_context(stream(last_id)), mimetype='text/event-stream')
+    response.call_on_close(sse_streams.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Отключить буферизацию ответа в nginx
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+# Потоковая выгрузка товаров, полок и заявок в CSV или NDJSON. Выборка читается курсором порциями
+# по EXPORT_BATCH_SIZE строк (yield_per), строки сразу уходят клиенту, и объекты ORM не создаются:
+# память процесса не зависит от того, сколько строк в выгрузке.
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+def qr_export_fields(qr_content):
+    """Артикул, название и цена из содержимого QR для выгрузки"""
+    data = qr_product_data(qr_content)
+    if not isinstance(data, dict):
+        data = {"article": qr_content}
+    return [data.get('article'), data.get('name'), data.get('price')]
+def export_products_query(user):
+    query = db.session.query(Product.id, Product.qr_content, Product.shelf_id, Shelf.name, User.email,
+                             Product.image_hash, Product.created_at). \
+        outerjoin(Shelf, Product.shelf_id == Shelf.id). \
+        join(User, Product.user_id == User.id). \
+        filter(Product.company_id == session['company_id'])
+    # Работник выгружает только свои товары
+    if user.role != 'owner' and user.role != 'customer':
+        query = query.filter(Product.user_id == user.id)
+    query = apply_shelf_filter(query)
+    query = apply_created_range(query, Product.created_at, parse_page_args())
+    return query.order_by(Product.id)
+def export_product_row(row):
+    product_id, qr_content, shelf_id, shelf_name, owner_email, image_hash, created_at = row
+    return [product_id, qr_content] + qr_export_fields(qr_content) + \
+        [shelf_id, shelf_name, owner_email, image_hash, created_at]
+def export_shelves_query(user):
+    query = db.session.query(Shelf.id, Shelf.name, User.email, func.count(Product.id)). \
+        join(User, Shelf.user_id == User.id). \
+        outerjoin(Product, Product.shelf_id == Shelf.id). \
+        filter(Shelf.company_id == session['company_id'])
     if user.role != 'owner':
-        return jsonify([])
-    requests_data = db.session.query(Request, User, Product). \
+        query = query.filter(Shelf.user_id == user.id)
+    return query.group_by(Shelf.id, Shelf.name, User.email).order_by(Shelf.id)
+def export_requests_query(user):
+    if user.role not in ('owner', 'customer'):
+        return None
+    query = db.session.query(Request.id, Request.status, Request.request_type, Request.priority,
+                             Request.description, User.email, Request.product_id, Product.qr_content,
+                             Request.created_at). \
         join(User, Request.customer_id == User.id). \
         outerjoin(Product, Request.product_id == Product.id). \
-        filter(Request.company_id == session['company_id']). \
-        all()
-    requests_list = []
-    for row in requests_data:
-        req = row[0]
-        customer = row[1]
-        product = row[2]
-        requests_list.append({
-            'id': req.id,
-            'status': req.status,
-            'created_at': req.created_at.isoformat() if req.created_at else datetime.now(timezone.utc).isoformat(),
-            'type': req.request_type,
-            'priority': req.priority,
-            'description': req.description,
-            'customer_email': customer.email,
-            'product_qr_content': product.qr_content if product else 'Общая заявка',
-            'product_id': product.id if product else None
-        })
-    return jsonify(requests_list)
+        filter(Request.company_id == session['company_id'])
+    if user.role == 'customer':
+        query = query.filter(Request.customer_id == user.id)
+    query = apply_request_filters(query)
+    query = apply_created_range(query, Request.created_at, parse_page_args())
+    return query.order_by(Request.id)
+# Вид выгрузки: (столбцы, запрос по пользователю, преобразование строки)
+EXPORTS = {
+    'products': (['id', 'qr_content', 'article', 'name', 'price', 'shelf_id', 'shelf_name', 'owner_email',
+                  'image_hash', 'created_at'], export_products_query, export_product_row),
+    'shelves': (['id', 'name', 'owner_email', 'products_count'], export_shelves_query, list),
+    'requests': (['id', 'status', 'type', 'priority', 'description', 'customer_email', 'product_id',
+                  'product_qr_content', 'created_at'], export_requests_query, list),
+}
+def export_lines(query, columns, convert, fmt):
+    """Текст выгрузки порциями по EXPORT_BATCH_SIZE строк"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        # BOM, чтобы Excel открыл кириллицу в UTF-8
+        buffer.write('\ufeff')
+        writer.writerow(columns)
+    count = 0
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        values = [export_value(value) for value in convert(row)]
+        if fmt == 'csv':
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False))
+            buffer.write('\n')
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+def encode_export(lines, compress=False):
+    """Байты выгрузки в UTF-8, при compress — поток gzip, сжимаемый по мере выдачи"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    for chunk in lines:
+        data = chunk.encode('utf-8')
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+@app.route('/api/export/<kind>')
+@login_required(json_response=NOT_LOGGED_IN)
+def export_data(kind):
+    """Выгрузка: format=csv|ndjson, gzip=1, фильтры как у списков (shelf_id, status, priority, created_from/to)"""
+    if kind not in EXPORTS:
+        return jsonify({"success": False, "message": "Неизвестный вид выгрузки"}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"success": False, "message": "Параметр format должен быть csv или ndjson"}), 400
+    compress = request.args.get('gzip') == '1'
+    columns, make_query, convert = EXPORTS[kind]
+    try:
+        query = make_query(current_user())
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    if query is None:
+        return jsonify({"success": False, "message": "Нет доступа."}), 403
+    filename = f"{kind}-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{fmt}"
+    mimetype = EXPORT_MIMETYPES[fmt]
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    body = encode_export(export_lines(query, columns, convert, fmt), compress)
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+# Массовый импорт товаров из CSV или NDJSON (подходят и файлы выгрузки). Файл читается потоком,
+# полки находятся или создаются по названию, строки проверяются и вставляются пачками по
+# IMPORT_BATCH_SIZE одним executemany. INSERT с RETURNING SQLAlchemy отправляет как многострочный
+# INSERT ... VALUES (insertmanyvalues): при построчном executemany триггер FTS-индекса
+# (product_fts_insert) выполняется отдельно на каждую строку и замедляет вставку в разы.
+# Каждая пачка — своя транзакция: ошибка в середине файла не откатывает уже загруженные пачки,
+# а неверные строки пропускаются и попадают в отчет.
+ImportedProduct = namedtuple('ImportedProduct', 'company_id user_id shelf_id qr_content created_at')
+def import_format(filename, fmt=None):
+    """Формат импорта: явно заданный или по расширению файла (.ndjson, .jsonl, в том числе .gz)"""
+    if fmt:
+        return fmt
+    name = (filename or '').lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return 'ndjson' if name.endswith(('.ndjson', '.jsonl')) else 'csv'
+def read_import_records(stream, fmt):
+    """Записи файла импорта: (номер строки данных, dict или None для нечитаемой строки NDJSON).
+    Сжатый gzip файл распаковывается на лету"""
+    if stream.read(2) == b'\x1f\x8b':
+        stream.seek(0)
+        stream = gzip.GzipFile(fileobj=stream)
+    else:
+        stream.seek(0)
+    lines = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        yield from enumerate(csv.DictReader(lines), 1)
+        return
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+def import_product_fields(record):
+    """(qr_content, название полки, created_at) из записи импорта; ValueError с описанием ошибки"""
+    if not isinstance(record, dict):
+        raise ValueError('Строка не является объектом JSON')
+    qr_content = str(record.get('qr_content') or '').strip()
+    if not qr_content:
+        # Без QR товар описывается артикулом, как в этикетке: {"article", "name", "price"}
+        article = str(record.get('article') or '').strip()
+        if not article:
+            raise ValueError('Нет qr_content или article')
+        qr_content = json.dumps({"article": article, "name": record.get('name') or '',
+                                 "price": record.get('price') or '0'}, ensure_ascii=False)
+    if len(qr_content) > 255:
+        raise ValueError('qr_content длиннее 255 символов')
+    shelf_name = str(record.get('shelf_name') or record.get('shelf') or '').strip()
+    if len(shelf_name) > 120:
+        raise ValueError('Название полки длиннее 120 символов')
+    created_at = str(record.get('created_at') or '').strip()
+    if created_at:
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except ValueError:
+            raise ValueError('Некорректная дата created_at')
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    else:
+        created_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    return qr_content, shelf_name, created_at
+def resolve_import_shelves(user, names, shelf_ids):
+    """Найти полки по названиям и создать недостающие; shelf_ids — кэш {название: id} на весь импорт.
+    Владелец находит полки всей компании, остальные — только свои. Возвращает число созданных полок"""
+    missing = sorted(set(names) - shelf_ids.keys())
+    if not missing:
+        return 0
+    query = db.session.query(Shelf.name, Shelf.id).filter(Shelf.company_id == user.company_id, Shelf.name.in_(missing))
+    if user.role != 'owner':
+        query = query.filter(Shelf.user_id == user.id)
+    # При одинаковых названиях берется самая ранняя полка
+    for name, shelf_id in query.order_by(Shelf.id.desc()):
+        shelf_ids[name] = shelf_id
+    created = [Shelf(name=name, user_id=user.id, company_id=user.company_id)
+               for name in missing if name not in shelf_ids]
+    if created:
+        db.session.add_all(created)
+        db.session.flush()
+        for shelf in created:
+            shelf_ids[shelf.name] = shelf.id
+    return len(created)
+def import_products(user, stream, fmt='csv', progress=None):
+    """Импортировать товары от имени user из бинарного потока; progress(report) вызывается после каждой пачки"""
+    report = {"rows": 0, "created": 0, "shelves_created": 0, "error_count": 0, "errors": [], "aborted": False}
+    shelf_ids = {}
+    batch = []
+    def insert_batch():
+        # Полки, созданные в откаченной попытке, не должны остаться в кэше
+        ids = dict(shelf_ids)
+        created = resolve_import_shelves(user, [name for _, name, _ in batch if name], ids)
+        products = [ImportedProduct(user.company_id, user.id, ids[name] if name else None, qr_content, created_at)
+                    for qr_content, name, created_at in batch]
+        skus = resolve_skus(db.session.connection(), user.company_id, [product.qr_content for product in products])
+        db.session.connection().execute(Product.__table__.insert().returning(Product.__table__.c.id),
+                                        [dict(product._asdict(), sku_id=skus[product.qr_content])
+                                         for product in products])
+        record_products_added(products)
+        # Вставка мимо ORM не проходит через flush, версию товаров увеличиваем явно
+        bump_data_versions(db.session.connection(), {(user.company_id, 'products', user.id)})
+        return ids, created
+    def write_batch():
+        ids, created = commit_with_retry(insert_batch)
+        shelf_ids.update(ids)
+        report['shelves_created'] += created
+        report['created'] += len(batch)
+        batch.clear()
+        if progress is not None:
+            progress(report)
+    try:
+        for number, record in read_import_records(stream, fmt):
+            report['rows'] += 1
+            try:
+                batch.append(import_product_fields(record))
+            except ValueError as e:
+                report['error_count'] += 1
+                if len(report['errors']) < app.config['IMPORT_MAX_ERRORS']:
+                    report['errors'].append({"row": number, "message": str(e)})
+                continue
+            if len(batch) >= app.config['IMPORT_BATCH_SIZE']:
+                write_batch()
+        if batch:
+            write_batch()
+    except (UnicodeDecodeError, csv.Error, OSError, EOFError) as e:
+        # Файл нечитаем дальше этого места: уже загруженные пачки остаются
+        db.session.rollback()
+        report['aborted'] = True
+        report['message'] = f"Файл прочитан не полностью (строка {report['rows'] + 1}): {e}"
+    return report
+@app.route('/import_products', methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+def import_products_upload():
+    """Импорт файла file (CSV или NDJSON, можно .gz); format=csv|ndjson задает формат явно"""
+    user = current_user()
+    if user.role not in ('owner', 'worker'):
+        return jsonify({"success": False, "message": "Нет доступа."}), 403
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({"success": False, "message": "Файл не выбран"}), 400
+    fmt = import_format(file.filename, request.form.get('format'))
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"success": False, "message": "Параметр format должен быть csv или ndjson"}), 400
+    report = import_products(user, file.stream, fmt)
+    if report['aborted']:
+        return jsonify(dict(report, success=False)), 400
+    message = f"Импортировано товаров: {report['created']}"
+    if report['error_count']:
+        message += f", строк с ошибками: {report['error_count']}"
+    return jsonify(dict(report, success=True, message=message))
+@app.route('/api/stats')
+@login_required(json_response={})
+@versioned(stats_versions)
+def api_stats():
+    user = current_user()
+    if user.role == 'owner':
+        stats = load_stats(session['company_id'])
+    elif user.role == 'customer':
+        stats = load_stats(session['company_id'], customer_id=user.id)
+        # Заказчику не показываем заявки других заказчиков
+        stats.pop('requests_by_status')
+        stats.pop('total_requests')
+    else:
+        stats = load_stats(session['company_id'], user_id=user.id)
+        stats.pop('requests_by_status')
+        stats.pop('total_requests')
+    return jsonify(stats)
 # Основные маршруты
 @app.route("/upload_qr", methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
 def upload_qr():
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"success": False, "message": "Пожалуйста, войдите в систему."})
     if 'file' not in request.files:
         return jsonify({"success": False, "message": "Файл не загружен"})
     file = request.files['file']
     if file.filename == '':
         return jsonify({"success": False, "message": "Пустое имя файла"})
+    multi = bool(request.form.get('multi'))
+    if request.form.get('async'):
+        if decode_queue_depth() >= app.config['DECODE_JOB_MAX_QUEUE']:
+            return jsonify({"success": False, "message": "Очередь распознавания переполнена, повторите позже"}), 503
+        job = enqueue_decode_job(file, current_user(), multi)
+        return jsonify({"success": True, "job_id": job.id, "status": job.status,
+                        "status_url": url_for('api_decode_job', job_id=job.id)}), 202
+    return jsonify(decode_upload_payload(file.stream, multi))
+@app.route("/api/decode_jobs/<int:job_id>")
+@login_required(json_response=NOT_LOGGED_IN)
+def api_decode_job(job_id):
+    user = current_user()
+    job = db.session.get(DecodeJob, job_id)
+    if not job or job.user_id != user.id or job.company_id != session['company_id']:
+        return jsonify({"success": False, "message": "Задание не найдено"}), 404
+    response = {"success": True, "job_id": job.id, "status": job.status}
+    if job.status == JOB_QUEUED:
+        response['position'] = DecodeJob.query.filter(DecodeJob.status == JOB_QUEUED, DecodeJob.id < job.id).count()
+    elif job.status == JOB_DONE:
+        response['result'] = json.loads(job.result)
+    elif job.status == JOB_FAILED:
+        response['error'] = job.error
+    return jsonify(response)
+@app.route("/api/decode_jobs/stats")
+@login_required(role='owner', json_response=NOT_LOGGED_IN)
+def api_decode_queue_stats():
+    return jsonify(decode_queue_stats())
+# Показатели кэша распознавания и очереди, вычисляемые при чтении /metrics
+metrics.collector('decode_cache_lookups_total', 'counter', 'Обращения к кэшу распознавания',
+                  lambda: [({"result": name}, decode_cache_stats()[name]) for name in ('memory_hits', 'disk_hits', 'misses')])
+metrics.collector('decode_cache_memory_entries', 'gauge', 'Записей в кэше распознавания в памяти',
+                  lambda: [({}, len(decode_memory_cache))])
+metrics.collector('fragment_cache_lookups_total', 'counter', 'Обращения к кэшу фрагментов страниц',
+                  lambda: [({"fragment": template, "result": name}, row[name])
+                           for template, row in fragment_cache_stats()['fragments'].items()
+                           for name in ('memory_hits', 'disk_hits', 'misses')])
+metrics.collector('fragment_cache_invalidations_total', 'counter', 'Фрагменты, удаленные из памяти после записи',
+                  lambda: [({}, fragment_cache_stats()['invalidations'])])
+metrics.collector('fragment_cache_memory_entries', 'gauge', 'Фрагментов страниц в памяти',
+                  lambda: [({}, len(fragment_memory_cache))])
+metrics.collector('decode_queue_jobs', 'gauge', 'Задания очереди распознавания по статусам',
+                  lambda: [({"status": status}, count) for status, count in db.session.query(
+                      DecodeJob.status, func.count(DecodeJob.id)).group_by(DecodeJob.status)])
+metrics.collector('decode_queue_oldest_seconds', 'gauge', 'Возраст самого старого ожидающего задания',
+                  lambda: [({}, decode_queue_stats()['oldest_queued_s'])])
+@app.route('/metrics')
+def metrics_view():
+    """Метрики процесса в текстовом формате Prometheus"""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+    body = metrics.render(on_error=lambda name, e: app.logger.warning("Metric %s failed: %s", name, e))
+    response = Response(body, mimetype='text/plain; version=0.0.4')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+@app.route("/upload_batch", methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+def upload_batch():
+    user = current_user()
+    files = request.files.getlist('files') or request.files.getlist('file')
+    if not files:
+        return jsonify({"success": False, "message": "Файлы не загружены"})
+    shelf_id = request.form.get('shelf_id', type=int)
+    if shelf_id:
+        shelf = Shelf.query.filter_by(id=shelf_id, user_id=user.id, company_id=session['company_id']).first()
+        if not shelf:
+            return jsonify({"success": False, "message": "Полка не найдена."})
+    directory = tempfile.mkdtemp(prefix='qr_batch_')
     try:
-        qr_content = decode_qr_code(Image.open(file.stream))
-        if qr_content:
-            try:
-                product_data = json.loads(qr_content)
-                return jsonify({"success": True, "product": product_data, "qr_content": qr_content})
-            except:
-                return jsonify({"success": True,
-                                "product": {"article": qr_content, "name": f"Товар (QR: {qr_content})", "price": "0"},
-                                "qr_content": qr_content})
-        else:
-            return jsonify({"success": False, "message": "QR-код не найден"})
-    except Exception as e:
-        return jsonify({"success": False, "message": f"Ошибка при обработке файла: {str(e)}"})
+        try:
+            staged = stage_batch_files(files, directory)
+        except (ValueError, zipfile.BadZipFile) as e:
+            return jsonify({"success": False, "message": str(e)})
+        paths = [path for _, path in staged if path is not None]
+        decoded = iter(decode_batch(paths))
+        storage = get_storage()
+        results = []
+        products = []
+        for name, path in staged:
+            if path is None:
+                results.append(({"file": name, "success": False, "message": "Файл слишком большой"}, None))
+                continue
+            outcome = next(decoded)
+            entry = {"file": name, "success": bool(outcome['data']), "stage": outcome['stage'], "ms": outcome['ms']}
+            product = None
+            if outcome['data']:
+                with open(path, 'rb') as f, storage.receive(f) as upload:
+                    image_hash = storage.keep(upload)
+                product = Product(
+                    qr_content=outcome['data'],
+                    user_id=user.id,
+                    company_id=session['company_id'],
+                    shelf_id=shelf_id or None,
+                    image_hash=image_hash
+                )
+                products.append(product)
+                entry['qr_content'] = outcome['data']
+            else:
+                entry['message'] = f"Ошибка при обработке файла: {outcome['error']}" if outcome['error'] \
+                    else "QR-код не найден"
+            results.append((entry, product))
+        if products:
+            commit_with_retry(lambda: add_products(products))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    manifest = []
+    for entry, product in results:
+        if product is not None:
+            entry['product_id'] = product.id
+        manifest.append(entry)
+    return jsonify({
+        "success": True,
+        "created": len(products),
+        "failed": len(manifest) - len(products),
+        "results": manifest
+    })
+@app.route('/api/sku_stock')
+@login_required(json_response=[])
+@versioned(products_versions)
+def api_sku_stock():
+    """Остатки по товарным позициям: количество единиц каждого SKU на каждой полке (shelf_id — фильтр)"""
+    user = current_user()
+    # Работник видит только свои товары
+    worker_id = user.id if user.role != 'owner' and user.role != 'customer' else None
+    try:
+        query = apply_shelf_filter(sku_groups_query(session['company_id'], worker_id))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return jsonify([sku_group_dict(group) for group in sku_groups(query)])
 @app.route("/get_shelves", methods=['GET'])
+@login_required(json_response=[])
+@versioned('shelves:{user_id}')
 def get_shelves():
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify([])
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    shelves = Shelf.query.filter_by(user_id=user.id, company_id=session['company_id']).all()
-    shelves_data = [{"id": shelf.id, "name": shelf.name} for shelf in shelves]
+    user = current_user()
+    shelves_data = [shelf._asdict() for shelf in load_shelf_rows(session['company_id'], user.id)]
     return jsonify(shelves_data)
 @app.route("/add_product_to_shelf", methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+@retry_on_lock
 def add_product_to_shelf():
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"success": False, "message": "Пожалуйста, войдите в систему."})
     data = request.get_json()
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
+    user = current_user()
     new_product = Product(
         qr_content=data.get('qr_content', data.get('article', 'No Article')),
         user_id=user.id,
@@ -394,397 +2430,495 @@ def add_product_to_shelf():
         shelf_id=data.get('shelf_id')
     )
     db.session.add(new_product)
+    record_product_added(new_product)
     db.session.commit()
     return jsonify({"success": True, "message": "Товар успешно добавлен"})
+def scan_fields(scan):
+    """Проверить запись пакета сканирования; возвращает (key, qr_content, shelf_id)"""
+    if not isinstance(scan, dict):
+        raise ValueError('Запись должна быть объектом')
+    key = scan.get('key')
+    if not isinstance(key, str) or not key.strip() or len(key.strip()) > 64:
+        raise ValueError('Некорректный ключ key')
+    qr_content = scan.get('qr_content')
+    if not isinstance(qr_content, str) or not qr_content:
+        raise ValueError('Пустой qr_content')
+    if len(qr_content) > 255:
+        raise ValueError('qr_content длиннее 255 символов')
+    shelf_id = scan.get('shelf_id')
+    if shelf_id is not None:
+        try:
+            shelf_id = int(shelf_id)
+        except (TypeError, ValueError):
+            raise ValueError('Некорректный shelf_id')
+    return key.strip(), qr_content, shelf_id
+def insert_scans(user, scans):
+    """Вставить товары пакета одним INSERT ... ON CONFLICT DO NOTHING; возвращает ключи созданных товаров.
+    scans — {key: (qr_content, shelf_id)}; ключи, уже записанные раньше, пропускает уникальный индекс"""
+    now = datetime.now(timezone.utc)
+    skus = resolve_skus(db.session.connection(), user.company_id, [qr_content for qr_content, _ in scans.values()])
+    insert = dialect_insert()
+    stmt = insert(Product.__table__).on_conflict_do_nothing(index_elements=['company_id', 'scan_key'])
+    result = db.session.connection().execute(stmt.returning(Product.__table__.c.scan_key), [
+        {'qr_content': qr_content, 'user_id': user.id, 'company_id': user.company_id, 'shelf_id': shelf_id,
+         'created_at': now, 'scan_key': key, 'sku_id': skus[qr_content]}
+        for key, (qr_content, shelf_id) in scans.items()
+    ])
+    created = {row[0] for row in result}
+    if created:
+        record_products_added([ImportedProduct(user.company_id, user.id, scans[key][1], scans[key][0], now)
+                               for key in created])
+        # Вставка мимо ORM не проходит через flush, версию товаров увеличиваем явно
+        bump_data_versions(db.session.connection(), {(user.company_id, 'products', user.id)})
+    return created
+@app.route('/api/scans', methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+def ingest_scans():
+    """Пакет сканирований со страницы сканера: {"scans": [{"key", "qr_content", "shelf_id"}]}.
+    Весь пакет записывается одной транзакцией; повторная отправка после потерянного ответа безопасна:
+    уже записанные ключи возвращаются в duplicates"""
+    user = current_user()
+    if user.role not in ('owner', 'worker'):
+        return jsonify({"success": False, "message": "Нет доступа."}), 403
+    data = request.get_json(silent=True) or {}
+    scans = data.get('scans')
+    if not isinstance(scans, list) or not scans:
+        return jsonify({"success": False, "message": "Пустой пакет"}), 400
+    if len(scans) > app.config['SCAN_BATCH_MAX']:
+        return jsonify({"success": False,
+                        "message": f"Не больше {app.config['SCAN_BATCH_MAX']} записей в пакете"}), 400
+    accepted = {}
+    rejected = []
+    for scan in scans:
+        try:
+            key, qr_content, shelf_id = scan_fields(scan)
+        except ValueError as e:
+            rejected.append({"key": scan.get('key') if isinstance(scan, dict) else None, "message": str(e)})
+            continue
+        accepted.setdefault(key, (qr_content, shelf_id))
+    shelf_ids = {shelf_id for _, shelf_id in accepted.values() if shelf_id is not None}
+    if shelf_ids:
+        own_shelves = {row.id for row in Shelf.query.with_entities(Shelf.id).filter(
+            Shelf.id.in_(shelf_ids), Shelf.company_id == user.company_id, Shelf.user_id == user.id)}
+        for key, (_, shelf_id) in list(accepted.items()):
+            if shelf_id is not None and shelf_id not in own_shelves:
+                del accepted[key]
+                rejected.append({"key": key, "message": "Полка не найдена"})
+    created = commit_with_retry(lambda: insert_scans(user, accepted)) if accepted else set()
+    return jsonify({
+        "success": True,
+        "message": f"Добавлено товаров: {len(created)}",
+        "created": [key for key in accepted if key in created],
+        "duplicates": [key for key in accepted if key not in created],
+        "rejected": rejected
+    })
 @app.route("/upload", methods=['POST'])
+@login_required()
 def upload():
-    if 'user_email' not in session or 'company_id' not in session:
-        flash('Пожалуйста, войдите в систему.', 'danger')
-        return redirect(url_for('login'))
     file = request.files['file']
     if file:
         try:
-            qr_content = decode_qr_code(Image.open(file.stream))
-            if qr_content:
-                user = User.query.filter_by(
-                    email=session['user_email'],
-                    company_id=session['company_id']
-                ).first()
-                new_product = Product(
-                    qr_content=qr_content,
-                    user_id=user.id,
-                    company_id=session['company_id']
-                )
-                db.session.add(new_product)
-                db.session.commit()
-                file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-                file.save(file_path)
-                flash('Товар успешно добавлен!', 'success')
+            user = current_user()
+            shelf_id = request.form.get('shelf_id', type=int)
+            if shelf_id and not Shelf.query.filter_by(id=shelf_id, user_id=user.id,
+                                                      company_id=session['company_id']).first():
+                flash('Полка не найдена!', 'danger')
+                return redirect(url_for('second'))
+            storage = get_storage()
+            # Файл записывается на диск один раз; в хранилище попадает, только если товары добавлены
+            with storage.receive(file.stream) as upload:
+                with upload.open() as f:
+                    if request.form.get('multi'):
+                        # Снимок паллеты: товар на каждый найденный код, одной транзакцией
+                        contents = [code.data for code in decode_qr_codes(f).codes]
+                    else:
+                        qr_content = decode_qr_result(f).data
+                        contents = [qr_content] if qr_content else []
+                image_hash = storage.keep(upload) if contents else None
+            if contents:
+                products = [
+                    Product(
+                        qr_content=qr_content,
+                        user_id=user.id,
+                        company_id=session['company_id'],
+                        shelf_id=shelf_id or None,
+                        image_hash=image_hash
+                    ) for qr_content in contents
+                ]
+                commit_with_retry(lambda: add_products(products))
+                if len(products) > 1:
+                    flash(f'Добавлено товаров: {len(products)}', 'success')
+                else:
+                    flash('Товар успешно добавлен!', 'success')
             else:
                 flash('Не удалось декодировать QR-код!', 'danger')
         except Exception as e:
             flash(f'Ошибка при обработке файла: {str(e)}', 'danger')
     return redirect(url_for('second'))
+@app.route("/images/<image_hash>")
+@app.route("/images/<image_hash>/<variant>")
+@login_required()
+def product_image(image_hash, variant=None):
+    # Снимок доступен, только если на нем есть товар компании пользователя
+    if variant not in (None, 'thumb') or not Product.query.filter_by(
+            company_id=session['company_id'], image_hash=image_hash).first():
+        abort(404)
+    storage = get_storage()
+    key = thumbnail_key(image_hash) if variant else original_key(image_hash)
+    if not storage.exists(key):
+        abort(404)
+    stream = storage.open(key)
+    mimetype = 'image/jpeg' if variant else image_mimetype(stream)
+    stream.seek(0)
+    # Содержимое по ключу никогда не меняется
+    response = send_file(stream, mimetype=mimetype, etag=image_hash, max_age=app.config['UPLOAD_IMAGE_MAX_AGE'])
+    response.cache_control.private = True
+    response.cache_control.public = False
+    response.cache_control.immutable = True
+    return response
+@app.route("/assets/<path:filename>")
+def asset_file(filename):
+    mimetype = MIMETYPES.get(os.path.splitext(filename)[1])
+    path = safe_join(app.config['ASSET_DIST_DIR'], filename)
+    if mimetype is None or path is None or not os.path.isfile(path):
+        abort(404)
+    # Заранее сжатый вариант (.br/.gz рядом с файлом), если браузер его принимает
+    path, encoding = precompressed_variant(path, request.accept_encodings)
+    response = send_file(path, mimetype=mimetype, max_age=app.config['ASSET_MAX_AGE'])
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    # Содержимое по адресу с хешем никогда не меняется
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 @app.route("/get_shelf_products/<int:shelf_id>")
+@login_required(json_response={"products": []})
+@versioned('products:{user_id}', 'shelves:{user_id}')
 def get_shelf_products(shelf_id):
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"products": []})
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
+    user = current_user()
     shelf = db.session.get(Shelf, shelf_id)
     if not shelf or shelf.user_id != user.id or shelf.company_id != session['company_id']:
         return jsonify({"products": []})
-    products = Product.query.filter_by(shelf_id=shelf_id, user_id=user.id, company_id=session['company_id']).all()
+    contents = db.session.query(Product.qr_content). \
+        filter_by(shelf_id=shelf_id, user_id=user.id, company_id=session['company_id']).order_by(Product.id)
     products_data = [
         {
-            "name": p.qr_content,
-            "article": p.qr_content,
-            "qr_content": p.qr_content
-        } for p in products
+            "name": qr_content,
+            "article": qr_content,
+            "qr_content": qr_content
+        } for qr_content, in contents
     ]
     return jsonify({"products": products_data})
 @app.route("/second")
+@login_required()
 def second():
-    if 'user_email' not in session or 'company_id' not in session:
-        flash('Пожалуйста, войдите в систему.', 'danger')
-        return redirect(url_for('login'))
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    products = Product.query.filter_by(user_id=user.id, company_id=session['company_id']).all()
-    shelves = Shelf.query.filter_by(user_id=user.id, company_id=session['company_id']).all()
-    return render_template("second.html", products=products, shelves=shelves)
+    # Полки и товары страница загружает сама через /get_shelves и /get_shelf_products
+    return render_template("second.html")
 @app.route("/gg")
+@login_required(role='worker')
 def gg():
-    if 'user_email' not in session or 'company_id' not in session:
-        flash('Пожалуйста, войдите в систему.', 'danger')
-        return redirect(url_for('login'))
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    if user.role != 'worker':
-        flash('У вас нет доступа к этой странице.', 'danger')
-        return redirect(url_for('login'))
-    shelves = Shelf.query.filter_by(user_id=user.id, company_id=session['company_id']).all()
-    return render_template("gg.html", shelves=shelves)
+    return render_template("gg.html")
 @app.route('/add_shelf', methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+@retry_on_lock
 def add_shelf():
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"success": False, "message": "Пожалуйста, войдите в систему."})
     name = request.form['name']
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
+    user = current_user()
     new_shelf = Shelf(name=name, user_id=user.id, company_id=session['company_id'])
     db.session.add(new_shelf)
     db.session.commit()
     return jsonify({"success": True, "shelf_id": new_shelf.id})
 @app.route('/remove_shelf/<int:shelf_id>', methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+@retry_on_lock
 def remove_shelf(shelf_id):
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"success": False, "message": "Пожалуйста, войдите в систему."})
     shelf = db.session.get(Shelf, shelf_id)
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
+    user = current_user()
     if not shelf or shelf.user_id != user.id or shelf.company_id != session['company_id']:
         return jsonify({"success": False, "message": "Это не ваша полка."})
-    Product.query.filter_by(shelf_id=shelf_id, company_id=session['company_id']).update({'shelf_id': None})
+    products = Product.query.filter_by(shelf_id=shelf_id, company_id=session['company_id'])
+    owners = [owner_id for owner_id, in products.with_entities(Product.user_id).distinct()]
+    moved = products.update({'shelf_id': None})
+    record_products_moved(session['company_id'], shelf_id, None, moved)
+    bump_data_versions(db.session.connection(), {(session['company_id'], 'products', owner_id) for owner_id in owners})
     db.session.delete(shelf)
     db.session.commit()
     return jsonify({"success": True})
 @app.route('/remove_all_shelves', methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+@retry_on_lock
 def remove_all_shelves():
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"success": False, "message": "Пожалуйста, войдите в систему."})
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    Product.query.filter_by(user_id=user.id, company_id=session['company_id']).update({'shelf_id': None})
-    Shelf.query.filter_by(user_id=user.id, company_id=session['company_id']).delete()
+    user = current_user()
+    company_id = session['company_id']
+    shelf_ids = [shelf_id for shelf_id, in db.session.query(Shelf.id).filter_by(user_id=user.id, company_id=company_id)]
+    # Как в remove_shelf: снимаем с полок все товары компании, а не только товары владельца полок
+    products = Product.query.filter(Product.company_id == company_id, Product.shelf_id.in_(shelf_ids))
+    shelf_counts = products.with_entities(Product.shelf_id, func.count(Product.id)).group_by(Product.shelf_id).all()
+    owners = [owner_id for owner_id, in products.with_entities(Product.user_id).distinct()]
+    for shelf_id, count in shelf_counts:
+        record_products_moved(company_id, shelf_id, None, count)
+    products.update({'shelf_id': None})
+    Shelf.query.filter(Shelf.id.in_(shelf_ids)).delete()
+    bump_data_versions(db.session.connection(), {(company_id, 'products', owner_id) for owner_id in owners} |
+                       {(company_id, 'shelves', user.id)})
     db.session.commit()
     return jsonify({"success": True})
 @app.route('/all_shelves')
+@login_required()
 def all_shelves():
-    if 'user_email' not in session or 'company_id' not in session:
-        flash('Пожалуйста, войдите в систему.', 'danger')
-        return redirect(url_for('login'))
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    products = Product.query.filter_by(user_id=user.id, company_id=session['company_id']).all()
-    total_products = len(products)
-    shelves = Shelf.query.filter_by(user_id=user.id, company_id=session['company_id']).all()
-    return render_template('all_shelves.html', products=products, total_products=total_products, shelves=shelves)
+    user = current_user()
+    # Таблицу страница строит сама из JSON товаров; полки подгружаются через /get_shelves
+    products_data = cached_fragment('fragments/all_shelves_data.html', (user.id,),
+                                    [f'products:{user.id}', f'shelves:{user.id}'],
+                                    lambda: {'products_data': [product_dict(p) for p in
+                                                               load_product_rows(session['company_id'], user.id)]})
+    return render_template('all_shelves.html', products_data=products_data)
 @app.route('/delete_product/<int:product_id>', methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+@retry_on_lock
 def delete_product(product_id):
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"success": False, "message": "Пожалуйста, войдите в систему."})
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
+    user = current_user()
     product = Product.query.filter_by(id=product_id, user_id=user.id, company_id=session['company_id']).first()
     if not product:
         return jsonify({"success": False, "message": "Товар не найден."})
+    record_product_removed(product)
     db.session.delete(product)
     db.session.commit()
     return jsonify({"success": True, "message": "Товар успешно удален."})
 @app.route('/update_product', methods=['POST'])
+@login_required(json_response={"success": False, "message": "Пожалуйста, войдите в системе."})
+@retry_on_lock
 def update_product():
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"success": False, "message": "Пожалуйста, войдите в системе."})
     data = request.get_json()
     product_id = data.get('product_id')
     qr_content = data.get('qr_content')
     shelf_id = data.get('shelf_id')
     if not product_id or not qr_content:
         return jsonify({"success": False, "message": "Отсутствуют обязательные данные"})
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
+    user = current_user()
     product = Product.query.filter_by(id=product_id, user_id=user.id, company_id=session['company_id']).first()
     if not product:
         return jsonify({"success": False, "message": "Товар не найден"})
+    old_qr_content = product.qr_content
+    old_shelf_id = product.shelf_id
     product.qr_content = qr_content
     if shelf_id:
         shelf = Shelf.query.filter_by(id=shelf_id, user_id=user.id, company_id=session['company_id']).first()
         if not shelf:
             return jsonify({"success": False, "message": "Полка не найдена"})
-        product.shelf_id = shelf_id
+        product.shelf_id = shelf.id
     else:
         product.shelf_id = None
+    record_product_qr_changed(product.company_id, old_qr_content, product.qr_content)
+    record_products_moved(product.company_id, old_shelf_id, product.shelf_id)
     db.session.commit()
     return jsonify({"success": True, "message": "Товар успешно обновлен"})
 @app.route('/move_product_to_shelf', methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+@retry_on_lock
 def move_product_to_shelf():
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"success": False, "message": "Пожалуйста, войдите в систему."})
     data = request.get_json()
     product_id = data.get('product_id')
     shelf_id = data.get('shelf_id')
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
+    user = current_user()
     product = Product.query.filter_by(id=product_id, user_id=user.id, company_id=session['company_id']).first()
     if not product:
         return jsonify({"success": False, "message": "Товар не найден."})
+    old_shelf_id = product.shelf_id
     if not shelf_id:
         product.shelf_id = None
     else:
         shelf = Shelf.query.filter_by(id=shelf_id, user_id=user.id, company_id=session['company_id']).first()
         if not shelf:
             return jsonify({"success": False, "message": "Полка не найдена."})
-        product.shelf_id = shelf_id
+        product.shelf_id = shelf.id
+    record_products_moved(product.company_id, old_shelf_id, product.shelf_id)
     db.session.commit()
     return jsonify({"success": True, "message": "Товар перемещен."})
+def bulk_scope(query, model, user):
+    """Владелец работает со всеми товарами и полками компании, остальные — только со своими"""
+    query = query.filter(model.company_id == session['company_id'])
+    if user.role != 'owner':
+        query = query.filter(model.user_id == user.id)
+    return query
+@app.route('/bulk_products', methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+@retry_on_lock
+def bulk_products():
+    """Переместить, изменить или удалить несколько товаров одним запросом и одной транзакцией.
+    Тело: {"operation": "move"|"edit"|"delete", "product_ids": [...], "shelf_id": ..., "qr_content": ...}"""
+    data = request.get_json(silent=True) or {}
+    operation = data.get('operation')
+    if operation not in ('move', 'edit', 'delete'):
+        return jsonify({"success": False, "message": "Неизвестная операция"}), 400
+    try:
+        product_ids = sorted({int(product_id) for product_id in data.get('product_ids') or []})
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "Некорректный список товаров"}), 400
+    if not product_ids:
+        return jsonify({"success": False, "message": "Не выбраны товары"}), 400
+    if len(product_ids) > app.config['BULK_PRODUCTS_MAX']:
+        return jsonify({"success": False,
+                        "message": f"Не больше {app.config['BULK_PRODUCTS_MAX']} товаров за один запрос"}), 400
+    user = current_user()
+    # Одна выборка проверяет права на все товары сразу и дает старые значения для счетчиков
+    rows = bulk_scope(db.session.query(Product.id, Product.company_id, Product.user_id, Product.shelf_id,
+                                       Product.qr_content, Product.created_at), Product, user). \
+        filter(Product.id.in_(product_ids)).all()
+    if len(rows) != len(product_ids):
+        missing = sorted(set(product_ids) - {row.id for row in rows})
+        return jsonify({"success": False, "message": "Товары не найдены", "missing": missing}), 404
+    company_id = session['company_id']
+    qr_content = (data.get('qr_content') or '').strip()
+    if operation == 'edit' and not qr_content:
+        return jsonify({"success": False, "message": "Отсутствуют обязательные данные"}), 400
+    values = {}
+    if operation in ('move', 'edit') and (operation == 'move' or 'shelf_id' in data):
+        shelf_id = data.get('shelf_id') or None
+        if shelf_id is not None:
+            shelf = bulk_scope(Shelf.query, Shelf, user).filter(Shelf.id == shelf_id).first()
+            if not shelf:
+                return jsonify({"success": False, "message": "Полка не найдена"}), 404
+            shelf_id = shelf.id
+        values[Product.shelf_id] = shelf_id
+        for old_shelf_id, count in Counter(row.shelf_id for row in rows).items():
+            record_products_moved(company_id, old_shelf_id, shelf_id, count)
+    if operation == 'edit':
+        values[Product.qr_content] = qr_content
+        values[Product.sku_id] = resolve_skus(db.session.connection(), company_id, [qr_content])[qr_content]
+        for old_qr_content, count in Counter(row.qr_content for row in rows).items():
+            record_product_qr_changed(company_id, old_qr_content, qr_content, count)
+    products = Product.query.filter(Product.company_id == company_id, Product.id.in_(product_ids))
+    # Массовые UPDATE/DELETE проходят мимо flush, версии данных увеличиваем явно
+    changed = {(company_id, 'products', row.user_id) for row in rows}
+    if operation == 'delete':
+        record_products_added(rows, delta=-1)
+        # Как и при удалении по одному, заявки на удаленные товары остаются без ссылки на товар
+        linked_requests = Request.query.filter(Request.company_id == company_id, Request.product_id.in_(product_ids))
+        changed |= {(company_id, 'requests', customer_id) for customer_id, in
+                    linked_requests.with_entities(Request.customer_id).distinct()}
+        linked_requests.update({Request.product_id: None}, synchronize_session=False)
+        affected = products.delete(synchronize_session=False)
+    else:
+        affected = products.update(values, synchronize_session=False)
+    bump_data_versions(db.session.connection(), changed)
+    db.session.commit()
+    return jsonify({"success": True, "operation": operation, "affected": affected,
+                    "message": f"Обработано товаров: {affected}"})
 # Маршруты для владельца
 @app.route('/owner_dashboard')
+@login_required(role='owner')
 def owner_dashboard():
-    if 'user_email' not in session or 'company_id' not in session:
-        flash('Пожалуйста, войдите в систему.', 'danger')
-        return redirect(url_for('login'))
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    if user.role != 'owner':
-        flash('У вас нет доступа к этой странице.', 'danger')
-        return redirect(url_for('login'))
-    products = Product.query.filter_by(company_id=session['company_id']).all()
-    total_products = len(products)
-    requests = Request.query.filter_by(status='new', company_id=session['company_id']).all()
-    new_requests_count = len(requests)
+    stats = load_stats(session['company_id'])
     return render_template('owner_dashboard.html',
-                           total_products=total_products,
-                           new_requests_count=new_requests_count)
+                           total_products=stats['total_products'],
+                           new_requests_count=stats['requests_by_status'].get('new', 0),
+                           approved_requests_count=stats['requests_by_status'].get('completed', 0),
+                           total_requests_count=stats['total_requests'])
 @app.route('/owner_products')
+@login_required(role='owner')
 def owner_products():
-    if 'user_email' not in session or 'company_id' not in session:
-        flash('Пожалуйста, войдите в систему.', 'danger')
-        return redirect(url_for('login'))
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    if user.role != 'owner':
-        flash('У вас нет доступа к этой странице.', 'danger')
-        return redirect(url_for('login'))
-    products = Product.query.filter_by(company_id=session['company_id']).all()
-    shelves = Shelf.query.filter_by(company_id=session['company_id']).all()
-    return render_template('owner_products.html', products=products, shelves=shelves)
+    view = 'sku' if request.args.get('view') == 'sku' else 'units'
+    def context():
+        shelves = load_shelf_rows(session['company_id'])
+        if view == 'sku':
+            groups = load_sku_groups(session['company_id'])
+            return dict(view=view, groups=groups, products=[], shelves=shelves,
+                        total_products=sum(group.quantity for group in groups))
+        products = load_product_rows(session['company_id'])
+        return dict(view=view, products=products, shelves=shelves, total_products=len(products))
+    product_list = cached_fragment('fragments/owner_products_list.html', (view,), ['products', 'shelves'], context)
+    return render_template('owner_products.html', product_list=product_list)
 @app.route('/owner_requests')
+@login_required(role='owner')
 def owner_requests():
-    if 'user_email' not in session or 'company_id' not in session:
-        flash('Пожалуйста, войдите в систему.', 'danger')
-        return redirect(url_for('login'))
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    if user.role != 'owner':
-        flash('У вас нет доступа к этой странице.', 'danger')
-        return redirect(url_for('login'))
-    requests_data = db.session.query(Request, User, Product). \
-        join(User, Request.customer_id == User.id). \
-        outerjoin(Product, Request.product_id == Product.id). \
-        filter(Request.company_id == session['company_id']). \
-        all()
-    requests = []
-    for row in requests_data:
-        req = row[0]
-        customer = row[1]
-        product = row[2]
-        status_map = {
-            'new': 'Новая',
-            'in-progress': 'В работе',
-            'completed': 'Одобрена',
-            'cancelled': 'Отклонена'
-        }
-        requests.append({
-            'id': req.id,
-            'email': customer.email,
-            'qr_content': product.qr_content if product else 'Общая заявка',
-            'status': status_map.get(req.status, req.status),
-            'created_at': req.created_at,
-            'request_type': req.request_type,
-            'priority': req.priority,
-            'description': req.description
-        })
-    return render_template('owner_requests.html', requests=requests)
+    # Сам список заявок страница подгружает постранично через /api/owner_requests
+    stats = load_stats(session['company_id'])
+    request_counts = dict(stats['requests_by_status'], total=stats['total_requests'])
+    return render_template('owner_requests.html', request_counts=request_counts)
 # Маршруты для заказчика
 @app.route('/customer_dashboard')
+@login_required(role='customer')
 def customer_dashboard():
-    if 'user_email' not in session or 'company_id' not in session:
-        flash('Пожалуйста, войдите в систему.', 'danger')
-        return redirect(url_for('login'))
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    if user.role != 'customer':
-        flash('У вас нет доступа к этой странице.', 'danger')
-        return redirect(url_for('login'))
-    products = Product.query.filter_by(company_id=session['company_id']).all()
-    total_products = len(products)
-    user_requests = Request.query.filter_by(customer_id=user.id, company_id=session['company_id']).all()
+    user = current_user()
+    stats = load_stats(session['company_id'], customer_id=user.id)
     return render_template('customer_dashboard.html',
-                           total_products=total_products,
-                           user_requests_count=len(user_requests))
+                           total_products=stats['total_products'],
+                           user_requests_count=stats['my_requests_total'],
+                           new_products_count=stats['new_products_7d'],
+                           products_without_shelf=stats['products_without_shelf'],
+                           unique_products=stats['unique_products'])
 @app.route('/customer_products')
+@login_required(role='customer')
 def customer_products():
-    if 'user_email' not in session or 'company_id' not in session:
-        flash('Пожалуйста, войдите в систему.', 'danger')
-        return redirect(url_for('login'))
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    if user.role != 'customer':
-        flash('У вас нет доступа к этой странице.', 'danger')
-        return redirect(url_for('login'))
-    products_data = db.session.query(Product, Shelf, User). \
-        outerjoin(Shelf, Product.shelf_id == Shelf.id). \
-        join(User, Product.user_id == User.id). \
-        filter(Product.company_id == session['company_id']). \
-        all()
-    total_products = len(products_data)
-    return render_template('customer_products.html',
-                           products=products_data,
-                           total_products=total_products)
+    view = 'sku' if request.args.get('view') == 'sku' else 'units'
+    def context():
+        if view == 'sku':
+            groups = load_sku_groups(session['company_id'])
+            return dict(view=view, groups=groups, products=[], total_products=sum(group.quantity for group in groups))
+        products = load_product_rows(session['company_id'])
+        return dict(view=view, products=products, total_products=len(products))
+    # Список одинаков для всех заказчиков компании: один слот на компанию и вид
+    product_list = cached_fragment('fragments/customer_products_list.html', (view,), ['products', 'shelves'],
+                                   context)
+    return render_template('customer_products.html', product_list=product_list)
 @app.route('/customer_search')
+@login_required(role='customer')
 def customer_search():
-    if 'user_email' not in session or 'company_id' not in session:
-        flash('Пожалуйста, войдите в систему.', 'danger')
-        return redirect(url_for('login'))
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    if user.role != 'customer':
-        flash('У вас нет доступа к этой странице.', 'danger')
-        return redirect(url_for('login'))
-    search_query = request.args.get('q', '')
+    search_query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
     products = []
+    total_found = 0
     if search_query:
-        products = db.session.query(Product, Shelf, User). \
-            outerjoin(Shelf, Product.shelf_id == Shelf.id). \
-            join(User, Product.user_id == User.id). \
-            filter(
-            Product.qr_content.ilike(f'%{search_query}%'),
-            Product.company_id == session['company_id']
-        ).all()
+        rows, total_found = search_products(session['company_id'], search_query,
+                                            limit=SEARCH_PAGE_SIZE,
+                                            offset=(page - 1) * SEARCH_PAGE_SIZE)
+        products = [search_row_to_dict(row) for row in rows]
     return render_template('customer_search.html',
                            products=products,
                            search_query=search_query,
-                           total_found=len(products))
+                           total_found=total_found,
+                           page=page,
+                           has_next=page * SEARCH_PAGE_SIZE < total_found)
+@app.route('/api/search_products')
+@login_required(json_response={"items": [], "total": 0})
+@versioned('products', 'shelves')
+def api_search_products():
+    user = current_user()
+    search_query = request.args.get('q', '').strip()
+    if user.role not in ('owner', 'customer') or not search_query:
+        return jsonify({"items": [], "total": 0})
+    if request.args.get('mode') == 'prefix':
+        limit = max(1, min(request.args.get('limit', SEARCH_SUGGEST_LIMIT, type=int), SEARCH_PAGE_SIZE))
+        return jsonify({"items": suggest_products(session['company_id'], search_query, limit)})
+    limit = max(1, min(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), PAGE_MAX_LIMIT))
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    rows, total = search_products(session['company_id'], search_query, limit=limit, offset=offset)
+    return jsonify({
+        "items": [search_row_to_dict(row) for row in rows],
+        "total": total,
+        "next_offset": offset + limit if offset + limit < total else None
+    })
 @app.route('/customer_requests')
+@login_required(role='customer')
 def customer_requests():
-    if 'user_email' not in session or 'company_id' not in session:
-        flash('Пожалуйста, войдите в систему.', 'danger')
-        return redirect(url_for('login'))
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
-    if user.role != 'customer':
-        flash('У вас нет доступа к этой странице.', 'danger')
-        return redirect(url_for('login'))
-    requests_data = db.session.query(Request, Product). \
-        outerjoin(Product, Request.product_id == Product.id). \
-        filter(
-        Request.customer_id == user.id,
-        Request.company_id == session['company_id']
-    ).all()
-    requests = []
-    for row in requests_data:
-        req = row[0]
-        product = row[1]
-        status_map = {
-            'new': 'Новая',
-            'in-progress': 'В работе',
-            'completed': 'Одобрена',
-            'cancelled': 'Отклонена'
-        }
-        requests.append({
-            'id': req.id,
-            'status': status_map.get(req.status, req.status),
-            'qr_content': product.qr_content if product else 'Общая заявка',
-            'product_id': req.product_id,
-            'created_at': req.created_at,
-            'request_type': req.request_type,
-            'priority': req.priority,
-            'description': req.description
-        })
-    return render_template('customer_requests.html', requests=requests)
+    user = current_user()
+    # Сам список заявок страница подгружает постранично через /api/customer_requests
+    stats = load_stats(session['company_id'], customer_id=user.id)
+    request_counts = dict(stats['my_requests_by_status'], total=stats['my_requests_total'])
+    return render_template('customer_requests.html', request_counts=request_counts)
 # Маршруты для работы с заявками
 @app.route('/create_request/<int:product_id>', methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+@retry_on_lock
 def create_request(product_id):
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"success": False, "message": "Пожалуйста, войдите в систему."})
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
+    user = current_user()
     if user.role != 'customer':
         return jsonify({"success": False, "message": "Только заказчик может создать заявку."})
     product = db.session.get(Product, product_id)
     if not product or product.company_id != session['company_id']:
         return jsonify({"success": False, "message": "Товар не найден."})
-    existing_request = Request.query.filter_by(customer_id=user.id, product_id=product_id,
-                                               company_id=session['company_id']).first()
-    if existing_request:
-        return jsonify({"success": False, "message": "Заявка на этот товар уже существует."})
     new_request = Request(
         customer_id=user.id,
         product_id=product.id,
@@ -795,16 +2929,19 @@ def create_request(product_id):
         description=f'Заявка на товар: {product.qr_content}'
     )
     db.session.add(new_request)
+    # Дубликат отсекает уникальный индекс (customer_id, product_id), а не предварительная выборка
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"success": False, "message": "Заявка на этот товар уже существует."})
+    record_request_added(new_request)
     db.session.commit()
     return jsonify({"success": True, "message": "Заявка успешно создана."})
 @app.route('/create_custom_request', methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
 def create_custom_request():
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"success": False, "message": "Пожалуйста, войдите в систему."})
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
+    user = current_user()
     if user.role != 'customer':
         return jsonify({"success": False, "message": "Только заказчик может создать заявку."})
     try:
@@ -825,36 +2962,34 @@ def create_custom_request():
             priority=priority,
             description=description
         )
-        db.session.add(new_request)
-        db.session.commit()
+        def save_request():
+            db.session.add(new_request)
+            record_request_added(new_request)
+        commit_with_retry(save_request)
         return jsonify({"success": True, "message": "Заявка успешно создана."})
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "message": f"Ошибка при создании заявки: {str(e)}"})
 @app.route('/cancel_request/<int:request_id>', methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+@retry_on_lock
 def cancel_request(request_id):
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"success": False, "message": "Пожалуйста, войдите в систему."})
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
+    user = current_user()
     request_item = db.session.get(Request, request_id)
     if not request_item or request_item.company_id != session['company_id']:
         return jsonify({"success": False, "message": "Заявка не найдена."})
     if request_item.customer_id != user.id:
         return jsonify({"success": False, "message": "Вы не можете отменить эту заявку."})
+    old_status = request_item.status
     request_item.status = 'cancelled'
+    record_request_status_changed(request_item, old_status)
     db.session.commit()
     return jsonify({"success": True, "message": "Заявка успешно отменена."})
 @app.route('/update_request_status/<int:request_id>', methods=['POST'])
+@login_required(json_response=NOT_LOGGED_IN)
+@retry_on_lock
 def update_request_status(request_id):
-    if 'user_email' not in session or 'company_id' not in session:
-        return jsonify({"success": False, "message": "Пожалуйста, войдите в систему."})
-    user = User.query.filter_by(
-        email=session['user_email'],
-        company_id=session['company_id']
-    ).first()
+    user = current_user()
     if user.role != 'owner':
         return jsonify({"success": False, "message": "Только владелец может изменить статус заявки."})
     data = request.get_json()
@@ -871,7 +3006,9 @@ def update_request_status(request_id):
     request_item = db.session.get(Request, request_id)
     if not request_item or request_item.company_id != session['company_id']:
         return jsonify({"success": False, "message": "Заявка не найдена."})
+    old_status = request_item.status
     request_item.status = status_en
+    record_request_status_changed(request_item, old_status)
     db.session.commit()
     return jsonify({"success": True, "message": "Статус заявки обновлен."})
 if __name__ == "__main__":
@@ -0,0 +1,335 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import textwrap
+import threading
+import urllib.request
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Сборка статических ресурсов.
+# Исходники лежат в static/css и static/js (стили и скрипты страниц — в подкаталогах pages), библиотеки
+# сканера — в static/vendor. Сборка минифицирует их, добавляет хеш содержимого в имя, кладет рядом
+# сжатые варианты .gz и .br (если установлен пакет brotli) и пишет static/dist/manifest.json: исходное
+# имя -> собранное. Шаблоны ссылаются на ресурсы через asset_url('js/pages/four.js'); пока сборки нет,
+# asset_url отдает исходный файл из static.
+# Запуск:
+#   python assets.py build       — собрать static/dist
+#   python assets.py vendor      — скачать библиотеки сканера в static/vendor и сверить с vendor.lock.json
+#   python assets.py vendor --pin — скачать и закрепить SHA-256 в vendor.lock.json (изменение lock коммитится)
+#   python assets.py extract     — вынести встроенные <style>/<script> шаблонов в static/css|js/pages
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, 'static')
+SOURCE_DIRS = ['css', 'js', 'vendor']
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+TEMPLATE_DIR = os.path.join(ROOT, 'templates')
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+# Сжатые варианты меньше этого размера не создаются: выигрыш меньше накладных расходов
+COMPRESS_MIN_SIZE = 512
+# Библиотеки сканера лежат в static/vendor и коммитятся вместе с vendor.lock.json: для каждого файла
+# адрес источника с зафиксированной версией, SHA-256 и хеш SRI. Сборка не проходит, если файл не совпадает
+# с закрепленным хешем. Пока библиотека не скачана в static/vendor, страница грузит ее с CDN по адресу
+# из lock (с атрибутом integrity, когда хеш закреплен).
+VENDOR_LOCK = 'vendor/vendor.lock.json'
+MIMETYPES = {'.css': 'text/css', '.js': 'text/javascript'}
+# Минификация
+def minify_css(source):
+    """Убрать комментарии и лишние пробелы; строки в кавычках не меняются"""
+    tokens = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/)', source, flags=re.S)
+    result = []
+    for i, token in enumerate(tokens):
+        if i % 2:
+            if not token.startswith('/*'):
+                result.append(token)
+            continue
+        token = re.sub(r'\s+', ' ', token)
+        # Пробел вокруг ':' не трогаем: в селекторе 'a :hover' он значим
+        token = re.sub(r'\s*([{};,>])\s*', r'\1', token)
+        result.append(token)
+    css = ''.join(result).replace(';}', '}')
+    return css.strip()
+JS_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+JS_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'throw', 'delete', 'new')
+def js_regex_allowed(output):
+    """Может ли '/' в этом месте начинать литерал регулярного выражения (а не деление)"""
+    text = ''.join(output[-3:]).rstrip()
+    if not text:
+        return True
+    if text[-1] in JS_REGEX_PRECEDERS:
+        return True
+    return re.search(r'(?:^|[^\w$])(?:' + '|'.join(JS_REGEX_KEYWORDS) + r')$', text) is not None
+def minify_js(source):
+    """Консервативная минификация: убрать комментарии, отступы и пустые строки.
+
+    Переводы строк сохраняются (на них опирается автоматическая вставка ';'), строки, шаблонные
+    строки и регулярные выражения копируются как есть.
+    """
+    output = []
+    line = []
+    i, length = 0, len(source)
+    def end_line():
+        text = ''.join(line).strip()
+        if text:
+            output.append(text + '\n')
+        line.clear()
+    while i < length:
+        char = source[i]
+        pair = source[i:i + 2]
+        if pair == '//':
+            end = source.find('\n', i)
+            i = length if end < 0 else end
+            continue
+        if pair == '/*':
+            end = source.find('*/', i + 2)
+            i = length if end < 0 else end + 2
+            line.append(' ')
+            continue
+        if char in '"\'`' or (char == '/' and js_regex_allowed(output + line)):
+            start = i
+            i += 1
+            in_class = False
+            while i < length:
+                current = source[i]
+                if current == '\\':
+                    i += 2
+                    continue
+                if char == '/':
+                    if current == '[':
+                        in_class = True
+                    elif current == ']':
+                        in_class = False
+                    elif current == '/' and not in_class:
+                        break
+                    elif current == '\n':
+                        break
+                elif current == char:
+                    break
+                elif char == '`' and source.startswith('${', i):
+                    # Вложенное выражение шаблонной строки копируем вместе с его скобками
+                    depth = 0
+                    while i < length:
+                        if source[i] == '{':
+                            depth += 1
+                        elif source[i] == '}':
+                            depth -= 1
+                            if depth == 0:
+                                break
+                        i += 1
+                i += 1
+            i += 1
+            if char == '/':
+                while i < length and source[i].isalpha():
+                    i += 1
+            line.append(source[start:i])
+            continue
+        if char == '\n':
+            end_line()
+        elif char in ' \t\r':
+            if line and not line[-1].endswith(' '):
+                line.append(' ')
+        else:
+            line.append(char)
+        i += 1
+    end_line()
+    return ''.join(output)
+def minify(name, content):
+    if name.endswith('.min.js') or name.endswith('.min.css'):
+        return content
+    if name.endswith('.css'):
+        return minify_css(content)
+    if name.endswith('.js'):
+        return minify_js(content)
+    return content
+# Сборка
+def fingerprinted_name(name, content):
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{digest}{ext}'
+def compressed_variants(content):
+    """Сжатые варианты содержимого: {'.gz': байты, '.br': байты}; gzip без времени в заголовке"""
+    variants = {}
+    if len(content) < COMPRESS_MIN_SIZE:
+        return variants
+    variants['.gz'] = gzip.compress(content, compresslevel=9, mtime=0)
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+    return {suffix: data for suffix, data in variants.items() if len(data) < len(content)}
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+def source_files(static_dir):
+    for source in SOURCE_DIRS:
+        for directory, _, files in os.walk(os.path.join(static_dir, source)):
+            for filename in sorted(files):
+                if os.path.splitext(filename)[1] in MIMETYPES:
+                    path = os.path.join(directory, filename)
+                    yield os.path.relpath(path, static_dir).replace(os.sep, '/'), path
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Собрать ресурсы; возвращает манифест и размеры {имя: (исходный, минифицированный, gzip)}.
+    Файлы прошлых сборок не удаляются: страницы, отданные до выката, продолжают на них ссылаться"""
+    problems = verify_vendor(static_dir)
+    if problems:
+        raise ValueError('Библиотеки static/vendor не совпадают с vendor.lock.json:\n  ' + '\n  '.join(problems))
+    manifest = {}
+    sizes = {}
+    for name, path in sorted(source_files(static_dir)):
+        with open(path, 'rb') as f:
+            original = f.read()
+        content = minify(name, original.decode('utf-8')).encode('utf-8')
+        built = fingerprinted_name(name, content)
+        target = os.path.join(dist_dir, built)
+        if not os.path.exists(target):
+            write_file(target, content)
+        variants = compressed_variants(content)
+        for suffix, data in variants.items():
+            if not os.path.exists(target + suffix):
+                write_file(target + suffix, data)
+        manifest[name] = built
+        sizes[name] = (len(original), len(content), len(variants.get('.gz', content)))
+    write_file(os.path.join(dist_dir, MANIFEST_NAME),
+               json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest, sizes
+class AssetManifest:
+    """Манифест сборки: исходное имя ресурса -> имя файла с хешем. Перечитывается при изменении файла"""
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.mtime = None
+        self.loaded = False
+        self._lock = threading.Lock()
+    def load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if self.loaded and mtime == self.mtime:
+            return
+        with self._lock:
+            entries = {}
+            if mtime is not None:
+                with open(self.path, encoding='utf-8') as f:
+                    entries = json.load(f)
+            self.entries, self.mtime, self.loaded = entries, mtime, True
+    def lookup(self, name, reload=False):
+        if reload or not self.loaded:
+            self.load()
+        return self.entries.get(name)
+def precompressed_variant(path, accept_encodings):
+    """Лучший заранее сжатый вариант файла для Accept-Encoding: (путь, Content-Encoding или None)"""
+    for suffix, encoding in (('.br', 'br'), ('.gz', 'gzip')):
+        if accept_encodings[encoding] and os.path.isfile(path + suffix):
+            return path + suffix, encoding
+    return path, None
+# Библиотеки сканера
+def load_vendor_lock(static_dir=STATIC_DIR):
+    with open(os.path.join(static_dir, VENDOR_LOCK), encoding='utf-8') as f:
+        return json.load(f)
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+def sri_hash(content):
+    """Значение атрибута integrity (Subresource Integrity) для содержимого файла"""
+    return 'sha384-' + base64.b64encode(hashlib.sha384(content).digest()).decode('ascii')
+def verify_vendor(static_dir=STATIC_DIR):
+    """Сверить static/vendor с vendor.lock.json; возвращает список расхождений.
+    Незакрепленной библиотеки, которой нет в static/vendor, расхождением не считается: она грузится с CDN"""
+    lock = load_vendor_lock(static_dir)
+    problems = []
+    for name, entry in sorted(lock.items()):
+        path = os.path.join(static_dir, name)
+        if not entry.get('sha256'):
+            if os.path.isfile(path):
+                problems.append(f'{name}: SHA-256 не закреплен (python assets.py vendor --pin)')
+        elif not os.path.isfile(path):
+            problems.append(f'{name}: файла нет (python assets.py vendor)')
+        elif file_sha256(path) != entry['sha256']:
+            problems.append(f'{name}: SHA-256 не совпадает с закрепленным')
+    vendored = {name for name, _ in source_files(static_dir) if name.startswith('vendor/')}
+    problems += [f'{name}: нет в vendor.lock.json' for name in sorted(vendored - set(lock))]
+    return problems
+def vendor(static_dir=STATIC_DIR, pin=False):
+    """Скачать библиотеки из vendor.lock.json и сверить SHA-256 с закрепленным.
+    pin=True записывает SHA-256 скачанных файлов в lock: это осознанное изменение, оно проверяется при ревью"""
+    lock = load_vendor_lock(static_dir)
+    for name, entry in sorted(lock.items()):
+        with urllib.request.urlopen(entry['url'], timeout=30) as response:
+            content = response.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if pin:
+            entry['sha256'] = digest
+            entry['integrity'] = sri_hash(content)
+        elif not entry.get('sha256'):
+            raise ValueError(f'{name}: SHA-256 не закреплен; проверьте файл и запустите vendor --pin')
+        elif entry['sha256'] != digest:
+            raise ValueError(f"{name}: содержимое {entry['url']} не совпадает с vendor.lock.json")
+        write_file(os.path.join(static_dir, name), content)
+        print(f'{name}: {len(content)} байт, sha256 {digest}')
+    if pin:
+        write_file(os.path.join(static_dir, VENDOR_LOCK),
+                   (json.dumps(lock, indent=2, sort_keys=True) + '\n').encode('utf-8'))
+# Вынос встроенных ресурсов из шаблонов
+INLINE_BLOCK = re.compile(r'(?P<indent>[ \t]*)<(?P<tag>style|script)>(?P<body>.*?)</(?P=tag)>', re.S)
+def extract(template_dir=TEMPLATE_DIR, static_dir=STATIC_DIR):
+    """Перенести <style> и <script> без атрибутов в static/css|js/pages и заменить их ссылками asset_url.
+    Блоки с синтаксисом Jinja остаются в шаблоне. Возвращает список созданных файлов"""
+    created = []
+    for filename in sorted(os.listdir(template_dir)):
+        if not filename.endswith('.html'):
+            continue
+        path = os.path.join(template_dir, filename)
+        with open(path, encoding='utf-8', newline='') as f:
+            template = f.read()
+        newline = '\r\n' if '\r\n' in template else '\n'
+        stem = filename[:-len('.html')]
+        counters = {}
+        def replace(match):
+            body = match.group('body')
+            if '{{' in body or '{%' in body or not body.strip():
+                return match.group(0)
+            tag = match.group('tag')
+            kind = 'css' if tag == 'style' else 'js'
+            counters[kind] = counters.get(kind, 0) + 1
+            suffix = f'-{counters[kind]}' if counters[kind] > 1 else ''
+            name = f'{kind}/pages/{stem}{suffix}.{kind}'
+            content = textwrap.dedent(body.replace('\r\n', '\n')).strip('\n') + '\n'
+            write_file(os.path.join(static_dir, name), content.replace('\n', newline).encode('utf-8'))
+            created.append(name)
+            indent = match.group('indent')
+            if tag == 'style':
+                return f'{indent}<link rel="stylesheet" href="{{{{ asset_url(\'{name}\') }}}}">'
+            return f'{indent}<script src="{{{{ asset_url(\'{name}\') }}}}"></script>'
+        updated = INLINE_BLOCK.sub(replace, template)
+        if updated != template:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(updated)
+    return created
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'build'
+    if command == 'build':
+        try:
+            manifest, sizes = build()
+        except ValueError as e:
+            sys.exit(str(e))
+        for name, (original, minified, compressed) in sorted(sizes.items()):
+            print(f'{name:<32} {original:>8} -> {minified:>8} (gzip {compressed:>7})  {manifest[name]}')
+        print(f'Собрано ресурсов: {len(manifest)}' + ('' if brotli else ' (brotli не установлен, только .gz)'))
+    elif command == 'vendor':
+        vendor(pin='--pin' in sys.argv[2:])
+    elif command == 'extract':
+        for name in extract():
+            print(f'static/{name}')
+    else:
+        print('Использование: python assets.py [build|vendor [--pin]|extract]')
+        sys.exit(1)
+if __name__ == '__main__':
+    main()
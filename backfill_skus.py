@@ -0,0 +1,6 @@
+from app import app, backfill_skus
+
+with app.app_context():
+    # Назначаем SKU товарам, у которых его еще нет (записанным до появления каталога)
+    updated = backfill_skus(progress=lambda total: print(f"Обработано товаров: {total}"))
+    print(f"SKU назначены товарам: {updated}")
@@ -0,0 +1,140 @@
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timezone, timedelta
+from app import app, db, Company, User, Shelf, Product, Request, rebuild_stats, resolve_skus
+
+# Синтетические компании для нагрузочного тестирования.
+# Запуск из корня проекта:
+#   python -m benchmarks.generate_data --companies 2 --products 100000 --requests 10000
+# Описание созданных компаний и учетных записей пишется в manifest (по умолчанию
+# benchmarks/tenants.json), его читает benchmarks.load_test. При одинаковом --seed данные одинаковы.
+BATCH_SIZE = 5000
+PASSWORD = 'bench'
+STATUSES = ['new', 'in-progress', 'completed', 'cancelled']
+STATUS_WEIGHTS = [40, 25, 25, 10]
+PRIORITIES = ['low', 'medium', 'high', 'urgent']
+REQUEST_TYPES = ['order', 'return', 'inventory']
+NAME_WORDS = ['Болт', 'Гайка', 'Шайба', 'Кабель', 'Панель', 'Короб', 'Лампа', 'Фильтр', 'Насос', 'Клапан',
+              'стальной', 'медный', 'усиленный', 'малый', 'большой', 'белый', 'черный', 'M6', 'M8', 'M10']
+def insert_rows(table, rows):
+    """Вставить строки пачками по BATCH_SIZE; возвращает id в порядке вставки"""
+    ids = []
+    connection = db.session.connection()
+    for i in range(0, len(rows), BATCH_SIZE):
+        result = connection.execute(table.insert().returning(table.c.id), rows[i:i + BATCH_SIZE])
+        ids.extend(row[0] for row in result)
+    return ids
+def make_articles(rng, count):
+    """Каталог артикулов: товары одного артикула повторяются, как одинаковые этикетки на складе"""
+    return [{
+        "article": f"BN{i:07d}",
+        "name": f"{rng.choice(NAME_WORDS[:10])} {rng.choice(NAME_WORDS[10:])}",
+        "price": str(rng.randint(10, 50000))
+    } for i in range(count)]
+def generate_company(rng, domain, args):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    def created_at():
+        return now - timedelta(seconds=rng.randint(0, args.days * 24 * 3600))
+    company = Company(domain=domain, name=f"Компания {domain.title()}")
+    db.session.add(company)
+    db.session.flush()
+    users = {'owner': [f"owner@{domain}"],
+             'worker': [f"worker{i + 1}@{domain}" for i in range(args.workers)],
+             'customer': [f"customer{i + 1}@{domain}" for i in range(args.customers)]}
+    user_ids = {}
+    for role, emails in users.items():
+        user_ids[role] = insert_rows(User.__table__, [
+            {'email': email, 'password': PASSWORD, 'role': role, 'company_id': company.id} for email in emails])
+    # Товары и полки принадлежат работникам (без работников — владельцу)
+    holders = user_ids['worker'] or user_ids['owner']
+    shelves = [(holders[i % len(holders)], f"Стеллаж {i // 10 + 1}-{i % 10 + 1}") for i in range(args.shelves)]
+    shelf_ids = insert_rows(Shelf.__table__, [
+        {'name': name, 'user_id': user_id, 'company_id': company.id} for user_id, name in shelves])
+    shelves_by_user = {}
+    for (user_id, _), shelf_id in zip(shelves, shelf_ids):
+        shelves_by_user.setdefault(user_id, []).append(shelf_id)
+    articles = make_articles(rng, max(args.products // args.copies, 1))
+    contents = [json.dumps(article, ensure_ascii=False) for article in articles]
+    skus = {}
+    for i in range(0, len(contents), BATCH_SIZE):
+        skus.update(resolve_skus(db.session.connection(), company.id, contents[i:i + BATCH_SIZE]))
+    product_rows = []
+    for _ in range(args.products):
+        user_id = rng.choice(holders)
+        user_shelves = shelves_by_user.get(user_id)
+        qr_content = rng.choice(contents)
+        product_rows.append({
+            'qr_content': qr_content,
+            'sku_id': skus[qr_content],
+            'user_id': user_id,
+            'company_id': company.id,
+            'shelf_id': rng.choice(user_shelves) if user_shelves and rng.random() > args.unshelved else None,
+            'created_at': created_at()
+        })
+    product_ids = insert_rows(Product.__table__, product_rows)
+    request_rows = []
+    # Заказчик может оставить только одну заявку на товар (уникальный индекс); повтор становится общей заявкой
+    requested = set()
+    for _ in range(args.requests if user_ids['customer'] else 0):
+        customer_id = rng.choice(user_ids['customer'])
+        product_id = rng.choice(product_ids) if product_ids and rng.random() < 0.8 else None
+        if (customer_id, product_id) in requested:
+            product_id = None
+        elif product_id is not None:
+            requested.add((customer_id, product_id))
+        request_rows.append({
+            'customer_id': customer_id,
+            'product_id': product_id,
+            'company_id': company.id,
+            'status': rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+            'created_at': created_at(),
+            'request_type': rng.choice(REQUEST_TYPES),
+            'priority': rng.choice(PRIORITIES),
+            'description': 'Заявка на товар' if product_id else 'Общая заявка'
+        })
+    insert_rows(Request.__table__, request_rows)
+    rebuild_stats(company.id)
+    db.session.commit()
+    return {
+        "domain": domain,
+        "password": PASSWORD,
+        "users": users,
+        "articles": [article['article'] for article in rng.sample(articles, min(len(articles), 200))],
+        "counts": {"users": sum(len(emails) for emails in users.values()), "shelves": len(shelf_ids),
+                   "products": len(product_ids), "requests": len(request_rows)}
+    }
+def main():
+    parser = argparse.ArgumentParser(description='Синтетические компании для нагрузочного тестирования')
+    parser.add_argument('--companies', type=int, default=1)
+    parser.add_argument('--prefix', default='bench', help='домены компаний: <prefix>1, <prefix>2, ...')
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--customers', type=int, default=20)
+    parser.add_argument('--shelves', type=int, default=100)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--copies', type=int, default=5, help='среднее число товаров одного артикула')
+    parser.add_argument('--unshelved', type=float, default=0.1, help='доля товаров без полки')
+    parser.add_argument('--days', type=int, default=90, help='за сколько дней распределить даты создания')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--manifest', default='benchmarks/tenants.json')
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    tenants = []
+    with app.app_context():
+        for i in range(args.companies):
+            domain = f"{args.prefix}{i + 1}"
+            if Company.query.filter_by(domain=domain).first():
+                print(f"Компания {domain} уже существует, пропускаем")
+                continue
+            started = time.perf_counter()
+            tenant = generate_company(rng, domain, args)
+            tenants.append(tenant)
+            print(f"{domain}: {tenant['counts']} за {time.perf_counter() - started:.1f} с")
+    with open(args.manifest, 'w', encoding='utf-8') as f:
+        json.dump({"generated_at": datetime.now(timezone.utc).isoformat(), "seed": args.seed, "tenants": tenants},
+                  f, ensure_ascii=False, indent=2)
+    print(f"Описание компаний записано в {args.manifest}")
+if __name__ == '__main__':
+    main()
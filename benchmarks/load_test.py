@@ -0,0 +1,326 @@
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+
+# Нагрузочный тест HTTP против запущенного сервера.
+# Компании берутся из manifest, созданного benchmarks.generate_data. Каждый виртуальный пользователь —
+# отдельный поток со своей сессией; роль выбирается по --mix, действие — по весам ACTIONS.
+# Запуск из корня проекта (сервер уже запущен):
+#   python -m benchmarks.load_test --url http://127.0.0.1:5000 --users 20 --duration 60 --output run.json
+#   python -m benchmarks.load_test ... --compare run.json
+ACTIONS = {
+    'owner': [
+        ('owner_dashboard', 1),
+        ('owner_products_page', 3),
+        ('owner_requests_api', 3),
+    ],
+    'worker': [
+        ('worker_products_page', 4),
+        ('worker_shelves', 1),
+        ('upload_qr', 2),
+    ],
+    'customer': [
+        ('customer_dashboard', 1),
+        ('customer_search', 4),
+        ('customer_requests_api', 2),
+    ]
+}
+# Сколько страниц подряд листает пользователь в списках (по курсору next_cursor)
+MAX_PAGES = 3
+class ActionError(Exception):
+    pass
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+def make_qr_image(text):
+    """PNG с QR-кодом для /upload_qr (OpenCV уже есть в зависимостях приложения)"""
+    import cv2
+    import numpy as np
+    qr = cv2.QRCodeEncoder.create().encode(text)
+    qr = cv2.resize(qr, None, fx=8, fy=8, interpolation=cv2.INTER_NEAREST)
+    qr = cv2.copyMakeBorder(qr, 32, 32, 32, 32, cv2.BORDER_CONSTANT, value=255)
+    ok, encoded = cv2.imencode('.png', qr.astype(np.uint8))
+    if not ok:
+        raise RuntimeError('Не удалось закодировать изображение')
+    return encoded.tobytes()
+def multipart_body(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content, content_type) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {content_type}\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+class Stats:
+    """Время ответа по действиям (общий объект для всех потоков)"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.errors = {}
+        self.statuses = {}
+        self.bytes = 0
+    def record(self, action, elapsed, status, size, error=None):
+        with self.lock:
+            self.timings.setdefault(action, []).append(elapsed)
+            self.statuses.setdefault(action, {})
+            self.statuses[action][status] = self.statuses[action].get(status, 0) + 1
+            self.bytes += size
+            if error is not None:
+                errors = self.errors.setdefault(action, {})
+                errors[error] = errors.get(error, 0) + 1
+def percentile(values, p):
+    """Процентиль по отсортированному списку (метод nearest-rank)"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+def summarize(timings, errors, duration):
+    values = sorted(timings)
+    error_count = sum(errors.values())
+    return {
+        "count": len(values),
+        "errors": error_count,
+        "rps": round(len(values) / duration, 2) if duration else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0
+    }
+class VirtualUser(threading.Thread):
+    def __init__(self, index, role, tenant, args, stats, stop_at, measure_from):
+        super().__init__(daemon=True)
+        self.role = role
+        self.tenant = tenant
+        self.args = args
+        self.stats = stats
+        self.stop_at = stop_at
+        self.measure_from = measure_from
+        self.rng = random.Random(args.seed * 1000 + index)
+        emails = tenant['users'][role]
+        self.email = emails[index % len(emails)]
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect)
+        self.etags = {}
+        self.actions, self.weights = zip(*ACTIONS[role])
+    def request(self, path, params=None, data=None, content_type=None):
+        """Один HTTP-запрос: возвращает (статус, тело); 3xx и 304 не считаются ошибкой"""
+        url = self.args.url.rstrip('/') + path
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        headers = {}
+        if content_type:
+            headers['Content-Type'] = content_type
+        if self.args.revalidate and data is None and url in self.etags:
+            headers['If-None-Match'] = self.etags[url]
+        req = urllib.request.Request(url, data=data, headers=headers)
+        try:
+            with self.opener.open(req, timeout=self.args.timeout) as response:
+                body = response.read()
+                if self.args.revalidate and response.headers.get('ETag'):
+                    self.etags[url] = response.headers['ETag']
+                return response.status, body
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            if e.code < 400:
+                return e.code, body
+            raise ActionError(f'HTTP {e.code}')
+    def login(self):
+        data = urllib.parse.urlencode({'domain': self.tenant['domain'], 'email': self.email,
+                                       'password': self.tenant['password'], 'role': self.role}).encode()
+        status, _ = self.request('/login', data=data, content_type='application/x-www-form-urlencoded')
+        # Успешный вход — редирект на панель роли, ошибка — форма входа со статусом 200
+        if status != 302:
+            raise ActionError(f'Не удалось войти как {self.email}')
+    def json(self, path, params=None):
+        status, body = self.request(path, params)
+        if status == 304:
+            return status, None, len(body)
+        try:
+            return status, json.loads(body), len(body)
+        except ValueError:
+            raise ActionError('Ответ не JSON')
+    def page(self, path, params):
+        """Листание списка по курсору: до MAX_PAGES страниц или до конца"""
+        params = dict(params, limit=self.args.page_size)
+        size = 0
+        status = 200
+        for _ in range(self.rng.randint(1, MAX_PAGES)):
+            status, data, length = self.json(path, params)
+            size += length
+            if data is None or not data.get('has_more'):
+                break
+            params['after'] = data['next_cursor']
+        return status, size
+    def html(self, path, params=None):
+        status, body = self.request(path, params)
+        return status, len(body)
+    def owner_dashboard(self):
+        return self.html('/owner_dashboard')
+    def owner_products_page(self):
+        return self.page('/get_products', {})
+    def owner_requests_api(self):
+        status = self.rng.choice(['all', 'all', 'new', 'in-progress'])
+        return self.page('/api/owner_requests', {'status': status})
+    def worker_products_page(self):
+        return self.page('/get_products', {})
+    def worker_shelves(self):
+        return self.html('/get_shelves')
+    def upload_qr(self):
+        content = self.args.image_bytes
+        if self.args.unique_images:
+            # Хвост после IEND не меняет картинку, но меняет хэш — кэш распознавания не срабатывает
+            content += os.urandom(16)
+        body, content_type = multipart_body({}, {'file': ('label.png', content, 'image/png')})
+        status, response = self.request('/upload_qr', data=body, content_type=content_type)
+        if not json.loads(response).get('success'):
+            raise ActionError('QR не распознан')
+        return status, len(response)
+    def customer_dashboard(self):
+        return self.html('/customer_dashboard')
+    def customer_search(self):
+        article = self.rng.choice(self.tenant['articles'])
+        return self.html('/customer_search', {'q': article[:self.rng.randint(5, len(article))]})
+    def customer_requests_api(self):
+        return self.page('/api/customer_requests', {})
+    def run(self):
+        try:
+            self.login()
+        except (ActionError, OSError) as e:
+            self.stats.record('login', 0.0, 'error', 0, str(e))
+            return
+        while time.monotonic() < self.stop_at:
+            action = self.rng.choices(self.actions, self.weights)[0]
+            started = time.monotonic()
+            status, size, error = 'error', 0, None
+            try:
+                status, size = getattr(self, action)()
+            except ActionError as e:
+                error = str(e)
+            except OSError as e:
+                error = type(e).__name__
+            if started >= self.measure_from:
+                self.stats.record(action, time.monotonic() - started, status, size, error)
+            if self.args.think_time:
+                time.sleep(self.rng.uniform(0, self.args.think_time * 2))
+def parse_mix(value):
+    """Доли ролей: owner=1,worker=3,customer=6"""
+    mix = {}
+    for part in value.split(','):
+        role, _, weight = part.partition('=')
+        if role.strip() not in ACTIONS:
+            raise argparse.ArgumentTypeError(f'Неизвестная роль {role}')
+        mix[role.strip()] = float(weight or 1)
+    return mix
+def assign_roles(users, mix, tenants):
+    """Распределить виртуальных пользователей по ролям пропорционально mix (роли без учетных записей пропускаются)"""
+    roles = [role for role in mix if mix[role] > 0 and all(tenant['users'].get(role) for tenant in tenants)]
+    total = sum(mix[role] for role in roles)
+    assigned = []
+    for role in roles:
+        assigned += [role] * max(1, round(users * mix[role] / total))
+    return assigned[:max(users, len(roles))]
+def build_report(stats, args, duration):
+    actions = {action: summarize(timings, stats.errors.get(action, {}), duration)
+               for action, timings in sorted(stats.timings.items())}
+    all_timings = [value for action, timings in stats.timings.items() if action != 'login' for value in timings]
+    all_errors = {}
+    for action, errors in stats.errors.items():
+        for message, count in errors.items():
+            all_errors[f'{action}: {message}'] = count
+    return {
+        "started_at": args.started_at,
+        "url": args.url,
+        "users": args.users,
+        "duration": round(duration, 1),
+        "revalidate": args.revalidate,
+        "total": summarize(all_timings, all_errors, duration),
+        "actions": actions,
+        "statuses": {action: {str(status): count for status, count in statuses.items()}
+                     for action, statuses in sorted(stats.statuses.items())},
+        "errors": all_errors,
+        "megabytes": round(stats.bytes / 1024 / 1024, 2)
+    }
+def format_delta(current, baseline):
+    if not baseline:
+        return ''
+    return f' ({(current - baseline) / baseline * 100:+.0f}%)'
+def print_report(report, baseline=None):
+    columns = ['count', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+    print(f"\n{report['users']} пользователей, {report['duration']} с, {report['megabytes']} МБ получено")
+    print(f"{'действие':<24}" + ''.join(f'{column:>18}' for column in columns))
+    rows = list(report['actions'].items()) + [('ИТОГО', report['total'])]
+    for action, row in rows:
+        base = (baseline or {}).get('actions', {}).get(action) if action != 'ИТОГО' else (baseline or {}).get('total')
+        cells = []
+        for column in columns:
+            delta = format_delta(row[column], base.get(column)) if base and column not in ('count', 'errors') else ''
+            cells.append(f'{str(row[column]) + delta:>18}')
+        print(f'{action:<24}' + ''.join(cells))
+    for message, count in sorted(report['errors'].items(), key=lambda item: -item[1])[:10]:
+        print(f'  ошибка {message}: {count}')
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест HTTP по синтетическим компаниям')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--manifest', default='benchmarks/tenants.json')
+    parser.add_argument('--users', type=int, default=10, help='число виртуальных пользователей (потоков)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('owner=1,worker=3,customer=6'))
+    parser.add_argument('--duration', type=float, default=30, help='длительность измерения, с')
+    parser.add_argument('--warmup', type=float, default=5, help='прогрев без учета в отчете, с')
+    parser.add_argument('--think-time', type=float, default=0, help='средняя пауза между действиями, с')
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--revalidate', action='store_true', help='повторные GET с If-None-Match (ETag)')
+    parser.add_argument('--image', help='изображение для /upload_qr (по умолчанию генерируется QR)')
+    parser.add_argument('--unique-images', action='store_true', help='каждая загрузка с новым хэшем (без кэша)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='сохранить отчет в JSON')
+    parser.add_argument('--compare', help='сравнить с отчетом предыдущего запуска (JSON)')
+    args = parser.parse_args()
+    args.started_at = datetime.now(timezone.utc).isoformat()
+    with open(args.manifest, encoding='utf-8') as f:
+        tenants = json.load(f)['tenants']
+    if not tenants:
+        parser.error('В manifest нет компаний')
+    if 'worker' in args.mix:
+        if args.image:
+            with open(args.image, 'rb') as f:
+                args.image_bytes = f.read()
+        else:
+            article = tenants[0]['articles'][0] if tenants[0]['articles'] else 'BENCH'
+            args.image_bytes = make_qr_image(json.dumps({"article": article}))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    stats = Stats()
+    measure_from = time.monotonic() + args.warmup
+    stop_at = measure_from + args.duration
+    roles = assign_roles(args.users, args.mix, tenants)
+    threads = [VirtualUser(i, role, tenants[i % len(tenants)], args, stats, stop_at, measure_from)
+               for i, role in enumerate(roles)]
+    print(f"Пользователи: {', '.join(f'{role}={roles.count(role)}' for role in ACTIONS if role in roles)}; "
+          f"прогрев {args.warmup:g} с, измерение {args.duration:g} с")
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report = build_report(stats, args, args.duration)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'Отчет записан в {args.output}')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from qr_decoder import decode_qr, decode_qr_multi, DEFAULT_MAX_SIDE, MULTI_MAX_SIDE
+from benchmarks.load_test import percentile, format_delta
+
+# Пропускная способность распознавания QR на корпусе benchmarks.qr_corpus.
+# Каждый режим (один поток, пул потоков, пул процессов) запускается в отдельном свежем процессе,
+# чтобы пик памяти одного режима не влиял на другие. Кэш распознавания приложения не используется —
+# замеряется сам движок qr_decoder.
+# Запуск из корня проекта:
+#   python -m benchmarks.qr_benchmark --corpus benchmarks/qr_corpus --workers 4 --output qr.json
+#   python -m benchmarks.qr_benchmark ... --compare qr.json
+MODES = ['single', 'threads', 'processes']
+def decode_task(task):
+    """Распознать один снимок корпуса; возвращает только простые типы (для пула процессов)"""
+    path, mode, expected, max_side = task
+    started = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+        if mode == 'multi':
+            result = decode_qr_multi(content, max_side or MULTI_MAX_SIDE)
+            found = {code.data for code in result.codes}
+        else:
+            result = decode_qr(content, max_side or DEFAULT_MAX_SIDE)
+            found = {result.data} if result.data else set()
+        stage, error = result.stage, None
+    except Exception as e:
+        found, stage, error = set(), None, str(e)
+    return {
+        "decoded": len(found & set(expected)),
+        "expected": len(expected),
+        # Прочитанный текст, которого нет на снимке, — ложное срабатывание
+        "wrong": len(found - set(expected)),
+        "stage": stage,
+        "ms": (time.perf_counter() - started) * 1000,
+        "error": error
+    }
+def peak_rss_mb(who):
+    # ru_maxrss в Linux — в килобайтах
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+def run_mode(mode, workers, tasks, queue):
+    """Один режим замера; выполняется в отдельном процессе, результат кладется в queue"""
+    if mode == 'single':
+        decode_task(tasks[0])
+        started, cpu_started = time.perf_counter(), os.times()
+        results = [decode_task(task) for task in tasks]
+    elif mode == 'threads':
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Прогрев: детекторы OpenCV создаются по одному на поток
+            list(pool.map(decode_task, tasks[:workers]))
+            started, cpu_started = time.perf_counter(), os.times()
+            results = list(pool.map(decode_task, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Прогрев: запуск процессов и импорт OpenCV не входят в замер
+            list(pool.map(decode_task, tasks[:workers]))
+            started, cpu_started = time.perf_counter(), os.times()
+            results = list(pool.map(decode_task, tasks, chunksize=1))
+    elapsed = time.perf_counter() - started
+    cpu = os.times()
+    cpu_seconds = (cpu.user - cpu_started.user) + (cpu.system - cpu_started.system) + \
+                  (cpu.children_user - cpu_started.children_user) + \
+                  (cpu.children_system - cpu_started.children_system)
+    queue.put({
+        "results": results,
+        "elapsed": elapsed,
+        # Время процессора дочерних процессов учитывается только после их завершения (выход из with)
+        "cpu_seconds": cpu_seconds,
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF),
+        "worker_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if mode == 'processes' else None
+    })
+def run_isolated(mode, workers, tasks):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=run_mode, args=(mode, workers, tasks, queue))
+    process.start()
+    outcome = queue.get()
+    process.join()
+    return outcome
+def summarize(results, elapsed, workers):
+    """Сводка по списку результатов decode_task"""
+    timings = sorted(result['ms'] for result in results)
+    decoded = sum(result['decoded'] for result in results)
+    expected = sum(result['expected'] for result in results)
+    images_per_second = len(results) / elapsed if elapsed else 0.0
+    stages = {}
+    for result in results:
+        stage = result['stage'] or 'failed'
+        stages[stage] = stages.get(stage, 0) + 1
+    return {
+        "images": len(results),
+        "images_per_second": round(images_per_second, 2),
+        "images_per_second_per_core": round(images_per_second / workers, 2),
+        "success_rate": round(decoded / expected, 4) if expected else 0.0,
+        "images_ok": sum(1 for result in results if result['decoded'] == result['expected']),
+        "wrong": sum(result['wrong'] for result in results),
+        "errors": sum(1 for result in results if result['error']),
+        "p50_ms": round(percentile(timings, 50), 1),
+        "p95_ms": round(percentile(timings, 95), 1),
+        "max_ms": round(timings[-1], 1) if timings else 0.0,
+        "stages": stages
+    }
+def benchmark(mode, workers, tasks, categories):
+    outcome = run_isolated(mode, workers, tasks)
+    cores = 1 if mode == 'single' else min(workers, os.cpu_count() or 1)
+    report = summarize(outcome['results'], outcome['elapsed'], cores)
+    report.update({
+        "workers": 1 if mode == 'single' else workers,
+        "seconds": round(outcome['elapsed'], 2),
+        "cpu_utilization": round(outcome['cpu_seconds'] / outcome['elapsed'], 2) if outcome['elapsed'] else 0.0,
+        "peak_rss_mb": outcome['peak_rss_mb'],
+        "worker_peak_rss_mb": outcome['worker_peak_rss_mb']
+    })
+    by_category = {}
+    for category, result in zip(categories, outcome['results']):
+        by_category.setdefault(category, []).append(result)
+    report['categories'] = {category: summarize(results, sum(r['ms'] for r in results) / 1000, 1)
+                            for category, results in by_category.items()}
+    return report
+def print_report(report, baseline=None):
+    columns = ['workers', 'images_per_second', 'images_per_second_per_core', 'success_rate', 'p50_ms', 'p95_ms',
+               'peak_rss_mb']
+    titles = ['потоки', 'снимков/с', 'снимков/с/ядро', 'успех', 'p50_ms', 'p95_ms', 'память_мб']
+    print(f"\nКорпус {report['corpus']}: {report['images']} снимков x{report['repeat']}, ядер {report['cpu_count']}")
+    print(f"{'режим':<12}" + ''.join(f'{title:>22}' for title in titles))
+    for mode, row in report['modes'].items():
+        base = (baseline or {}).get('modes', {}).get(mode)
+        cells = []
+        for column in columns:
+            value = row[column]
+            if column == 'peak_rss_mb' and row['worker_peak_rss_mb']:
+                value = f"{value}+{row['worker_peak_rss_mb']}"
+            delta = format_delta(row[column], base.get(column)) if base and column != 'workers' else ''
+            cells.append(f'{str(value) + delta:>22}')
+        print(f'{mode:<12}' + ''.join(cells))
+    first = next(iter(report['modes'].values()), None)
+    if first:
+        print(f"\n{'категория':<12}{'успех':>10}{'p50_ms':>10}{'p95_ms':>10}  стадии")
+        for category, row in first['categories'].items():
+            stages = ', '.join(f'{stage}={count}' for stage, count in sorted(row['stages'].items()))
+            print(f"{category:<12}{row['success_rate']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}  {stages}")
+def main():
+    parser = argparse.ArgumentParser(description='Пропускная способность распознавания QR')
+    parser.add_argument('--corpus', default='benchmarks/qr_corpus')
+    parser.add_argument('--modes', default=','.join(MODES), help=f'через запятую из: {", ".join(MODES)}')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='размер пулов потоков и процессов')
+    parser.add_argument('--repeat', type=int, default=1, help='сколько раз пройти корпус')
+    parser.add_argument('--categories', help='только эти категории корпуса (через запятую)')
+    parser.add_argument('--max-side', type=int, help='размер уменьшенного изображения для первой стадии')
+    parser.add_argument('--output', help='сохранить отчет в JSON')
+    parser.add_argument('--compare', help='сравнить с отчетом предыдущего запуска (JSON)')
+    args = parser.parse_args()
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    if set(modes) - set(MODES):
+        parser.error(f'Неизвестные режимы: {", ".join(sorted(set(modes) - set(MODES)))}')
+    with open(os.path.join(args.corpus, 'manifest.json'), encoding='utf-8') as f:
+        images = json.load(f)['images']
+    if args.categories:
+        selected = {category.strip() for category in args.categories.split(',')}
+        images = [image for image in images if image['category'] in selected]
+    if not images:
+        parser.error('В корпусе нет снимков (сначала запустите benchmarks.qr_corpus)')
+    images = images * args.repeat
+    tasks = [(os.path.join(args.corpus, image['file']), image['mode'], image['expected'], args.max_side)
+             for image in images]
+    categories = [image['category'] for image in images]
+    report = {
+        "corpus": args.corpus,
+        "images": len(images) // args.repeat,
+        "repeat": args.repeat,
+        "cpu_count": os.cpu_count(),
+        "max_side": args.max_side,
+        "modes": {}
+    }
+    for mode in modes:
+        print(f'Режим {mode}...', flush=True)
+        report['modes'][mode] = benchmark(mode, args.workers, tasks, categories)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'Отчет записан в {args.output}')
+if __name__ == '__main__':
+    main()
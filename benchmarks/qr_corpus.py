@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import random
+import time
+import cv2
+import numpy as np
+
+# Корпус снимков QR-этикеток для замеров распознавания (benchmarks.qr_benchmark).
+# Этикетки содержат JSON товара, как ожидает upload_qr, и искажаются так же, как фотографии с телефона:
+# размытие, перспектива, блик, шум и сжатие JPEG, снимки 12 Мп, несколько кодов в кадре.
+# Запуск из корня проекта:
+#   python -m benchmarks.qr_corpus --count 20 --output benchmarks/qr_corpus
+# В каталог пишутся изображения и manifest.json с ожидаемым содержимым каждого снимка.
+CATEGORIES = ['clean', 'blur', 'motion', 'perspective', 'glare', 'noise', 'photo12mp', 'multi', 'combined']
+PHOTO_SIZE = (1600, 1200)
+PHOTO_12MP_SIZE = (4032, 3024)
+NAMES = ['Болт M8', 'Гайка M6', 'Кабель ВВГ 3x2.5', 'Лампа LED 10W', 'Фильтр масляный', 'Насос дренажный']
+def make_payload(rng):
+    return json.dumps({
+        "article": f"QR{rng.randint(0, 9999999):07d}",
+        "name": rng.choice(NAMES),
+        "price": str(rng.randint(10, 50000))
+    }, ensure_ascii=False)
+def render_label(text, module):
+    """Этикетка: QR-код с полем тишины на белой карточке, серое изображение"""
+    qr = cv2.QRCodeEncoder.create().encode(text)
+    qr = cv2.resize(qr, None, fx=module, fy=module, interpolation=cv2.INTER_NEAREST)
+    margin = module * 4
+    label = cv2.copyMakeBorder(qr, margin, margin * 3, margin, margin, cv2.BORDER_CONSTANT, value=255)
+    article = json.loads(text)['article']
+    cv2.putText(label, article, (margin, label.shape[0] - margin), cv2.FONT_HERSHEY_SIMPLEX,
+                module / 4, 0, max(1, module // 3), cv2.LINE_AA)
+    return label
+def make_background(rng, size):
+    """Фон снимка: неравномерное освещение и текстура (стол, паллета)"""
+    width, height = size
+    base = rng.uniform(90, 170)
+    gx = np.linspace(-1, 1, width, dtype=np.float32)[None, :] * rng.uniform(-30, 30)
+    gy = np.linspace(-1, 1, height, dtype=np.float32)[:, None] * rng.uniform(-30, 30)
+    small = np.random.default_rng(rng.randint(0, 2 ** 32 - 1)).normal(0, 12, (height // 16 + 1, width // 16 + 1))
+    texture = cv2.resize(small.astype(np.float32), (width, height), interpolation=cv2.INTER_LINEAR)
+    return base + gx + gy + texture
+def place(background, label, center, angle, perspective, rng):
+    """Вклеить этикетку в кадр с поворотом и перспективой; возвращает углы кода в координатах кадра"""
+    h, w = label.shape[:2]
+    corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    theta = np.deg2rad(angle)
+    rotation = np.float32([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    target = (corners - (w / 2, h / 2)) @ rotation.T
+    if perspective:
+        target += np.float32([[rng.uniform(-perspective, perspective) * w,
+                               rng.uniform(-perspective, perspective) * h] for _ in range(4)])
+    target += np.float32(center)
+    matrix = cv2.getPerspectiveTransform(corners, target.astype(np.float32))
+    height, width = background.shape[:2]
+    warped = cv2.warpPerspective(label.astype(np.float32), matrix, (width, height), flags=cv2.INTER_LINEAR)
+    mask = cv2.warpPerspective(np.ones((h, w), np.float32), matrix, (width, height), flags=cv2.INTER_LINEAR)
+    # Бумага светлее фона, но не идеально белая
+    background *= 1 - mask
+    background += warped * mask * rng.uniform(0.8, 1.0)
+    return target
+def add_glare(image, rng, strength):
+    height, width = image.shape[:2]
+    cx, cy = rng.uniform(0.2, 0.8) * width, rng.uniform(0.2, 0.8) * height
+    radius = rng.uniform(0.1, 0.25) * max(width, height)
+    y, x = np.ogrid[:height, :width]
+    spot = np.exp(-(((x - cx) ** 2 + (y - cy) ** 2) / (2 * radius ** 2))).astype(np.float32)
+    image += spot * strength
+def add_blur(image, sigma):
+    return cv2.GaussianBlur(image, (0, 0), sigma)
+def add_motion_blur(image, length, angle):
+    kernel = np.zeros((length, length), np.float32)
+    kernel[length // 2, :] = 1.0 / length
+    matrix = cv2.getRotationMatrix2D((length / 2 - 0.5, length / 2 - 0.5), angle, 1.0)
+    kernel = cv2.warpAffine(kernel, matrix, (length, length))
+    return cv2.filter2D(image, -1, kernel / max(kernel.sum(), 1e-6))
+def add_noise(image, rng, sigma):
+    noise = np.random.default_rng(rng.randint(0, 2 ** 32 - 1)).normal(0, sigma, image.shape)
+    image += noise.astype(np.float32)
+def to_bgr(image, rng):
+    """Серый кадр в цветной с небольшим оттенком освещения (баланс белого камеры)"""
+    gray = np.clip(image, 0, 255)
+    tint = np.float32([rng.uniform(0.9, 1.05), 1.0, rng.uniform(0.9, 1.1)])
+    return np.clip(gray[:, :, None] * tint, 0, 255).astype(np.uint8)
+def render_photo(rng, category):
+    """Один снимок категории; возвращает (изображение BGR, [ожидаемые тексты], качество JPEG)"""
+    size = PHOTO_12MP_SIZE if category in ('photo12mp', 'multi') else PHOTO_SIZE
+    image = make_background(rng, size)
+    width, height = size
+    count = rng.randint(3, 6) if category == 'multi' else 1
+    payloads = [make_payload(rng) for _ in range(count)]
+    perspective = {'perspective': 0.12, 'combined': 0.08}.get(category, 0.02)
+    if category == 'multi':
+        # Этикетки в сетке, чтобы не перекрывались: на паллете или полке
+        columns = 3
+        cell_w, cell_h = width / columns, height / 2
+        cells = rng.sample(range(columns * 2), count)
+        for payload, cell in zip(payloads, cells):
+            center = ((cell % columns + 0.5) * cell_w + rng.uniform(-0.1, 0.1) * cell_w,
+                      (cell // columns + 0.5) * cell_h + rng.uniform(-0.1, 0.1) * cell_h)
+            label = render_label(payload, rng.randint(9, 12))
+            place(image, label, center, rng.uniform(-20, 20), perspective, rng)
+    else:
+        # На снимке 12 Мп код занимает небольшую часть кадра, как при съемке с расстояния
+        module = rng.randint(8, 12) if category == 'photo12mp' else rng.randint(5, 8)
+        label = render_label(payloads[0], module)
+        center = (width * rng.uniform(0.35, 0.65), height * rng.uniform(0.35, 0.65))
+        place(image, label, center, rng.uniform(-30, 30), perspective, rng)
+    if category in ('glare', 'combined'):
+        add_glare(image, rng, rng.uniform(80, 140))
+    if category == 'blur':
+        image = add_blur(image, rng.uniform(1.5, 2.5))
+    if category == 'motion':
+        image = add_motion_blur(image, rng.randint(5, 9), rng.uniform(0, 180))
+    if category == 'combined':
+        image = add_blur(image, rng.uniform(0.8, 1.5))
+    if category in ('noise', 'combined', 'photo12mp', 'multi'):
+        add_noise(image, rng, rng.uniform(4, 12) if category in ('noise', 'combined') else 3)
+    quality = rng.randint(35, 60) if category in ('noise', 'combined') else rng.randint(80, 92)
+    return to_bgr(image, rng), payloads, quality
+def generate(output, count, categories, seed):
+    rng = random.Random(seed)
+    os.makedirs(output, exist_ok=True)
+    images = []
+    for category in categories:
+        started = time.perf_counter()
+        for i in range(count):
+            image, payloads, quality = render_photo(rng, category)
+            filename = f'{category}_{i:03d}.jpg'
+            cv2.imwrite(os.path.join(output, filename), image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            images.append({
+                "file": filename,
+                "category": category,
+                "mode": 'multi' if category == 'multi' else 'single',
+                "width": image.shape[1],
+                "height": image.shape[0],
+                "expected": payloads
+            })
+        print(f'{category}: {count} снимков за {time.perf_counter() - started:.1f} с')
+    with open(os.path.join(output, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({"seed": seed, "images": images}, f, ensure_ascii=False, indent=2)
+    return images
+def main():
+    parser = argparse.ArgumentParser(description='Корпус снимков QR-этикеток для замеров распознавания')
+    parser.add_argument('--output', default='benchmarks/qr_corpus')
+    parser.add_argument('--count', type=int, default=20, help='снимков на категорию')
+    parser.add_argument('--categories', default=','.join(CATEGORIES),
+                        help=f'через запятую из: {", ".join(CATEGORIES)}')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    categories = [category.strip() for category in args.categories.split(',') if category.strip()]
+    unknown = set(categories) - set(CATEGORIES)
+    if unknown:
+        parser.error(f'Неизвестные категории: {", ".join(sorted(unknown))}')
+    images = generate(args.output, args.count, categories, args.seed)
+    print(f'{len(images)} снимков записано в {args.output}')
+if __name__ == '__main__':
+    main()
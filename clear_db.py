@@ -1,7 +1,16 @@
-from app import app, db, Shelf
+from app import app, db, Shelf, Product, bump_data_versions, rebuild_stats
 
 with app.app_context():
-    # Удаляем все полки из базы данных
+    # Удаляем все полки из базы данных; товары с них остаются без полки
+    owners = {(company_id, 'shelves', user_id) for company_id, user_id in
+              db.session.query(Shelf.company_id, Shelf.user_id).distinct()}
+    shelved = Product.query.filter(Product.shelf_id.isnot(None))
+    owners |= {(company_id, 'products', user_id) for company_id, user_id in
+               shelved.with_entities(Product.company_id, Product.user_id).distinct()}
+    shelved.update({'shelf_id': None}, synchronize_session=False)
     db.session.query(Shelf).delete()
-    db.session.commit()
+    # Массовые UPDATE и DELETE проходят мимо flush: версии данных (ETag, кэш фрагментов) увеличиваем явно
+    bump_data_versions(db.session.connection(), owners)
+    # Счетчики статистики пересчитываются и коммитятся в той же транзакции, что и удаление
+    rebuild_stats()
     print("Все полки успешно удалены из базы данных.")
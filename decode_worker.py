@@ -0,0 +1,32 @@
+import multiprocessing
+import signal
+import sys
+from app import app, run_decode_worker, requeue_stale_decode_jobs
+
+# Обработчики очереди фонового распознавания (upload_qr с async=1).
+# Запуск: python decode_worker.py [число процессов]; по умолчанию DECODE_JOB_WORKERS
+def work(stop):
+    # Остановку выполняет родительский процесс через stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    with app.app_context():
+        run_decode_worker(stop)
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else app.config['DECODE_JOB_WORKERS']
+    with app.app_context():
+        requeued = requeue_stale_decode_jobs()
+    if requeued:
+        print(f"Возвращено в очередь зависших заданий: {requeued}")
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    processes = [context.Process(target=work, args=(stop,), name=f'decode-worker-{i + 1}') for i in range(workers)]
+    for process in processes:
+        process.start()
+    print(f"Обработчиков распознавания запущено: {workers}")
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for process in processes:
+            process.join()
@@ -0,0 +1,28 @@
+import sys
+from app import app, Company, User, import_format, import_products
+
+# Импорт товаров из CSV/NDJSON (можно .gz) от имени пользователя компании.
+# Запуск: python import_products.py <домен компании> <email пользователя> <файл> [csv|ndjson]
+def print_progress(report):
+    print(f"Строк: {report['rows']}, добавлено товаров: {report['created']}, "
+          f"создано полок: {report['shelves_created']}, ошибок: {report['error_count']}")
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        print("Использование: python import_products.py <домен> <email> <файл> [csv|ndjson]")
+        sys.exit(2)
+    domain, email, path = sys.argv[1:4]
+    fmt = import_format(path, sys.argv[4] if len(sys.argv) > 4 else None)
+    with app.app_context():
+        company = Company.query.filter_by(domain=domain).first()
+        user = User.query.filter_by(email=email, company_id=company.id).first() if company else None
+        if user is None:
+            print("Пользователь не найден")
+            sys.exit(1)
+        with open(path, 'rb') as f:
+            report = import_products(user, f, fmt, progress=print_progress)
+    for error in report['errors']:
+        print(f"Строка {error['row']}: {error['message']}")
+    if report['aborted']:
+        print(report['message'])
+        sys.exit(1)
+    print("Импорт завершен")
@@ -0,0 +1,107 @@
+import bisect
+import math
+import threading
+
+# Счетчики и гистограммы процесса в текстовом формате Prometheus.
+# Значения хранятся в памяти процесса; каждый процесс gunicorn отдает свои, суммирование по
+# процессам (sum by) выполняется на стороне Prometheus.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+def format_labels(key):
+    if not key:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in key)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + '}'
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+class MetricCounter:
+    """Монотонный счетчик с метками"""
+    kind = 'counter'
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+    def inc(self, value=1, **labels):
+        key = label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(label_key(labels), 0)
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, key, value
+class MetricHistogram:
+    """Гистограмма с метками: число наблюдений по корзинам, сумма и количество"""
+    kind = 'histogram'
+    def __init__(self, name, help_text, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+    def observe(self, value, **labels):
+        key = label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', key + (('le', format_value(float(bound))),), cumulative
+            yield f'{self.name}_sum', key, total
+            yield f'{self.name}_count', key, cumulative
+class MetricCollector:
+    """Значения, вычисляемые при каждом чтении метрик: collect() -> [(метки dict, значение)]"""
+    def __init__(self, name, kind, help_text, collect):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.collect = collect
+    def samples(self):
+        for labels, value in self.collect():
+            yield self.name, label_key(labels), value
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    def counter(self, name, help_text):
+        return self.register(MetricCounter(name, help_text))
+    def histogram(self, name, help_text, buckets=DURATION_BUCKETS):
+        return self.register(MetricHistogram(name, help_text, buckets))
+    def collector(self, name, kind, help_text, collect):
+        return self.register(MetricCollector(name, kind, help_text, collect))
+    def render(self, on_error=None):
+        """Все метрики в текстовом формате; ошибка одного сборщика не мешает остальным"""
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                if on_error is not None:
+                    on_error(metric.name, e)
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, key, value in samples:
+                lines.append(f'{name}{format_labels(key)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
@@ -1,15 +1,408 @@
-from app import app, db
-from sqlalchemy import text
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from sqlalchemy import text, inspect, select, func, MetaData, Table, Column, Integer, String, DateTime, Text, \
+    ForeignKey, UniqueConstraint
+from sqlalchemy.schema import CreateIndex
+from app import app, db, Product, Shelf, User, Request, StatCounter, DecodeJob, DataVersion, RequestEvent, Sku, \
+    rebuild_stats, backfill_skus, ensure_product_search_index, drop_product_search_index
 
-with app.app_context():
-    # Проверяем существование столбца shelf_id
-    try:
-        # Пробуем выполнить запрос с shelf_id
-        db.session.execute(text("SELECT shelf_id FROM product LIMIT 1"))
-        print("Столбец shelf_id уже существует")
-    except Exception as e:
-        print(f"Столбца нет, добавляем: {e}")
-        # Добавляем столбец shelf_id
-        db.session.execute(text("ALTER TABLE product ADD COLUMN shelf_id INTEGER"))
-        db.session.commit()
-        print("Столбец shelf_id успешно добавлен")
\ No newline at end of file
+# Версионированные миграции схемы.
+# Запуск:
+#   python migrate_db.py                 — обновить до последней версии
+#   python migrate_db.py upgrade [N]     — обновить до версии N
+#   python migrate_db.py downgrade N     — откатить до версии N
+#   python migrate_db.py status          — текущая версия и ожидающие миграции
+#   python migrate_db.py check           — проверить индексы через EXPLAIN горячих запросов
+class IrreversibleMigration(Exception):
+    pass
+MIGRATIONS = []
+def migration(version, description):
+    """Регистрация миграции: декорирует функцию upgrade, возвращает объект с .downgrade"""
+    def decorator(upgrade):
+        entry = {'version': version, 'description': description, 'upgrade': upgrade, 'downgrade': None}
+        MIGRATIONS.append(entry)
+        def set_downgrade(downgrade):
+            entry['downgrade'] = downgrade
+            return downgrade
+        upgrade.downgrade = set_downgrade
+        return upgrade
+    return decorator
+# Служебные функции
+def ensure_version_table():
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, "
+            "description VARCHAR(255) NOT NULL, "
+            "applied_at VARCHAR(40) NOT NULL)"
+        ))
+def current_version():
+    with db.engine.connect() as conn:
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+def has_column(table, column):
+    return column in [c['name'] for c in inspect(db.engine).get_columns(table)]
+def find_index(name):
+    for table in db.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(f'Индекс {name} не объявлен в моделях')
+def index_exists(name, table):
+    return name in [ix['name'] for ix in inspect(db.engine).get_indexes(table)]
+def refresh_schema(conn):
+    """Перечитать схему SQLite в соединении из пула. Схема кэшируется в соединении, и DDL по устаревшей
+    копии ошибается: CREATE INDEX видит уже удаленный индекс, DROP INDEX IF EXISTS не видит созданный"""
+    if conn.dialect.name == 'sqlite':
+        conn.execute(text("SELECT COUNT(*) FROM sqlite_master"))
+def index_ddl(name, table, columns, unique, dialect):
+    """(таблица, CREATE INDEX) для create_index; на PostgreSQL индекс строится CONCURRENTLY"""
+    if table is None:
+        index = find_index(name)
+        table = index.table.name
+        ddl = str(CreateIndex(index).compile(dialect=dialect))
+    else:
+        ddl = f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})"
+    if dialect.name == 'postgresql':
+        # Без блокировки записи, в том числе для уникальных индексов
+        ddl = re.sub(r'^CREATE (UNIQUE )?INDEX ', r'CREATE \1INDEX CONCURRENTLY ', ddl)
+    return table, ddl
+def create_index(name, table=None, columns=None, unique=False):
+    """Построить индекс отдельной короткой транзакцией (CONCURRENTLY на PostgreSQL).
+
+    Без table и columns определение берется из текущих моделей. Миграция, индекс которой потом меняют
+    другие миграции, передает определение явно: так она строит его в том виде, каким он был при ее написании.
+    """
+    table, ddl = index_ddl(name, table, columns, unique, db.engine.dialect)
+    if index_exists(name, table):
+        print(f"  индекс {name} уже существует")
+        return
+    started = time.perf_counter()
+    if db.engine.dialect.name == 'postgresql':
+        # CONCURRENTLY нельзя выполнять внутри транзакции
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text(ddl))
+    else:
+        # SQLite держит блокировку записи только на время построения одного индекса
+        with db.engine.begin() as conn:
+            refresh_schema(conn)
+            conn.execute(text(ddl))
+    print(f"  индекс {name} построен за {time.perf_counter() - started:.2f} с")
+def drop_index(name):
+    with db.engine.begin() as conn:
+        refresh_schema(conn)
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    print(f"  индекс {name} удален")
+def analyze():
+    with db.engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+# Миграции
+# Схема исходной версии приложения. Зафиксирована здесь, а не берется из моделей (db.create_all): иначе на
+# пустой базе миграция 1 сразу создала бы таблицы, столбцы и индексы следующих миграций
+BASELINE = MetaData()
+Table('company', BASELINE,
+      Column('id', Integer, primary_key=True),
+      Column('domain', String(120), unique=True, nullable=False),
+      Column('name', String(120), nullable=False),
+      Column('created_at', DateTime))
+Table('user', BASELINE,
+      Column('id', Integer, primary_key=True),
+      Column('email', String(120), nullable=False),
+      Column('password', String(120), nullable=False),
+      Column('role', String(20), nullable=False),
+      Column('company_id', Integer, ForeignKey('company.id'), nullable=False),
+      UniqueConstraint('email', 'company_id', name='unique_email_per_company'))
+Table('shelf', BASELINE,
+      Column('id', Integer, primary_key=True),
+      Column('name', String(120), nullable=False),
+      Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+      Column('company_id', Integer, ForeignKey('company.id'), nullable=False))
+Table('product', BASELINE,
+      Column('id', Integer, primary_key=True),
+      Column('qr_content', String(255), nullable=False),
+      Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+      Column('company_id', Integer, ForeignKey('company.id'), nullable=False),
+      Column('shelf_id', Integer, ForeignKey('shelf.id'), nullable=True),
+      Column('created_at', DateTime))
+Table('request', BASELINE,
+      Column('id', Integer, primary_key=True),
+      Column('customer_id', Integer, ForeignKey('user.id'), nullable=False),
+      Column('product_id', Integer, ForeignKey('product.id'), nullable=True),
+      Column('company_id', Integer, ForeignKey('company.id'), nullable=False),
+      Column('status', String(20), nullable=False),
+      Column('created_at', DateTime),
+      Column('request_type', String(50)),
+      Column('priority', String(20)),
+      Column('description', Text))
+@migration(1, 'Базовая схема и столбец product.shelf_id')
+def baseline():
+    BASELINE.create_all(db.engine, checkfirst=True)
+    if not has_column('product', 'shelf_id'):
+        with db.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE product ADD COLUMN shelf_id INTEGER"))
+        print("  добавлен столбец product.shelf_id")
+@baseline.downgrade
+def baseline_down():
+    raise IrreversibleMigration('Базовую схему откатить нельзя')
+@migration(2, 'Счетчики статистики stat_counter')
+def stat_counters():
+    StatCounter.__table__.create(db.engine, checkfirst=True)
+    rebuild_stats()
+@stat_counters.downgrade
+def stat_counters_down():
+    StatCounter.__table__.drop(db.engine, checkfirst=True)
+# Определения зафиксированы: ix_request_customer_product миграция 9 заменяет уникальным, а в базе
+# с повторными заявками уникальный индекс на этом шаге не построится
+HOT_QUERY_INDEXES = [
+    ('ix_product_company_id_id', 'product', ['company_id', 'id']),
+    ('ix_product_company_user_id', 'product', ['company_id', 'user_id', 'id']),
+    ('ix_product_company_shelf_id', 'product', ['company_id', 'shelf_id', 'id']),
+    ('ix_product_company_created', 'product', ['company_id', 'created_at']),
+    ('ix_shelf_company_user', 'shelf', ['company_id', 'user_id']),
+    ('ix_request_company_id_id', 'request', ['company_id', 'id']),
+    ('ix_request_company_status_id', 'request', ['company_id', 'status', 'id']),
+    ('ix_request_company_customer_id', 'request', ['company_id', 'customer_id', 'id']),
+    ('ix_request_customer_product', 'request', ['customer_id', 'product_id']),
+]
+@migration(3, 'Составные индексы под горячие запросы')
+def hot_query_indexes():
+    for name, table, columns in HOT_QUERY_INDEXES:
+        create_index(name, table, columns)
+    analyze()
+@hot_query_indexes.downgrade
+def hot_query_indexes_down():
+    for name, _, _ in reversed(HOT_QUERY_INDEXES):
+        drop_index(name)
+@migration(4, 'Полнотекстовый индекс товаров product_fts')
+def product_search_index():
+    if not ensure_product_search_index(rebuild=True):
+        print("  FTS5 доступен только для SQLite, поиск будет работать через LIKE")
+@product_search_index.downgrade
+def product_search_index_down():
+    drop_product_search_index()
+@migration(5, 'Очередь фонового распознавания decode_job')
+def decode_jobs():
+    DecodeJob.__table__.create(db.engine, checkfirst=True)
+@decode_jobs.downgrade
+def decode_jobs_down():
+    DecodeJob.__table__.drop(db.engine, checkfirst=True)
+@migration(6, 'Снимки товаров: столбец product.image_hash')
+def product_images():
+    if not has_column('product', 'image_hash'):
+        with db.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE product ADD COLUMN image_hash VARCHAR(64)"))
+        print("  добавлен столбец product.image_hash")
+    create_index('ix_product_company_image')
+@product_images.downgrade
+def product_images_down():
+    drop_index('ix_product_company_image')
+    with db.engine.begin() as conn:
+        conn.execute(text("ALTER TABLE product DROP COLUMN image_hash"))
+@migration(7, 'Версии данных для условных GET (data_version)')
+def data_versions():
+    DataVersion.__table__.create(db.engine, checkfirst=True)
+@data_versions.downgrade
+def data_versions_down():
+    DataVersion.__table__.drop(db.engine, checkfirst=True)
+@migration(8, 'Журнал событий заявок для SSE (request_event)')
+def request_events():
+    RequestEvent.__table__.create(db.engine, checkfirst=True)
+@request_events.downgrade
+def request_events_down():
+    RequestEvent.__table__.drop(db.engine, checkfirst=True)
+REQUEST_COLUMNS = 'id, customer_id, product_id, company_id, status, created_at, request_type, priority, description'
+DUPLICATE_REQUESTS = ("product_id IS NOT NULL AND id NOT IN "
+                      "(SELECT MIN(id) FROM request WHERE product_id IS NOT NULL GROUP BY customer_id, product_id)")
+@migration(9, 'Идемпотентные сканирования (product.scan_key) и уникальная заявка на товар')
+def idempotent_scans():
+    if not has_column('product', 'scan_key'):
+        with db.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE product ADD COLUMN scan_key VARCHAR(64)"))
+        print("  добавлен столбец product.scan_key")
+    create_index('ix_product_company_scan_key', 'product', ['company_id', 'scan_key'], unique=True)
+    # Повторные заявки заказчика на один товар (последствия гонки проверки): в request остается первая,
+    # остальные переносятся в request_duplicate одной транзакцией; откат миграции возвращает их
+    with db.engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS request_duplicate AS SELECT {REQUEST_COLUMNS} "
+                          "FROM request WHERE 1 = 0"))
+        conn.execute(text(f"INSERT INTO request_duplicate ({REQUEST_COLUMNS}) SELECT {REQUEST_COLUMNS} "
+                          f"FROM request WHERE {DUPLICATE_REQUESTS}"))
+        moved = conn.execute(text(f"DELETE FROM request WHERE {DUPLICATE_REQUESTS}")).rowcount
+    if moved:
+        print(f"  повторные заявки перенесены в request_duplicate: {moved}")
+        rebuild_stats()
+    # Уникальный индекс строится под новым именем до удаления старого: запросы не остаются без индекса
+    create_index('ix_request_customer_product_unique', 'request', ['customer_id', 'product_id'], unique=True)
+    drop_index('ix_request_customer_product')
+@idempotent_scans.downgrade
+def idempotent_scans_down():
+    create_index('ix_request_customer_product', 'request', ['customer_id', 'product_id'])
+    drop_index('ix_request_customer_product_unique')
+    if inspect(db.engine).has_table('request_duplicate'):
+        with db.engine.begin() as conn:
+            restored = conn.execute(text(f"INSERT INTO request ({REQUEST_COLUMNS}) SELECT {REQUEST_COLUMNS} "
+                                         "FROM request_duplicate")).rowcount
+            conn.execute(text("DROP TABLE request_duplicate"))
+        if restored:
+            print(f"  возвращены повторные заявки: {restored}")
+            rebuild_stats()
+    drop_index('ix_product_company_scan_key')
+    with db.engine.begin() as conn:
+        conn.execute(text("ALTER TABLE product DROP COLUMN scan_key"))
+@migration(10, 'Каталог товарных позиций sku и product.sku_id')
+def sku_catalog():
+    Sku.__table__.create(db.engine, checkfirst=True)
+    if not has_column('product', 'sku_id'):
+        with db.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE product ADD COLUMN sku_id INTEGER"))
+        print("  добавлен столбец product.sku_id")
+    create_index('ix_product_company_sku_shelf')
+    # Товары, записанные после миграции процессами старой версии, дозаполняет python backfill_skus.py
+    updated = backfill_skus()
+    if updated:
+        print(f"  SKU назначены товарам: {updated}")
+@sku_catalog.downgrade
+def sku_catalog_down():
+    drop_index('ix_product_company_sku_shelf')
+    foreign_keys = [fk['constrained_columns'] for fk in inspect(db.engine).get_foreign_keys('product')]
+    with db.engine.begin() as conn:
+        if db.engine.dialect.name == 'sqlite' and ['sku_id'] in foreign_keys:
+            # SQLite не удаляет столбец внешнего ключа через ALTER TABLE (схема из db.create_all): очищаем его
+            conn.execute(text("UPDATE product SET sku_id = NULL"))
+        else:
+            conn.execute(text("ALTER TABLE product DROP COLUMN sku_id"))
+    Sku.__table__.drop(db.engine, checkfirst=True)
+# Команды
+def upgrade(target=None):
+    ensure_version_table()
+    version = current_version()
+    target = target if target is not None else max(m['version'] for m in MIGRATIONS)
+    for entry in sorted(MIGRATIONS, key=lambda m: m['version']):
+        if version < entry['version'] <= target:
+            print(f"Миграция {entry['version']}: {entry['description']}")
+            entry['upgrade']()
+            with db.engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO schema_version (version, description, applied_at) "
+                         "VALUES (:version, :description, :applied_at)"),
+                    {'version': entry['version'], 'description': entry['description'],
+                     'applied_at': datetime.now(timezone.utc).isoformat()}
+                )
+    print(f"Версия схемы: {current_version()}")
+def downgrade(target):
+    ensure_version_table()
+    version = current_version()
+    for entry in sorted(MIGRATIONS, key=lambda m: m['version'], reverse=True):
+        if target < entry['version'] <= version:
+            print(f"Откат миграции {entry['version']}: {entry['description']}")
+            if entry['downgrade'] is None:
+                raise IrreversibleMigration(f"Миграция {entry['version']} не поддерживает откат")
+            entry['downgrade']()
+            with db.engine.begin() as conn:
+                conn.execute(text("DELETE FROM schema_version WHERE version = :version"),
+                             {'version': entry['version']})
+    print(f"Версия схемы: {current_version()}")
+def status():
+    ensure_version_table()
+    version = current_version()
+    print(f"Версия схемы: {version}")
+    for entry in sorted(MIGRATIONS, key=lambda m: m['version']):
+        mark = 'применена' if entry['version'] <= version else 'ожидает'
+        print(f"  {entry['version']:>3}  {mark:<10} {entry['description']}")
+def hot_queries():
+    """Запросы, которые выполняют основные маршруты app.py"""
+    return [
+        ('get_products: товары компании',
+         select(Product.id).where(Product.company_id == 1).order_by(Product.id.desc()).limit(51)),
+        ('get_products: товары работника',
+         select(Product.id).where(Product.company_id == 1, Product.user_id == 1).order_by(Product.id.desc()).limit(51)),
+        ('get_products: товары полки',
+         select(Product.id).where(Product.company_id == 1, Product.shelf_id == 1).order_by(Product.id.desc()).limit(51)),
+        ('get_products: товары за период',
+         select(Product.id).where(Product.company_id == 1, Product.created_at >= '2000-01-01')),
+        ('get_shelf_products: товары полки работника',
+         select(Product.id).where(Product.shelf_id == 1, Product.user_id == 1, Product.company_id == 1)),
+        ('get_shelves: полки работника',
+         select(Shelf.id).where(Shelf.user_id == 1, Shelf.company_id == 1)),
+        ('login: пользователь по email',
+         select(User.id).where(User.email == 'user@example.com', User.company_id == 1)),
+        ('api_owner_requests: заявки компании',
+         select(Request.id).where(Request.company_id == 1).order_by(Request.id.desc()).limit(51)),
+        ('api_owner_requests: заявки по статусу',
+         select(Request.id).where(Request.company_id == 1, Request.status == 'new').order_by(Request.id.desc()).limit(51)),
+        ('api_customer_requests: заявки заказчика',
+         select(Request.id).where(Request.customer_id == 1, Request.company_id == 1).order_by(Request.id.desc()).limit(51)),
+        ('sku_groups: остатки по позициям и полкам',
+         select(Product.sku_id, Product.shelf_id, func.count(Product.id)).where(Product.company_id == 1).
+         group_by(Product.sku_id, Product.shelf_id)),
+        ('load_stats: счетчики компании',
+         select(StatCounter.value).where(StatCounter.company_id == 1, StatCounter.scope == 'products')),
+        ('product_image: доступ к снимку',
+         select(Product.id).where(Product.company_id == 1, Product.image_hash == 'ab').limit(1)),
+        ('versioned: версии данных компании',
+         select(DataVersion.version).where(DataVersion.company_id == 1, DataVersion.name.in_(['products', 'shelves']))),
+        ('requests_stream: новые события заявок',
+         select(RequestEvent.id).where(RequestEvent.company_id == 1, RequestEvent.id > 0).order_by(RequestEvent.id).limit(100)),
+        ('claim_decode_job: следующее задание очереди',
+         select(DecodeJob.id).where(DecodeJob.status == 'queued').order_by(DecodeJob.id).limit(1)),
+    ]
+def explain(conn, statement):
+    # render_postcompile раскрывает IN (...) в отдельные параметры: EXPLAIN выполняется без execute() SQLAlchemy
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'render_postcompile': True})
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+        return [row[-1] for row in rows]
+    rows = conn.exec_driver_sql(f"EXPLAIN {compiled}", params).fetchall()
+    return [row[0] for row in rows]
+def plan_problems(plan):
+    problems = []
+    for line in plan:
+        # SQLite: "SCAN product" — полный проход таблицы; "USE TEMP B-TREE" — сортировка без индекса
+        if line.startswith('SCAN ') and 'USING' not in line:
+            problems.append(line)
+        elif 'USE TEMP B-TREE' in line:
+            problems.append(line)
+        elif 'Seq Scan' in line:
+            problems.append(line.strip())
+    return problems
+def check():
+    """Вывести запросы, для которых планировщик не находит подходящего индекса.
+
+    На почти пустой базе после ANALYZE SQLite может предпочесть SCAN даже при наличии индекса.
+    """
+    missing = 0
+    with db.engine.connect() as conn:
+        for title, statement in hot_queries():
+            plan = explain(conn, statement)
+            problems = plan_problems(plan)
+            if problems:
+                missing += 1
+                print(f"НЕТ ИНДЕКСА  {title}")
+                for line in problems:
+                    print(f"    {line}")
+            else:
+                print(f"ok           {title}: {'; '.join(plan)}")
+    if missing:
+        print(f"Запросов без подходящего индекса: {missing}. Выполните: python migrate_db.py upgrade")
+    return missing
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    argument = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    with app.app_context():
+        if command == 'upgrade':
+            upgrade(argument)
+        elif command == 'downgrade':
+            if argument is None:
+                sys.exit("Укажите целевую версию: python migrate_db.py downgrade N")
+            downgrade(argument)
+        elif command == 'status':
+            status()
+        elif command == 'check':
+            sys.exit(1 if check() else 0)
+        else:
+            sys.exit(f"Неизвестная команда: {command}")
@@ -0,0 +1,247 @@
+import io
+import threading
+import time
+from collections import namedtuple
+import cv2
+import numpy as np
+from PIL import Image
+
+# Движок распознавания QR-кодов.
+# Сначала декодируем уменьшенное серое изображение (для JPEG — через draft-режим PIL, без
+# распаковки полного разрешения), и только при неудаче переходим к более дорогим стадиям.
+DEFAULT_MAX_SIDE = 1024
+ROI_MIN_SIDE = 400
+ROI_MARGIN = 0.15
+MULTI_MAX_SIDE = 1536
+TILE_SIZE = 1536
+TILE_OVERLAP = 0.25
+DecodeResult = namedtuple('DecodeResult', 'data stage elapsed_ms')
+# points — четыре угла кода [[x, y], ...] в координатах исходного изображения
+DetectedCode = namedtuple('DetectedCode', 'data points')
+MultiDecodeResult = namedtuple('MultiDecodeResult', 'codes stage elapsed_ms')
+_local = threading.local()
+def get_detector():
+    """Детектор OpenCV для текущего потока (создается один раз на поток)"""
+    detector = getattr(_local, 'detector', None)
+    if detector is None:
+        detector = cv2.QRCodeDetector()
+        _local.detector = detector
+    return detector
+def get_multi_detector():
+    """Детектор для нескольких кодов на кадре: QRCodeDetectorAruco находит заметно больше кодов"""
+    detector = getattr(_local, 'multi_detector', None)
+    if detector is None:
+        factory = getattr(cv2, 'QRCodeDetectorAruco', cv2.QRCodeDetector)
+        detector = factory()
+        _local.multi_detector = detector
+    return detector
+class ImageSource:
+    """Ленивая загрузка изображения: уменьшенная и полная серые версии создаются по требованию"""
+    def __init__(self, source, max_side=DEFAULT_MAX_SIDE):
+        self.max_side = max_side
+        self.raw = None
+        self.image = None
+        self.array = None
+        if isinstance(source, (bytes, bytearray)):
+            self.raw = bytes(source)
+        elif isinstance(source, Image.Image):
+            self.image = source
+        elif isinstance(source, np.ndarray):
+            self.array = source
+        else:
+            # Файлоподобный объект (werkzeug FileStorage.stream, открытый файл)
+            self.raw = source.read()
+        self._reduced = None
+        self._full = None
+        self.scale = 1.0
+        # Углы кода, найденные на уменьшенном изображении (если код найден, но не прочитан)
+        self.reduced_points = None
+    def _open(self):
+        if self.raw is not None:
+            return Image.open(io.BytesIO(self.raw))
+        return self.image
+    def reduced(self):
+        if self._reduced is None:
+            if self.array is not None:
+                gray = self._array_gray()
+                height, width = gray.shape[:2]
+                factor = self.max_side / max(height, width)
+                if factor < 1:
+                    gray = cv2.resize(gray, (int(width * factor), int(height * factor)),
+                                      interpolation=cv2.INTER_AREA)
+                self._reduced = gray
+            else:
+                image = self._open()
+                if self.raw is not None and image.format == 'JPEG':
+                    # JPEG сразу распаковывается в оттенках серого с уменьшением в 2/4/8 раз
+                    image.draft('L', (self.max_side, self.max_side))
+                gray = image.convert('L')
+                if max(gray.size) > self.max_side:
+                    gray.thumbnail((self.max_side, self.max_side))
+                self._reduced = np.asarray(gray)
+            self.scale = max(self.full_size()) / max(self._reduced.shape[:2])
+        return self._reduced
+    def full_size(self):
+        if self.array is not None:
+            height, width = self.array.shape[:2]
+            return width, height
+        return self._open().size
+    def full(self):
+        if self._full is None:
+            if self.array is not None:
+                self._full = self._array_gray()
+            else:
+                self._full = np.asarray(self._open().convert('L'))
+        return self._full
+    def _array_gray(self):
+        if self.array.ndim == 2:
+            return self.array
+        return cv2.cvtColor(self.array, cv2.COLOR_BGR2GRAY)
+def _detect_and_decode(gray):
+    try:
+        data, points, _ = get_detector().detectAndDecode(gray)
+    except cv2.error:
+        return None, None
+    return (data or None), points
+def _roi(gray, points, scale):
+    """Вырезать найденную область кода из полного изображения и при необходимости увеличить"""
+    points = points.reshape(-1, 2) * scale
+    x0, y0 = points.min(axis=0)
+    x1, y1 = points.max(axis=0)
+    margin = max(x1 - x0, y1 - y0) * ROI_MARGIN
+    height, width = gray.shape[:2]
+    x0, y0 = max(int(x0 - margin), 0), max(int(y0 - margin), 0)
+    x1, y1 = min(int(x1 + margin), width), min(int(y1 + margin), height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    roi = gray[y0:y1, x0:x1]
+    side = max(roi.shape[:2])
+    if side < ROI_MIN_SIDE:
+        factor = ROI_MIN_SIDE / side
+        roi = cv2.resize(roi, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+    return roi
+def _binarize(gray):
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary
+def _adaptive(gray):
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 5)
+def _rotate(gray, angle):
+    height, width = gray.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (width, height), borderValue=255)
+def _stages(image):
+    """Лестница стратегий от дешевой к дорогой; каждая стадия — (имя, функция -> серое изображение)"""
+    yield 'reduced', image.reduced
+    reduced_points = image.reduced_points
+    larger = max(image.full_size()) > max(image.reduced().shape[:2])
+    if reduced_points is not None:
+        yield 'roi', lambda: _roi(image.full(), reduced_points, image.scale)
+    if larger:
+        yield 'full', image.full
+    yield 'binarize', lambda: _binarize(image.reduced())
+    yield 'adaptive', lambda: _adaptive(image.reduced())
+    for angle in (45, -45):
+        yield f'rotate{angle}', lambda angle=angle: _rotate(image.reduced(), angle)
+def decode_qr(source, max_side=DEFAULT_MAX_SIDE):
+    """Распознать QR-код; возвращает DecodeResult(data, stage, elapsed_ms).
+
+    source — байты, файлоподобный объект, PIL.Image или массив numpy (BGR/серый).
+    При неудаче data и stage равны None. Ошибки открытия изображения пробрасываются.
+    """
+    started = time.perf_counter()
+    image = ImageSource(source, max_side)
+    for stage, prepare in _stages(image):
+        gray = prepare()
+        if gray is None:
+            continue
+        data, points = _detect_and_decode(gray)
+        if stage == 'reduced':
+            image.reduced_points = points
+        if data:
+            return DecodeResult(data, stage, (time.perf_counter() - started) * 1000)
+    return DecodeResult(None, None, (time.perf_counter() - started) * 1000)
+def _detect_and_decode_multi(gray):
+    """Все коды на изображении: [(текст или None, углы 4x2)]"""
+    try:
+        found, decoded, points, _ = get_multi_detector().detectAndDecodeMulti(gray)
+    except cv2.error:
+        return []
+    if not found or points is None:
+        return []
+    return [(data or None, corners.reshape(4, 2)) for data, corners in zip(decoded, points)]
+def _tiles(width, height, size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Перекрывающиеся окна, чтобы код на границе целиком попал хотя бы в одно из них"""
+    step = int(size * (1 - overlap))
+    xs = list(range(0, max(width - size, 0) + 1, step))
+    ys = list(range(0, max(height - size, 0) + 1, step))
+    if xs[-1] + size < width:
+        xs.append(width - size)
+    if ys[-1] + size < height:
+        ys.append(height - size)
+    for y in ys:
+        for x in xs:
+            yield x, y
+def _deduplicate(codes):
+    """Убрать повторы из перекрывающихся окон: одинаковый текст и центр внутри уже найденного кода.
+    Одинаковые этикетки в разных местах кадра остаются разными кодами."""
+    unique = []
+    for data, points in codes:
+        center = points.mean(axis=0)
+        duplicate = False
+        for other_data, other_points in unique:
+            if other_data != data:
+                continue
+            radius = np.linalg.norm(other_points - other_points.mean(axis=0), axis=1).max()
+            if np.linalg.norm(center - other_points.mean(axis=0)) < radius:
+                duplicate = True
+                break
+        if not duplicate:
+            unique.append((data, points))
+    return unique
+def _decode_region(image, points):
+    """Прочитать код, найденный но не распознанный на уменьшенном изображении, по его области в полном"""
+    roi = _roi(image.full(), points, 1.0)
+    if roi is None:
+        return None
+    for gray in (roi, _binarize(roi)):
+        data, _ = _detect_and_decode(gray)
+        if data:
+            return data
+    return None
+def decode_qr_multi(source, max_side=MULTI_MAX_SIDE, tile_size=TILE_SIZE):
+    """Распознать все QR-коды на снимке (паллета, полка); возвращает MultiDecodeResult.
+
+    Коды ищутся одним проходом по уменьшенному изображению; найденные, но не прочитанные коды
+    читаются по своей области в полном разрешении. Если на большом снимке не найдено ничего,
+    он просматривается перекрывающимися окнами в полном разрешении.
+    """
+    started = time.perf_counter()
+    image = ImageSource(source, max_side)
+    reduced = image.reduced()
+    found = [(data, corners * image.scale) for data, corners in _detect_and_decode_multi(reduced)]
+    stage = 'reduced'
+    for i, (data, points) in enumerate(found):
+        if data is None:
+            data = _decode_region(image, points)
+            if data:
+                found[i] = (data, points)
+                stage = 'roi'
+    width, height = image.full_size()
+    if not found and max(width, height) > max(reduced.shape[:2]):
+        stage = 'tiles'
+        full = image.full()
+        for x, y in _tiles(width, height, tile_size):
+            tile = full[y:y + tile_size, x:x + tile_size]
+            for data, corners in _detect_and_decode_multi(tile):
+                found.append((data, corners + (x, y)))
+    codes = [DetectedCode(data, points.round(1).tolist())
+             for data, points in _deduplicate([(d, p) for d, p in found if d])]
+    return MultiDecodeResult(codes, stage if codes else None, (time.perf_counter() - started) * 1000)
+def decode_path(path, max_side=DEFAULT_MAX_SIDE):
+    """Распознать QR-код из файла на диске. Для пула процессов: возвращает только простые типы"""
+    try:
+        with open(path, 'rb') as f:
+            result = decode_qr(f, max_side)
+    except Exception as e:
+        return {'data': None, 'stage': None, 'ms': 0.0, 'error': str(e)}
+    return {'data': result.data, 'stage': result.stage, 'ms': round(result.elapsed_ms, 1), 'error': None}
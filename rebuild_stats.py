@@ -0,0 +1,6 @@
+from app import app, rebuild_stats
+
+with app.app_context():
+    # Пересчитываем счетчики статистики по всем компаниям с нуля
+    companies = rebuild_stats()
+    print(f"Счетчики статистики пересчитаны для компаний: {companies}")
@@ -0,0 +1,476 @@
+let allProducts = [];
+let groupedProducts = [];
+let currentPage = 1;
+const itemsPerPage = 20;
+let isGrouped = true;
+let currentFilter = '';
+let selectedIds = new Set();
+
+document.addEventListener('DOMContentLoaded', function() {
+    initializePage();
+    setupEventListeners();
+    loadProducts();
+});
+
+function initializePage() {
+    const profileButton = document.getElementById('profile-button');
+    const profileModal = document.getElementById('profile-modal');
+    profileButton.addEventListener('click', function(event) {
+        event.stopPropagation();
+        profileModal.style.display = profileModal.style.display === 'block' ? 'none' : 'block';
+    });
+    document.addEventListener('click', function(event) {
+        if (!profileButton.contains(event.target) && !profileModal.contains(event.target)) {
+            profileModal.style.display = 'none';
+        }
+    });
+
+    document.getElementById('add-product').addEventListener('click', function(event) {
+        event.preventDefault();
+        window.location.href = this.href;
+    });
+    document.getElementById('home').addEventListener('click', function(event) {
+        event.preventDefault();
+        window.location.href = this.href;
+    });
+    document.getElementById('all-shelves').addEventListener('click', function(event) {
+        event.preventDefault();
+        window.location.href = this.href;
+    });
+}
+
+function setupEventListeners() {
+    document.getElementById('search-input').addEventListener('input', function(e) {
+        currentFilter = e.target.value.toLowerCase();
+        filterAndDisplayProducts();
+    });
+
+    document.getElementById('group-toggle').addEventListener('click', function() {
+        isGrouped = !isGrouped;
+        this.classList.toggle('active', isGrouped);
+        this.textContent = isGrouped ? 'Группировать' : 'Показать все';
+        filterAndDisplayProducts();
+    });
+
+    loadShelvesFilter();
+}
+
+function loadProducts() {
+    // Товары страницы отдаются в блоке JSON, скрипт подключается отдельным файлом
+    allProducts = JSON.parse(document.getElementById('products-data').textContent);
+
+    processProductsData();
+    filterAndDisplayProducts();
+}
+
+function processProductsData() {
+    const grouped = {};
+    allProducts.forEach(product => {
+        const key = `${product.qr_content}|${product.shelf ? product.shelf.id : 'no-shelf'}`;
+        if (!grouped[key]) {
+            grouped[key] = {
+                qr_content: product.qr_content,
+                shelf: product.shelf,
+                items: [],
+                count: 0
+            };
+        }
+        grouped[key].items.push(product);
+        grouped[key].count++;
+    });
+
+    groupedProducts = Object.values(grouped);
+    updateStatistics();
+}
+
+function updateStatistics() {
+    document.getElementById('total-count').textContent = allProducts.length;
+    document.getElementById('unique-count').textContent = groupedProducts.length;
+}
+
+function filterAndDisplayProducts() {
+    let filteredProducts = groupedProducts.filter(group => {
+        const matchesSearch = group.qr_content.toLowerCase().includes(currentFilter);
+        const shelfFilter = document.getElementById('shelf-filter').value;
+        const matchesShelf = !shelfFilter ||
+            (shelfFilter === 'no-shelf' && !group.shelf) ||
+            (group.shelf && group.shelf.id == shelfFilter);
+
+        return matchesSearch && matchesShelf;
+    });
+
+    displayProducts(filteredProducts);
+    updatePagination(filteredProducts.length);
+}
+
+function displayProducts(products) {
+    const container = document.getElementById('products-table-container');
+    const startIndex = (currentPage - 1) * itemsPerPage;
+    const endIndex = startIndex + itemsPerPage;
+    const pageProducts = products.slice(startIndex, endIndex);
+
+    if (pageProducts.length === 0) {
+        container.innerHTML = `
+            <div class="no-products">
+                <h3>Товары не найдены</h3>
+                <p>Попробуйте изменить условия поиска или фильтрации</p>
+            </div>
+        `;
+        return;
+    }
+
+    let tableHTML = `
+        <table id="product-table">
+            <thead>
+                <tr>
+                    <th class="select-cell"><input type="checkbox" onchange="toggleSelectPage(this.checked)"></th>
+                    <th>Товар</th>
+                    <th>Полка</th>
+                    <th>Количество</th>
+                    <th>Действия</th>
+                </tr>
+            </thead>
+            <tbody>
+    `;
+
+    pageProducts.forEach(group => {
+        if (isGrouped) {
+            tableHTML += `
+                <tr class="grouped-row">
+                    <td class="select-cell">${selectionCheckbox(group.items)}</td>
+                    <td class="product-content">
+                        <button class="expand-button" onclick="toggleGroup(this, '${group.qr_content.replace(/'/g, "\\'")}')">▶</button>
+                        ${group.items[0].thumbnail_url ? `<img class="product-thumb" src="${group.items[0].thumbnail_url}" alt="" loading="lazy">` : ''}
+                        ${group.qr_content}
+                    </td>
+                    <td>
+                        ${group.shelf ? `<span class="shelf-name">${group.shelf.name}</span>` : '<span class="no-shelf">Не назначена</span>'}
+                    </td>
+                    <td>
+                        <span class="quantity-badge">${group.count} шт.</span>
+                    </td>
+                    <td class="actions">
+                        <button class="action-button" onclick="editProduct(${group.items[0].id}, '${group.qr_content.replace(/'/g, "\\'")}', ${group.shelf ? group.shelf.id : 'null'})">✏️</button>
+                        <button class="action-button" onclick="deleteProductGroup('${group.qr_content.replace(/'/g, "\\'")}', ${group.shelf ? group.shelf.id : 'null'})">🗑️ Все</button>
+                    </td>
+                </tr>
+                <tr id="group-${group.qr_content.replace(/[^a-zA-Z0-9]/g, '-')}" style="display: none;">
+                    <td colspan="5">
+                        <table style="width: 100%; background: rgba(255,255,255,0.02);">
+                            <tbody>
+            `;
+
+            group.items.forEach(product => {
+                tableHTML += `
+                    <tr class="child-row">
+                        <td class="select-cell">${selectionCheckbox([product])}</td>
+                        <td style="padding-left: 40px;">ID: ${product.id}</td>
+                        <td></td>
+                        <td></td>
+                        <td class="actions">
+                            <button class="action-button" onclick="editProduct(${product.id}, '${product.qr_content.replace(/'/g, "\\'")}', ${product.shelf ? product.shelf.id : 'null'})">✏️</button>
+                            <button class="action-button" onclick="deleteProduct(${product.id})">🗑️</button>
+                        </td>
+                    </tr>
+                `;
+            });
+
+            tableHTML += `
+                            </tbody>
+                        </table>
+                    </td>
+                </tr>
+            `;
+        } else {
+            group.items.forEach(product => {
+                tableHTML += `
+                    <tr>
+                        <td class="select-cell">${selectionCheckbox([product])}</td>
+                        <td class="product-content">
+                            ${product.thumbnail_url ? `<img class="product-thumb" src="${product.thumbnail_url}" alt="" loading="lazy">` : ''}
+                            ${product.qr_content}
+                        </td>
+                        <td>
+                            ${product.shelf ? `<span class="shelf-name">${product.shelf.name}</span>` : '<span class="no-shelf">Не назначена</span>'}
+                        </td>
+                        <td>
+                            <span class="quantity-badge">1 шт.</span>
+                        </td>
+                        <td class="actions">
+                            <button class="action-button" onclick="editProduct(${product.id}, '${product.qr_content.replace(/'/g, "\\'")}', ${product.shelf ? product.shelf.id : 'null'})">✏️</button>
+                            <button class="action-button" onclick="deleteProduct(${product.id})">🗑️</button>
+                        </td>
+                    </tr>
+                `;
+            });
+        }
+    });
+
+    tableHTML += `</tbody></table>`;
+    container.innerHTML = tableHTML;
+}
+
+// Множественный выбор: флажок группы выбирает все ее товары
+function selectionCheckbox(items) {
+    const ids = items.map(product => product.id);
+    const checked = ids.every(id => selectedIds.has(id)) ? 'checked' : '';
+    return `<input type="checkbox" data-ids="${ids.join(',')}" onchange="toggleSelection(this)" ${checked}>`;
+}
+
+function toggleSelection(checkbox) {
+    checkbox.dataset.ids.split(',').map(Number).forEach(id => {
+        if (checkbox.checked) {
+            selectedIds.add(id);
+        } else {
+            selectedIds.delete(id);
+        }
+    });
+    updateBulkPanel();
+}
+
+function toggleSelectPage(checked) {
+    document.querySelectorAll('#product-table td.select-cell input').forEach(checkbox => {
+        checkbox.checked = checked;
+        toggleSelection(checkbox);
+    });
+}
+
+function clearSelection() {
+    selectedIds.clear();
+    updateBulkPanel();
+    filterAndDisplayProducts();
+}
+
+function updateBulkPanel() {
+    document.getElementById('selected-count').textContent = selectedIds.size;
+    document.getElementById('bulk-panel').style.display = selectedIds.size ? 'flex' : 'none';
+}
+
+function bulkMove() {
+    const shelfId = document.getElementById('bulk-shelf').value;
+    sendBulkOperation('move', Array.from(selectedIds), { shelf_id: shelfId || null });
+}
+
+function bulkDelete() {
+    if (confirm(`Вы уверены, что хотите удалить выбранные товары (${selectedIds.size})?`)) {
+        sendBulkOperation('delete', Array.from(selectedIds));
+    }
+}
+
+// Одна транзакция на сервере вместо отдельного запроса на каждый товар
+function sendBulkOperation(operation, productIds, extra = {}) {
+    fetch('/bulk_products', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(Object.assign({ operation: operation, product_ids: productIds }, extra))
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            alert(data.message);
+            window.location.reload();
+        } else {
+            alert('Ошибка: ' + data.message);
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('Произошла ошибка при обработке товаров');
+    });
+}
+
+function toggleGroup(button, qrContent) {
+    const safeId = qrContent.replace(/[^a-zA-Z0-9]/g, '-');
+    const groupRow = document.getElementById(`group-${safeId}`);
+    if (groupRow.style.display === 'none') {
+        groupRow.style.display = 'table-row';
+        button.textContent = '▼';
+    } else {
+        groupRow.style.display = 'none';
+        button.textContent = '▶';
+    }
+}
+
+function updatePagination(totalItems) {
+    const totalPages = Math.ceil(totalItems / itemsPerPage);
+    const pagination = document.getElementById('pagination');
+
+    if (totalPages <= 1) {
+        pagination.innerHTML = '';
+        return;
+    }
+
+    let paginationHTML = '';
+
+    if (currentPage > 1) {
+        paginationHTML += `<button class="page-button" onclick="changePage(${currentPage - 1})">‹</button>`;
+    }
+
+    for (let i = 1; i <= totalPages; i++) {
+        if (i === 1 || i === totalPages || (i >= currentPage - 2 && i <= currentPage + 2)) {
+            paginationHTML += `<button class="page-button ${i === currentPage ? 'active' : ''}" onclick="changePage(${i})">${i}</button>`;
+        } else if (i === currentPage - 3 || i === currentPage + 3) {
+            paginationHTML += `<span style="color: rgba(255,255,255,0.5); padding: 8px 12px;">...</span>`;
+        }
+    }
+
+    if (currentPage < totalPages) {
+        paginationHTML += `<button class="page-button" onclick="changePage(${currentPage + 1})">›</button>`;
+    }
+
+    pagination.innerHTML = paginationHTML;
+}
+
+function changePage(page) {
+    currentPage = page;
+    filterAndDisplayProducts();
+    window.scrollTo({ top: 0, behavior: 'smooth' });
+}
+
+function loadShelvesFilter() {
+    fetch("/get_shelves")
+    .then(response => response.json())
+    .then(shelves => {
+        const filterSelect = document.getElementById('shelf-filter');
+        const bulkSelect = document.getElementById('bulk-shelf');
+        shelves.forEach(shelf => {
+            const option = document.createElement('option');
+            option.value = shelf.id;
+            option.textContent = shelf.name;
+            filterSelect.appendChild(option);
+            bulkSelect.appendChild(option.cloneNode(true));
+        });
+
+        const noShelfOption = document.createElement('option');
+        noShelfOption.value = 'no-shelf';
+        noShelfOption.textContent = 'Без полки';
+        filterSelect.appendChild(noShelfOption);
+
+        filterSelect.addEventListener('change', filterAndDisplayProducts);
+    })
+    .catch(error => {
+        console.error('Ошибка загрузки полок:', error);
+    });
+}
+
+function editProduct(productId, qrContent, shelfId) {
+    document.getElementById('edit-product-id').value = productId;
+    document.getElementById('edit-qr-content').value = qrContent;
+
+    const shelfSelect = document.getElementById('edit-shelf');
+    loadShelves(shelfSelect, shelfId);
+
+    document.getElementById('edit-modal').style.display = 'flex';
+}
+
+function closeEditModal() {
+    document.getElementById('edit-modal').style.display = 'none';
+}
+
+function saveProduct() {
+    const productId = document.getElementById('edit-product-id').value;
+    const qrContent = document.getElementById('edit-qr-content').value;
+    const shelfId = document.getElementById('edit-shelf').value;
+
+    if (!qrContent) {
+        alert('Пожалуйста, введите содержимое QR-кода');
+        return;
+    }
+
+    fetch('/update_product', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            product_id: productId,
+            qr_content: qrContent,
+            shelf_id: shelfId
+        })
+    })
+    .then(response => {
+        if (!response.ok) {
+            return response.text().then(text => {
+                throw new Error(`Server error: ${text}`);
+            });
+        }
+        return response.json();
+    })
+    .then(data => {
+        if (data.success) {
+            alert('Товар успешно обновлен');
+            window.location.reload();
+        } else {
+            alert('Ошибка при обновлении товара: ' + data.message);
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('Произошла ошибка при обновлении товара: ' + error.message);
+    });
+}
+
+function deleteProduct(productId) {
+    if (confirm('Вы уверены, что хотите удалить этот товар?')) {
+        fetch('/delete_product/' + productId, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok');
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (data.success) {
+                alert('Товар успешно удален');
+                window.location.reload();
+            } else {
+                alert('Ошибка при удалении товара: ' + data.message);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Произошла ошибка при удалении товара');
+        });
+    }
+}
+
+function deleteProductGroup(qrContent, shelfId) {
+    const group = groupedProducts.find(group => group.qr_content === qrContent &&
+        (group.shelf ? group.shelf.id : null) === shelfId);
+    if (group && confirm(`Вы уверены, что хотите удалить ВСЕ товары "${qrContent}"?`)) {
+        sendBulkOperation('delete', group.items.map(product => product.id));
+    }
+}
+
+function loadShelves(selectElement, selectedShelfId) {
+    fetch("/get_shelves")
+    .then(response => {
+        if (!response.ok) {
+            throw new Error('Network response was not ok');
+        }
+        return response.json();
+    })
+    .then(shelves => {
+        selectElement.innerHTML = '<option value="">Выберите полку</option>';
+        shelves.forEach(shelf => {
+            const option = document.createElement('option');
+            option.value = shelf.id;
+            option.textContent = shelf.name;
+            if (shelf.id == selectedShelfId) {
+                option.selected = true;
+            }
+            selectElement.appendChild(option);
+        });
+    })
+    .catch(error => {
+        console.error('Ошибка загрузки полок:', error);
+        selectElement.innerHTML = '<option value="">Ошибка загрузки полок</option>';
+    });
+}
@@ -0,0 +1,116 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Инициализация даты
+    const now = new Date();
+    const options = {
+        year: 'numeric',
+        month: 'long',
+        day: 'numeric',
+        weekday: 'long'
+    };
+    document.getElementById('current-date').textContent =
+        'Сегодня: ' + now.toLocaleDateString('ru-RU', options);
+
+    // Управление модальным окном профиля
+    const profileButton = document.getElementById('profile-button');
+    const profileModal = document.getElementById('profile-modal');
+
+    profileButton.addEventListener('click', function(event) {
+        event.stopPropagation();
+        profileModal.style.display = profileModal.style.display === 'block' ? 'none' : 'block';
+    });
+
+    document.addEventListener('click', function(event) {
+        if (!profileButton.contains(event.target) && !profileModal.contains(event.target)) {
+            profileModal.style.display = 'none';
+        }
+    });
+
+    // Загрузка данных с сервера
+    loadDashboardData();
+});
+
+// Функция загрузки данных для дашборда
+function loadDashboardData() {
+    // Загружаем только последнюю страницу товаров, сводка считается на сервере
+    fetch('/get_products?limit=5&order=desc')
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok');
+            }
+            return response.json();
+        })
+        .then(page => {
+            displayRecentProducts(page.items);
+        })
+        .catch(error => {
+            console.error('Ошибка загрузки товаров:', error);
+            document.getElementById('recent-products').innerHTML = '<p>Ошибка загрузки товаров</p>';
+        });
+}
+
+// Отображение последних добавленных товаров
+function displayRecentProducts(products) {
+    const container = document.getElementById('recent-products');
+
+    if (products.length === 0) {
+        container.innerHTML = '<p>Товаров пока нет</p>';
+        return;
+    }
+
+    let html = '<h3>Последние добавленные товары:</h3><table class="products-table"><thead><tr><th>ID</th><th>Содержимое</th><th>Полка</th><th>Действия</th></tr></thead><tbody>';
+
+    products.forEach(product => {
+        html += `
+            <tr>
+                <td>${product.id}</td>
+                <td class="product-content">${product.qr_content}</td>
+                <td>
+                    ${product.shelf ?
+                        `<span class="shelf-name">${product.shelf.name}</span>` :
+                        `<span class="no-shelf">Не назначена</span>`
+                    }
+                </td>
+                <td>
+                    <button class="action-button" onclick="createRequest(${product.id})">📝 Заявка</button>
+                </td>
+            </tr>
+        `;
+    });
+
+    html += '</tbody></table>';
+    container.innerHTML = html;
+}
+
+// Функция создания заявки
+function createRequest(productId) {
+    if (confirm('Вы уверены, что хотите подать заявку на этот товар?')) {
+        fetch('/create_request/' + productId, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => {
+            if (!response.ok) {
+                return response.text().then(text => {
+                    throw new Error(`Server error: ${text}`);
+                });
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (data.success) {
+                alert('Заявка успешно создана!');
+                // Обновляем счетчик заявок
+                const currentCount = parseInt(document.getElementById('requests-badge').textContent);
+                document.getElementById('requests-badge').textContent = currentCount + 1;
+            } else {
+                alert('Ошибка при создании заявки: ' + data.message);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Произошла ошибка при создании заявки: ' + error.message);
+        });
+    }
+}
@@ -0,0 +1,44 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const profileButton = document.getElementById('profile-button');
+    const profileModal = document.getElementById('profile-modal');
+    profileButton.addEventListener('click', function(event) {
+        event.stopPropagation();
+        profileModal.style.display = profileModal.style.display === 'block' ? 'none' : 'block';
+    });
+    document.addEventListener('click', function(event) {
+        if (!profileButton.contains(event.target) && !profileModal.contains(event.target)) {
+            profileModal.style.display = 'none';
+        }
+    });
+});
+
+function createRequest(productId) {
+    if (confirm('Вы уверены, что хотите подать заявку на этот товар?')) {
+        fetch('/create_request/' + productId, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => {
+            if (!response.ok) {
+                return response.text().then(text => {
+                    throw new Error(`Server error: ${text}`);
+                });
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (data.success) {
+                alert('Заявка успешно создана!');
+                window.location.reload();
+            } else {
+                alert('Ошибка при создании заявки: ' + data.message);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Произошла ошибка при создании заявки: ' + error.message);
+        });
+    }
+}
@@ -0,0 +1,458 @@
+// Глобальные переменные для хранения данных
+let requestsData = [];
+// Курсор следующей страницы (null — данных больше нет)
+let nextCursor = null;
+const PAGE_SIZE = 50;
+
+document.addEventListener('DOMContentLoaded', function() {
+    // Инициализация даты
+    const now = new Date();
+    const options = {
+        year: 'numeric',
+        month: 'long',
+        day: 'numeric',
+        weekday: 'long'
+    };
+    document.getElementById('current-date').textContent =
+        'Сегодня: ' + now.toLocaleDateString('ru-RU', options);
+
+    // Управление модальным окном профиля
+    const profileButton = document.getElementById('profile-button');
+    const profileModal = document.getElementById('profile-modal');
+
+    profileButton.addEventListener('click', function(event) {
+        event.stopPropagation();
+        profileModal.style.display = profileModal.style.display === 'block' ? 'none' : 'block';
+    });
+
+    document.addEventListener('click', function(event) {
+        if (!profileButton.contains(event.target) && !profileModal.contains(event.target)) {
+            profileModal.style.display = 'none';
+        }
+    });
+
+    // Загрузка данных с сервера
+    loadRequestsData();
+    subscribeToRequestEvents();
+
+    // Обработчики фильтров
+    document.getElementById('status-filter').addEventListener('change', filterRequests);
+    document.getElementById('date-filter').addEventListener('change', filterRequests);
+    document.getElementById('load-more-button').addEventListener('click', function() {
+        loadRequestsData(false);
+    });
+
+    // Обработчики кнопок
+    document.getElementById('new-request-btn').addEventListener('click', function() {
+        document.getElementById('new-request-modal').style.display = 'flex';
+    });
+
+    document.getElementById('close-new-request-modal').addEventListener('click', function() {
+        document.getElementById('new-request-modal').style.display = 'none';
+    });
+
+    document.getElementById('cancel-new-request').addEventListener('click', function() {
+        document.getElementById('new-request-modal').style.display = 'none';
+    });
+
+    document.getElementById('close-details-modal').addEventListener('click', function() {
+        document.getElementById('request-details-modal').style.display = 'none';
+    });
+
+    // Обработчик формы создания заявки
+    document.getElementById('new-request-form').addEventListener('submit', function(e) {
+        e.preventDefault();
+        createNewRequest();
+    });
+
+    // Закрытие модальных окон при клике вне их
+    window.addEventListener('click', function(event) {
+        const detailsModal = document.getElementById('request-details-modal');
+        const newRequestModal = document.getElementById('new-request-modal');
+
+        if (event.target === detailsModal) {
+            detailsModal.style.display = 'none';
+        }
+
+        if (event.target === newRequestModal) {
+            newRequestModal.style.display = 'none';
+        }
+    });
+
+    // Клик по ссылкам меню
+    document.querySelectorAll('.top-menu a').forEach(link => {
+        link.addEventListener('click', function(e) {
+            if (this.getAttribute('href').startsWith('#')) {
+                e.preventDefault();
+            }
+        });
+    });
+
+    // Клик по ссылкам профиля
+    document.querySelectorAll('.profile-modal a').forEach(link => {
+        link.addEventListener('click', function(e) {
+            if (!this.getAttribute('href').includes('logout')) {
+                e.preventDefault();
+            }
+            profileModal.style.display = 'none';
+        });
+    });
+});
+
+// Начало периода для фильтра по дате (ISO-строка или null)
+function getCreatedFrom(dateFilter) {
+    const now = new Date();
+    switch(dateFilter) {
+        case 'today':
+            return new Date(now.getFullYear(), now.getMonth(), now.getDate()).toISOString();
+        case 'week':
+            return new Date(now.getTime() - 7 * 24 * 60 * 60 * 1000).toISOString();
+        case 'month':
+            return new Date(now.getFullYear(), now.getMonth() - 1, now.getDate()).toISOString();
+        default:
+            return null;
+    }
+}
+
+// Функция загрузки данных о заявках (постранично, с серверными фильтрами)
+function loadRequestsData(reset = true) {
+    const container = document.getElementById('requests-list');
+    const loadMoreButton = document.getElementById('load-more-button');
+    if (reset) {
+        requestsData = [];
+        nextCursor = null;
+        container.innerHTML = '<div class="loading">Загрузка заявок...</div>';
+    }
+
+    const params = new URLSearchParams({ limit: PAGE_SIZE });
+    const statusFilter = document.getElementById('status-filter').value;
+    const createdFrom = getCreatedFrom(document.getElementById('date-filter').value);
+    if (statusFilter !== 'all') params.set('status', statusFilter);
+    if (createdFrom) params.set('created_from', createdFrom);
+    if (!reset && nextCursor !== null) params.set('after', nextCursor);
+
+    loadMoreButton.disabled = true;
+    fetch('/api/customer_requests?' + params.toString())
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(page => {
+            requestsData = requestsData.concat(page.items);
+            nextCursor = page.next_cursor;
+            displayRequestsList(requestsData);
+            loadMoreButton.style.display = page.has_more ? 'inline-block' : 'none';
+            loadMoreButton.disabled = false;
+        })
+        .catch(error => {
+            console.error('Ошибка загрузки заявок:', error);
+            loadMoreButton.disabled = false;
+            container.innerHTML = `
+                <div class="empty-state">
+                    <div class="empty-state-icon">⚠️</div>
+                    <h3>Ошибка загрузки</h3>
+                    <p>Не удалось загрузить заявки. Попробуйте обновить страницу.</p>
+                </div>
+            `;
+        });
+}
+
+// Отображение списка заявок
+function displayRequestsList(requests) {
+    const container = document.getElementById('requests-list');
+
+    if (requests.length === 0) {
+        container.innerHTML = `
+            <div class="empty-state">
+                <div class="empty-state-icon">📄</div>
+                <h3>Заявок пока нет</h3>
+                <p>Создайте свою первую заявку, нажав кнопку "Новая заявка"</p>
+            </div>
+        `;
+        return;
+    }
+
+    let html = `
+        <table class="requests-table">
+            <thead>
+                <tr>
+                    <th>ID</th>
+                    <th>Тип</th>
+                    <th>Описание</th>
+                    <th>Дата</th>
+                    <th>Статус</th>
+                    <th>Действия</th>
+                </tr>
+            </thead>
+            <tbody>
+    `;
+
+    requests.forEach(request => {
+        const statusClass = `status-${request.status}-badge`;
+        const statusText = getStatusText(request.status);
+        const typeText = getTypeText(request.type);
+        const date = new Date(request.created_at).toLocaleDateString('ru-RU');
+
+        html += `
+            <tr>
+                <td class="request-id">#${request.id}</td>
+                <td>${typeText}</td>
+                <td class="product-content">${request.description}</td>
+                <td class="request-date">${date}</td>
+                <td><span class="request-status ${statusClass}">${statusText}</span></td>
+                <td>
+                    <div class="request-actions">
+                        <button class="action-btn view-btn" data-request-id="${request.id}">Просмотр</button>
+                        ${request.status === 'new' || request.status === 'in-progress' ?
+                            `<button class="action-btn cancel-btn" data-request-id="${request.id}">Отменить</button>` :
+                            ''
+                        }
+                    </div>
+                </td>
+            </tr>
+        `;
+    });
+
+    html += '</tbody></table>';
+    container.innerHTML = html;
+
+    // Добавляем обработчики для кнопок действий
+    document.querySelectorAll('.view-btn').forEach(btn => {
+        btn.addEventListener('click', function() {
+            const requestId = this.getAttribute('data-request-id');
+            showRequestDetails(requestId);
+        });
+    });
+
+    document.querySelectorAll('.cancel-btn').forEach(btn => {
+        btn.addEventListener('click', function() {
+            const requestId = this.getAttribute('data-request-id');
+            cancelRequest(requestId);
+        });
+    });
+}
+
+// Обновление статистики заявок из серверных счетчиков
+function refreshRequestsStats() {
+    fetch('/api/stats')
+        .then(response => response.json())
+        .then(stats => {
+            const byStatus = stats.my_requests_by_status || {};
+            document.getElementById('total-requests').textContent = stats.my_requests_total || 0;
+            document.getElementById('new-requests').textContent = byStatus['new'] || 0;
+            document.getElementById('in-progress-requests').textContent = byStatus['in-progress'] || 0;
+            document.getElementById('completed-requests').textContent = byStatus['completed'] || 0;
+        })
+        .catch(error => console.error('Ошибка загрузки статистики:', error));
+}
+
+// Живые обновления: сервер присылает созданные и измененные заявки (SSE).
+// Сервер закрывает поток через полминуты, браузер переподключается сам и продолжает с Last-Event-ID.
+// Если открытых потоков у сервера слишком много (503), браузер сам не переподключается: пробуем по таймеру
+const REQUEST_EVENTS_RETRY_MS = 5000;
+let lastRequestEventId = null;
+function subscribeToRequestEvents() {
+    if (!window.EventSource) {
+        return;
+    }
+    const query = lastRequestEventId ? '?last_event_id=' + encodeURIComponent(lastRequestEventId) : '';
+    const source = new EventSource('/api/requests/stream' + query);
+    source.addEventListener('request', function(event) {
+        lastRequestEventId = event.lastEventId;
+        applyRequestEvent(JSON.parse(event.data));
+    });
+    source.onerror = function() {
+        if (source.readyState === EventSource.CLOSED) {
+            // Случайная добавка, чтобы отклоненные страницы не вернулись все разом
+            setTimeout(subscribeToRequestEvents, REQUEST_EVENTS_RETRY_MS * (1 + Math.random()));
+        }
+    };
+}
+
+// Обновить одну заявку в загруженном списке без перезагрузки всего списка
+function applyRequestEvent(payload) {
+    const request = payload.request;
+    const index = requestsData.findIndex(r => r.id === request.id);
+    const matches = request.status !== undefined && matchesRequestFilters(request);
+    if (index >= 0) {
+        if (matches) {
+            requestsData[index] = request;
+        } else {
+            requestsData.splice(index, 1);
+        }
+    } else if (payload.kind === 'created' && matches) {
+        requestsData.unshift(request);
+    }
+    displayRequestsList(requestsData);
+    refreshRequestsStats();
+}
+
+// Новые заявки попадают в любой период фильтра по дате, проверяем только статус
+function matchesRequestFilters(request) {
+    const statusFilter = document.getElementById('status-filter').value;
+    return statusFilter === 'all' || request.status === statusFilter;
+}
+
+// Фильтрация заявок выполняется на сервере
+function filterRequests() {
+    loadRequestsData(true);
+}
+
+// Показать детали заявки
+function showRequestDetails(requestId) {
+    const request = requestsData.find(r => r.id == requestId);
+
+    if (!request) {
+        alert('Заявка не найдена');
+        return;
+    }
+
+    document.getElementById('modal-request-id').textContent = request.id;
+    document.getElementById('modal-status').innerHTML = `<span class="request-status status-${request.status}-badge">${getStatusText(request.status)}</span>`;
+    document.getElementById('modal-type').textContent = getTypeText(request.type);
+    document.getElementById('modal-priority').textContent = getPriorityText(request.priority);
+    document.getElementById('modal-description').textContent = request.description;
+    document.getElementById('modal-created-date').textContent = new Date(request.created_at).toLocaleDateString('ru-RU');
+
+    // Загрузка товаров заявки
+    let productsHtml = '';
+    if (request.products && request.products.length > 0) {
+        request.products.forEach(product => {
+            productsHtml += `
+                <div class="product-item">
+                    <div>${product.name}</div>
+                    <div>Кол-во: ${product.quantity || 1}</div>
+                </div>
+            `;
+        });
+    } else {
+        productsHtml = '<p>В этой заявке нет товаров</p>';
+    }
+
+    document.getElementById('modal-products-list').innerHTML = `<h4>Товары в заявке:</h4>${productsHtml}`;
+    document.getElementById('request-details-modal').style.display = 'flex';
+}
+
+// Отмена заявки
+function cancelRequest(requestId) {
+    if (confirm('Вы уверены, что хотите отменить эту заявку?')) {
+        fetch(`/cancel_request/${requestId}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(result => {
+            if (result.success) {
+                loadRequestsData();
+                refreshRequestsStats();
+                alert('Заявка отменена');
+            } else {
+                alert('Ошибка при отмене заявки: ' + result.message);
+            }
+        })
+        .catch(error => {
+            console.error('Ошибка:', error);
+            alert('Ошибка при отмене заявки');
+        });
+    }
+}
+
+// Создание новой заявки
+function createNewRequest() {
+    const type = document.getElementById('request-type').value;
+    const priority = document.getElementById('request-priority').value;
+    const description = document.getElementById('request-description').value;
+
+    console.log('Данные формы:', { type, priority, description });
+
+    if (!type || !priority || !description) {
+        alert('Пожалуйста, заполните все обязательные поля');
+        return;
+    }
+
+    // Показываем индикатор загрузки
+    const submitBtn = document.getElementById('submit-request-btn');
+    const originalText = submitBtn.textContent;
+    submitBtn.textContent = 'Создание...';
+    submitBtn.disabled = true;
+
+    fetch('/create_custom_request', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            type: type,
+            priority: priority,
+            description: description
+        })
+    })
+    .then(response => {
+        console.log('Статус ответа:', response.status);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json();
+    })
+    .then(result => {
+        console.log('Результат:', result);
+        if (result.success) {
+            document.getElementById('new-request-modal').style.display = 'none';
+            document.getElementById('new-request-form').reset();
+            loadRequestsData();
+            refreshRequestsStats();
+            alert('Заявка успешно создана');
+        } else {
+            alert('Ошибка при создании заявки: ' + result.message);
+        }
+    })
+    .catch(error => {
+        console.error('Ошибка:', error);
+        alert('Ошибка при создании заявки: ' + error.message);
+    })
+    .finally(() => {
+        // Восстанавливаем кнопку
+        submitBtn.textContent = originalText;
+        submitBtn.disabled = false;
+    });
+}
+
+// Вспомогательные функции для текста статусов и типов
+function getStatusText(status) {
+    const statusMap = {
+        'new': 'Новая',
+        'in-progress': 'В работе',
+        'completed': 'Завершено',
+        'cancelled': 'Отменено'
+    };
+    return statusMap[status] || status;
+}
+
+function getTypeText(type) {
+    const typeMap = {
+        'order': 'Заказ товаров',
+        'return': 'Возврат',
+        'issue': 'Проблема с товаром',
+        'other': 'Другое'
+    };
+    return typeMap[type] || type;
+}
+
+function getPriorityText(priority) {
+    const priorityMap = {
+        'low': 'Низкий',
+        'medium': 'Средний',
+        'high': 'Высокий',
+        'urgent': 'Срочный'
+    };
+    return priorityMap[priority] || priority;
+}
@@ -0,0 +1,72 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const profileButton = document.getElementById('profile-button');
+    const profileModal = document.getElementById('profile-modal');
+    profileButton.addEventListener('click', function(event) {
+        event.stopPropagation();
+        profileModal.style.display = profileModal.style.display === 'block' ? 'none' : 'block';
+    });
+    document.addEventListener('click', function(event) {
+        if (!profileButton.contains(event.target) && !profileModal.contains(event.target)) {
+            profileModal.style.display = 'none';
+        }
+    });
+
+    // Подсказки при наборе (артикулы, начинающиеся с введенного текста)
+    const searchInput = document.querySelector('.search-input');
+    const suggestions = document.getElementById('search-suggestions');
+    let suggestTimer = null;
+    searchInput.addEventListener('input', function() {
+        clearTimeout(suggestTimer);
+        const query = searchInput.value.trim();
+        if (query.length < 3) {
+            suggestions.innerHTML = '';
+            return;
+        }
+        suggestTimer = setTimeout(function() {
+            fetch('/api/search_products?mode=prefix&limit=10&q=' + encodeURIComponent(query))
+                .then(response => response.json())
+                .then(data => {
+                    suggestions.innerHTML = '';
+                    data.items.forEach(item => {
+                        if (!item.article) return;
+                        const option = document.createElement('option');
+                        option.value = item.article;
+                        option.label = `${item.name || item.article} (${item.quantity} шт.)`;
+                        suggestions.appendChild(option);
+                    });
+                })
+                .catch(error => console.error('Ошибка загрузки подсказок:', error));
+        }, 150);
+    });
+});
+
+function createRequest(productId) {
+    if (confirm('Вы уверены, что хотите подать заявку на этот товар?')) {
+        fetch('/create_request/' + productId, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => {
+            if (!response.ok) {
+                return response.text().then(text => {
+                    throw new Error(`Server error: ${text}`);
+                });
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (data.success) {
+                alert('Заявка успешно создана!');
+                window.location.reload();
+            } else {
+                alert('Ошибка при создании заявки: ' + data.message);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Произошла ошибка при создании заявки: ' + error.message);
+        });
+    }
+}
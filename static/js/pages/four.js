@@ -0,0 +1,492 @@
+let currentAction = null;
+let currentProduct = null;
+let videoStream = null;
+let scannerType = null;
+let selectedShelfId = null;
+let quaggaInitialized = false;
+let uploadedFileData = null;
+// Очередь сканирований: хранится в localStorage и отправляется пакетами на /api/scans.
+// У каждого сканирования свой ключ, поэтому повторная отправка после сбоя не создает дубликатов.
+// Пакеты, которые сервер отклонил окончательно (4xx), откладываются в scanQueueRejected и не блокируют очередь;
+// при истекшей сессии отправка останавливается до повторного входа.
+const SCAN_QUEUE_KEY = 'scanQueue';
+const SCAN_REJECTED_KEY = 'scanQueueRejected';
+const SCAN_BATCH_SIZE = 100;
+const SCAN_FLUSH_SIZE = 20;
+const SCAN_FLUSH_INTERVAL = 3000;
+let scanFlushing = false;
+let scanAuthFailed = false;
+
+document.addEventListener('DOMContentLoaded', function() {
+    const profileButton = document.getElementById('profile-button');
+    const profileModal = document.getElementById('profile-modal');
+    profileButton.addEventListener('click', function(event) {
+        event.stopPropagation();
+        profileModal.style.display = profileModal.style.display === 'block' ? 'none' : 'block';
+    });
+    document.addEventListener('click', function(event) {
+        if (!profileButton.contains(event.target) && !profileModal.contains(event.target)) {
+            profileModal.style.display = 'none';
+        }
+    });
+    document.getElementById('add-product').addEventListener('click', function(event) {
+        event.preventDefault();
+        window.location.href = this.href;
+    });
+    document.getElementById('home').addEventListener('click', function(event) {
+        event.preventDefault();
+        window.location.href = this.href;
+    });
+    document.getElementById('all-shelves').addEventListener('click', function(event) {
+        event.preventDefault();
+        window.location.href = this.href;
+    });
+
+    document.getElementById('file-input').addEventListener('change', function(event) {
+        const file = event.target.files[0];
+        if (file) {
+            document.getElementById('file-name').textContent = file.name;
+            document.getElementById('file-preview-container').style.display = 'block';
+            readQRCodeFromFile(file);
+        }
+    });
+
+    updateScanQueueStatus(loadScanQueue());
+    flushScanQueue();
+    setInterval(flushScanQueue, SCAN_FLUSH_INTERVAL);
+    window.addEventListener('online', flushScanQueue);
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'hidden') flushScanQueue();
+        // Вернулись на страницу (например, после входа в другой вкладке): пробуем отправить снова
+        if (document.visibilityState === 'visible' && scanAuthFailed) {
+            scanAuthFailed = false;
+            flushScanQueue();
+        }
+    });
+});
+
+function loadScanQueue(key = SCAN_QUEUE_KEY) {
+    try {
+        return JSON.parse(localStorage.getItem(key)) || [];
+    } catch {
+        return [];
+    }
+}
+
+function saveScanQueue(queue) {
+    localStorage.setItem(SCAN_QUEUE_KEY, JSON.stringify(queue));
+    updateScanQueueStatus(queue);
+}
+
+function parkScanBatch(batch) {
+    // Отклоненные сканирования сохраняются, чтобы их можно было разобрать, а не теряются молча
+    const keys = new Set(batch.map(scan => scan.key));
+    localStorage.setItem(SCAN_REJECTED_KEY, JSON.stringify(loadScanQueue(SCAN_REJECTED_KEY).concat(batch)));
+    saveScanQueue(loadScanQueue().filter(scan => !keys.has(scan.key)));
+}
+
+function showScanLoginPrompt() {
+    scanAuthFailed = true;
+    const status = document.getElementById('scan-queue-status');
+    status.innerHTML = '';
+    status.append(`Сессия истекла, сканирования не отправлены (${loadScanQueue().length}). `);
+    const link = document.createElement('a');
+    link.href = '/login';
+    link.target = '_blank';
+    link.textContent = 'Войдите снова';
+    status.append(link);
+    status.style.color = 'var(--error)';
+}
+
+function updateScanQueueStatus(queue, error) {
+    const status = document.getElementById('scan-queue-status');
+    if (scanAuthFailed) return;
+    if (error) {
+        status.textContent = error;
+        status.style.color = 'var(--error)';
+    } else {
+        status.textContent = queue.length ? `Ожидают отправки: ${queue.length}` : '';
+        status.style.color = 'var(--success)';
+    }
+}
+
+function newScanKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+
+function enqueueScan(qrContent, shelfId) {
+    const queue = loadScanQueue();
+    queue.push({ key: newScanKey(), qr_content: qrContent, shelf_id: shelfId });
+    saveScanQueue(queue);
+    if (queue.length >= SCAN_FLUSH_SIZE) flushScanQueue();
+}
+
+async function flushScanQueue() {
+    const batch = loadScanQueue().slice(0, SCAN_BATCH_SIZE);
+    if (scanFlushing || scanAuthFailed || !batch.length || !navigator.onLine) return;
+    scanFlushing = true;
+    try {
+        const response = await fetch('/api/scans', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ scans: batch }),
+            keepalive: true
+        });
+        if (response.status === 401 || response.status === 403) {
+            showScanLoginPrompt();
+            return;
+        }
+        if (!response.ok) {
+            if (response.status >= 400 && response.status < 500 && response.status !== 408 && response.status !== 429) {
+                // Сервер отклонил пакет целиком: повтор ничего не изменит, а следующие пакеты ждали бы за ним
+                parkScanBatch(batch);
+                updateScanQueueStatus(loadScanQueue(), `Пакет из ${batch.length} сканирований отклонен (${response.status})`);
+                if (loadScanQueue().length) setTimeout(flushScanQueue, 0);
+            } else {
+                // Временная ошибка: пакет остается в очереди и будет отправлен повторно
+                updateScanQueueStatus(loadScanQueue(), `Ошибка отправки (${response.status}), повторим позже`);
+            }
+            return;
+        }
+        const data = (response.headers.get('Content-Type') || '').includes('application/json')
+            ? await response.json() : null;
+        if (!data || !Array.isArray(data.created)) {
+            // Без входа сервер отвечает 200 со страницей входа или {"success": false}
+            showScanLoginPrompt();
+            return;
+        }
+        const done = new Set(data.created.concat(data.duplicates, data.rejected.map(item => item.key)));
+        const queue = loadScanQueue().filter(scan => !done.has(scan.key));
+        saveScanQueue(queue);
+        if (data.rejected.length) {
+            updateScanQueueStatus(queue, 'Не добавлено: ' + data.rejected.map(item => item.message).join(', '));
+        }
+        if (queue.length >= SCAN_FLUSH_SIZE) setTimeout(flushScanQueue, 0);
+    } catch (error) {
+        console.error('Ошибка отправки сканирований:', error);
+        updateScanQueueStatus(loadScanQueue(), 'Нет связи с сервером, повторим позже');
+    } finally {
+        scanFlushing = false;
+    }
+}
+
+function readQRCodeFromFile(file) {
+    const reader = new FileReader();
+    reader.onload = function(e) {
+        const img = new Image();
+        img.onload = function() {
+            const canvas = document.createElement('canvas');
+            const context = canvas.getContext('2d');
+            canvas.width = img.width;
+            canvas.height = img.height;
+            context.drawImage(img, 0, 0, img.width, img.height);
+            const imageData = context.getImageData(0, 0, canvas.width, canvas.height);
+            const code = jsQR(imageData.data, canvas.width, canvas.height);
+            if (code) {
+                document.getElementById('file-content').textContent = code.data;
+                uploadedFileData = { qr_content: code.data };
+            } else {
+                document.getElementById('file-content').textContent = 'Не удалось расшифровать QR-код';
+            }
+        };
+        img.src = e.target.result;
+    };
+    reader.readAsDataURL(file);
+}
+
+function deleteFile() {
+    document.getElementById('file-input').value = '';
+    document.getElementById('file-name').textContent = 'Файл не выбран';
+    document.getElementById('file-content').textContent = 'Нет данных';
+    document.getElementById('file-preview-container').style.display = 'none';
+    uploadedFileData = null;
+}
+
+function checkCameraSupport() {
+    if (!navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) {
+        alert('Ваш браузер не поддерживает доступ к камере. Используйте Chrome, Firefox или Edge.');
+        return false;
+    }
+    return true;
+}
+
+async function startScanner(action, type = 'qr') {
+    currentAction = action;
+    scannerType = type;
+
+    if (!checkCameraSupport()) return;
+
+    document.getElementById('scanner-panel').style.display = 'flex';
+    document.getElementById('confirm-btn').style.display = 'none';
+    document.getElementById('scanner-product-info').innerHTML = '';
+    document.getElementById('scanner-result').textContent =
+        type === 'qr' ? 'Наведите на QR-код...' : 'Наведите на штрих-код...';
+
+    try {
+        if (quaggaInitialized && window.Quagga) {
+            window.Quagga.stop();
+            quaggaInitialized = false;
+        }
+        if (videoStream) {
+            videoStream.getTracks().forEach(track => track.stop());
+        }
+
+        const stream = await navigator.mediaDevices.getUserMedia({
+            video: {
+                facingMode: 'environment',
+                width: { ideal: 1280 },
+                height: { ideal: 720 }
+            }
+        });
+
+        const video = document.getElementById('video');
+        video.srcObject = stream;
+        videoStream = stream;
+
+        await new Promise((resolve, reject) => {
+            video.onloadedmetadata = () => {
+                video.play()
+                    .then(resolve)
+                    .catch(e => {
+                        console.error('Ошибка воспроизведения:', e);
+                        reject(new Error('Не удалось воспроизвести видео'));
+                    });
+            };
+        });
+
+        if (type === 'qr') {
+            if (typeof jsQR === 'undefined') {
+                throw new Error('Библиотека jsQR не загружена.');
+            }
+            scanQRFrame();
+        } else {
+            if (typeof Quagga === 'undefined') {
+                throw new Error('Библиотека Quagga не загружена.');
+            }
+            initBarcodeScanner();
+        }
+    } catch (error) {
+        console.error('Ошибка доступа к камере:', error);
+        document.getElementById('scanner-result').textContent =
+            'Ошибка: ' + (error.message || 'Не удалось получить доступ к камере. Проверьте разрешения.');
+        stopScanner();
+    }
+}
+
+function scanQRFrame() {
+    const video = document.getElementById('video');
+    if (!videoStream || video.videoWidth === 0 || video.videoHeight === 0) {
+        requestAnimationFrame(scanQRFrame);
+        return;
+    }
+
+    const canvas = document.createElement('canvas');
+    const context = canvas.getContext('2d');
+    canvas.width = video.videoWidth;
+    canvas.height = video.videoHeight;
+    context.drawImage(video, 0, 0, canvas.width, canvas.height);
+
+    try {
+        const imageData = context.getImageData(0, 0, canvas.width, canvas.height);
+        const code = jsQR(imageData.data, canvas.width, canvas.height);
+        if (code) {
+            handleScannedData(code.data);
+            return;
+        }
+    } catch (e) {
+        console.error('Ошибка обработки QR-кода:', e);
+    }
+
+    requestAnimationFrame(scanQRFrame);
+}
+
+function initBarcodeScanner() {
+    const video = document.getElementById('video');
+    if (!videoStream || video.videoWidth === 0 || video.videoHeight === 0) {
+        setTimeout(initBarcodeScanner, 500);
+        return;
+    }
+
+    if (!Quagga) {
+        console.error("Quagga не загружена!");
+        document.getElementById('scanner-result').textContent = 'Ошибка: Quagga не загружена.';
+        return;
+    }
+
+    Quagga.init({
+        inputStream: {
+            name: "Live",
+            type: "LiveStream",
+            target: video,
+            constraints: {
+                width: 640,
+                height: 480,
+                facingMode: "environment"
+            }
+        },
+        decoder: {
+            readers: [
+                "ean_reader", "ean_8_reader",
+                "code_128_reader", "code_39_reader",
+                "upc_reader", "codabar_reader"
+            ],
+            debug: {
+                drawBoundingBox: true,
+                showFrequency: true,
+                drawScanline: true,
+                showPattern: true
+            }
+        },
+        locate: true
+    }, function(err) {
+        if (err) {
+            console.error("Ошибка Quagga:", err);
+            document.getElementById('scanner-result').textContent =
+                'Ошибка инициализации сканера штрих-кодов: ' + (err.message || 'Неизвестная ошибка');
+            return;
+        }
+        quaggaInitialized = true;
+        Quagga.start();
+        Quagga.onDetected(function(result) {
+            if (result && result.codeResult && result.codeResult.code) {
+                document.getElementById('scanner-result').textContent = 'Найден штрих-код: ' + result.codeResult.code;
+                handleScannedData(result.codeResult.code);
+                Quagga.stop();
+            }
+        });
+        Quagga.onProcessed(function(result) {
+            const drawingCtx = Quagga.canvas.ctx.overlay;
+            const drawingCanvas = Quagga.canvas.dom.overlay;
+        });
+    });
+}
+
+function handleScannedData(data) {
+    try {
+        let productData;
+        try {
+            productData = JSON.parse(data);
+        } catch {
+            productData = {
+                article: data,
+                name: `Товар (${scannerType === 'qr' ? 'QR' : 'Штрих-код'}: ${data})`,
+                price: "0",
+                description: ""
+            };
+        }
+        currentProduct = productData;
+        showProductInfo('scanner-product-info');
+        showShelfModal();
+        document.getElementById('confirm-btn').style.display = 'block';
+    } catch (e) {
+        alert("Ошибка обработки: " + e.message);
+        resetScanner();
+    }
+}
+
+function stopScanner() {
+    if (videoStream) {
+        videoStream.getTracks().forEach(track => track.stop());
+        videoStream = null;
+    }
+    if (quaggaInitialized && window.Quagga) {
+        Quagga.stop();
+        quaggaInitialized = false;
+    }
+}
+
+function resetScanner() {
+    document.getElementById('scanner-panel').style.display = 'none';
+    document.getElementById('scanner-product-info').innerHTML = '';
+    document.getElementById('scanner-result').textContent = '';
+    currentProduct = null;
+    currentAction = null;
+    scannerType = null;
+    stopScanner();
+}
+
+function handleUpload() {
+    const result = document.getElementById('result');
+    if (!uploadedFileData) {
+        result.textContent = 'Выберите файл!';
+        result.style.color = 'var(--error)';
+        return;
+    }
+
+    result.textContent = 'Обработка QR-кода...';
+    result.style.color = 'var(--success)';
+
+    currentProduct = {
+        article: uploadedFileData.qr_content,
+        name: `Товар (QR: ${uploadedFileData.qr_content})`,
+        price: "0",
+        description: "",
+        qr_content: uploadedFileData.qr_content
+    };
+
+    showShelfModal();
+}
+
+function showProductInfo(elementId) {
+    const infoElement = document.getElementById(elementId);
+    infoElement.innerHTML = `
+        <h3>${currentProduct.name || 'Неизвестный товар'}</h3>
+        <p><strong>Артикул:</strong> ${currentProduct.article || 'Нет данных'}</p>
+        <p><strong>Цена:</strong> ${currentProduct.price || '0'} руб.</p>
+        ${currentProduct.description ?
+            `<p><strong>Описание:</strong> ${currentProduct.description}</p>` : ''}
+        <p style="color: var(--success); font-size: 12px;">
+            Тип: ${scannerType === 'qr' ? 'QR-код' : 'Штрих-код'}
+        </p>
+    `;
+}
+
+function showShelfModal() {
+    const modal = document.getElementById('shelf-modal');
+    modal.style.display = 'flex';
+    fetch("/get_shelves")
+    .then(response => response.json())
+    .then(shelves => {
+        const shelvesList = document.getElementById('shelves-list');
+        shelvesList.innerHTML = '';
+        if (shelves.length === 0) {
+            shelvesList.innerHTML = '<p>Нет доступных полок. <a href="' + document.getElementById('home').href + '">Создайте полку</a>.</p>';
+            return;
+        }
+        shelves.forEach(shelf => {
+            const shelfItem = document.createElement('div');
+            shelfItem.className = 'shelf-item';
+            shelfItem.textContent = shelf.name;
+            shelfItem.onclick = () => selectShelf(shelf.id);
+            shelvesList.appendChild(shelfItem);
+        });
+    });
+}
+
+function selectShelf(shelfId) {
+    selectedShelfId = shelfId;
+    const items = document.querySelectorAll('.shelf-item');
+    items.forEach(item => item.style.background = 'rgba(255, 255, 255, 0.1)');
+    event.target.style.background = 'rgba(0, 255, 136, 0.3)';
+}
+
+function confirmShelfSelection() {
+    if (!selectedShelfId) {
+        alert('Выберите полку!');
+        return;
+    }
+    currentProduct.shelf_id = selectedShelfId;
+    enqueueScan(currentProduct.qr_content || currentProduct.article || 'No Content', selectedShelfId);
+    document.getElementById('shelf-modal').style.display = 'none';
+    document.getElementById('product-display').style.display = 'none';
+    document.getElementById('file-input').value = '';
+    document.getElementById('file-preview-container').style.display = 'none';
+    document.getElementById('result').textContent = 'Товар добавлен в очередь отправки';
+    document.getElementById('result').style.color = 'var(--success)';
+    uploadedFileData = null;
+}
+
+function handleConfirm() {
+    showShelfModal();
+}
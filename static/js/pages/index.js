@@ -0,0 +1,59 @@
+const video = document.getElementById('video');
+const result = document.getElementById('result');
+const scanner = document.getElementById('scanner');
+const startButton = document.getElementById('start-button');
+
+startButton.addEventListener('click', startScanning);
+
+function startScanning() {
+    scanner.style.display = 'block'; // Показывает сканер
+    startButton.disabled = true; // Отключает кнопку
+
+    navigator.mediaDevices.getUserMedia({ video: true })
+        .then(stream => {
+            video.srcObject = stream;
+        })
+        .catch(error => {
+            result.textContent = "Ошибка доступа к камере";
+        });
+
+    const qrScanner = new jsQR.default(video);
+
+    function scan() {
+        const code = qrScanner.decode();
+
+        if (code) {
+            result.textContent = code.data;
+            saveQRCodeData(code.data); // Сохраняем данные QR-кода
+            stopScanning(); // Останавливает сканирование после успешного декодирования
+        }
+
+        requestAnimationFrame(scan);
+    }
+
+    scan();
+}
+
+function saveQRCodeData(data) {
+    fetch('/save_qr_data', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ qr_data: data })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            alert('Данные успешно сохранены!');
+        } else {
+            alert('Ошибка при сохранении данных.');
+        }
+    });
+}
+
+function stopScanning() {
+    video.srcObject.getTracks().forEach(track => track.stop());
+    scanner.style.display = 'none'; // Скрывает сканер
+    startButton.disabled = false; // Включает кнопку
+}
@@ -0,0 +1,36 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Управление модальным окном профиля
+    const profileButton = document.getElementById('profile-button');
+    const profileModal = document.getElementById('profile-modal');
+
+    profileButton.addEventListener('click', function(event) {
+        event.stopPropagation();
+        profileModal.style.display = profileModal.style.display === 'block' ? 'none' : 'block';
+    });
+
+    document.addEventListener('click', function(event) {
+        if (!profileButton.contains(event.target) && !profileModal.contains(event.target)) {
+            profileModal.style.display = 'none';
+        }
+    });
+
+    // Обновление текущей даты
+    updateCurrentDate();
+});
+
+function updateCurrentDate() {
+    const now = new Date();
+    const options = {
+        year: 'numeric',
+        month: 'long',
+        day: 'numeric',
+        weekday: 'long'
+    };
+    const dateElement = document.getElementById('current-date');
+    if (dateElement && dateElement.textContent.includes('Дата не установлена')) {
+        dateElement.textContent = 'Сегодня: ' + now.toLocaleDateString('ru-RU', options);
+    }
+}
+
+// Обновление времени каждую минуту
+setInterval(updateCurrentDate, 60000);
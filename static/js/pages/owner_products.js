@@ -0,0 +1,206 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const profileButton = document.getElementById('profile-button');
+    const profileModal = document.getElementById('profile-modal');
+    profileButton.addEventListener('click', function(event) {
+        event.stopPropagation();
+        profileModal.style.display = profileModal.style.display === 'block' ? 'none' : 'block';
+    });
+    document.addEventListener('click', function(event) {
+        if (!profileButton.contains(event.target) && !profileModal.contains(event.target)) {
+            profileModal.style.display = 'none';
+        }
+    });
+});
+
+// Загрузка списка полок
+function loadShelves(selectElement, selectedShelfId) {
+    fetch("/get_shelves")
+    .then(response => {
+        if (!response.ok) {
+            throw new Error('Network response was not ok');
+        }
+        return response.json();
+    })
+    .then(shelves => {
+        selectElement.innerHTML = '<option value="">Выберите полку</option>';
+        shelves.forEach(shelf => {
+            const option = document.createElement('option');
+            option.value = shelf.id;
+            option.textContent = shelf.name;
+            if (shelf.id == selectedShelfId) {
+                option.selected = true;
+            }
+            selectElement.appendChild(option);
+        });
+    })
+    .catch(error => {
+        console.error('Ошибка загрузки полок:', error);
+        selectElement.innerHTML = '<option value="">Ошибка загрузки полок</option>';
+    });
+}
+
+function editProduct(productId, qrContent, shelfId) {
+    document.getElementById('edit-product-id').value = productId;
+    document.getElementById('edit-qr-content').value = qrContent;
+
+    const shelfSelect = document.getElementById('edit-shelf');
+    loadShelves(shelfSelect, shelfId);
+
+    document.getElementById('edit-modal').style.display = 'flex';
+}
+
+function closeEditModal() {
+    document.getElementById('edit-modal').style.display = 'none';
+}
+
+function saveProduct() {
+    const productId = document.getElementById('edit-product-id').value;
+    const qrContent = document.getElementById('edit-qr-content').value;
+    const shelfId = document.getElementById('edit-shelf').value;
+
+    if (!qrContent) {
+        alert('Пожалуйста, введите содержимое QR-кода');
+        return;
+    }
+
+    if (!shelfId) {
+        alert('Пожалуйста, выберите полку');
+        return;
+    }
+
+    fetch('/update_product', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            product_id: productId,
+            qr_content: qrContent,
+            shelf_id: shelfId
+        })
+    })
+    .then(response => {
+        if (!response.ok) {
+            return response.text().then(text => {
+                throw new Error(`Server error: ${text}`);
+            });
+        }
+        return response.json();
+    })
+    .then(data => {
+        if (data.success) {
+            alert('Товар успешно обновлен');
+            window.location.reload();
+        } else {
+            alert('Ошибка при обновлении товара: ' + data.message);
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('Произошла ошибка при обновлении товара: ' + error.message);
+    });
+}
+
+// Множественный выбор: перемещение и удаление одним запросом
+function selectedProductIds() {
+    return Array.from(document.querySelectorAll('.product-select:checked')).map(checkbox => Number(checkbox.value));
+}
+
+function toggleSelectAll(checked) {
+    document.querySelectorAll('.product-select').forEach(checkbox => {
+        checkbox.checked = checked;
+    });
+    updateBulkPanel();
+}
+
+function updateBulkPanel() {
+    const count = selectedProductIds().length;
+    document.getElementById('selected-count').textContent = count;
+    document.getElementById('bulk-panel').style.display = count ? 'flex' : 'none';
+}
+
+function bulkMove() {
+    const shelfId = document.getElementById('bulk-shelf').value;
+    sendBulkOperation('move', selectedProductIds(), { shelf_id: shelfId || null });
+}
+
+function bulkDelete() {
+    const productIds = selectedProductIds();
+    if (confirm(`Вы уверены, что хотите удалить выбранные товары (${productIds.length})?`)) {
+        sendBulkOperation('delete', productIds);
+    }
+}
+
+// Импорт товаров из файла; полки находятся или создаются по столбцу shelf_name
+function importProducts(input) {
+    if (!input.files.length) return;
+    const formData = new FormData();
+    formData.append('file', input.files[0]);
+    fetch('/import_products', { method: 'POST', body: formData })
+    .then(response => response.json())
+    .then(data => {
+        let message = data.message || 'Ошибка импорта';
+        (data.errors || []).slice(0, 10).forEach(error => {
+            message += `\nСтрока ${error.row}: ${error.message}`;
+        });
+        alert(message);
+        if (data.created) window.location.reload();
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('Произошла ошибка при импорте');
+    })
+    .finally(() => { input.value = ''; });
+}
+
+function sendBulkOperation(operation, productIds, extra = {}) {
+    fetch('/bulk_products', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(Object.assign({ operation: operation, product_ids: productIds }, extra))
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            alert(data.message);
+            window.location.reload();
+        } else {
+            alert('Ошибка: ' + data.message);
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('Произошла ошибка при обработке товаров');
+    });
+}
+
+function deleteProduct(productId) {
+    if (confirm('Вы уверены, что хотите удалить этот товар?')) {
+        fetch('/delete_product/' + productId, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok');
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (data.success) {
+                alert('Товар успешно удален');
+                window.location.reload();
+            } else {
+                alert('Ошибка при удалении товара: ' + data.message);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Произошла ошибка при удалении товара');
+        });
+    }
+}
@@ -0,0 +1,333 @@
+// Глобальная переменная для хранения данных о заявках
+let requestsData = [];
+// Курсор следующей страницы (null — данных больше нет)
+let nextCursor = null;
+const PAGE_SIZE = 50;
+
+document.addEventListener('DOMContentLoaded', function() {
+    const profileButton = document.getElementById('profile-button');
+    const profileModal = document.getElementById('profile-modal');
+
+    profileButton.addEventListener('click', function(event) {
+        event.stopPropagation();
+        profileModal.style.display = profileModal.style.display === 'block' ? 'none' : 'block';
+    });
+
+    document.addEventListener('click', function(event) {
+        if (!profileButton.contains(event.target) && !profileModal.contains(event.target)) {
+            profileModal.style.display = 'none';
+        }
+    });
+
+    // Закрытие модального окна деталей заявки
+    document.getElementById('close-details-modal').addEventListener('click', function() {
+        document.getElementById('request-details-modal').style.display = 'none';
+    });
+
+    // Закрытие модального окна при клике вне его
+    window.addEventListener('click', function(event) {
+        const detailsModal = document.getElementById('request-details-modal');
+        if (event.target === detailsModal) {
+            detailsModal.style.display = 'none';
+        }
+    });
+
+    // Обработчики фильтров
+    document.getElementById('status-filter').addEventListener('change', filterRequests);
+    document.getElementById('priority-filter').addEventListener('change', filterRequests);
+    document.getElementById('load-more-button').addEventListener('click', function() {
+        loadRequestsData(false);
+    });
+
+    // Загрузка данных с сервера
+    loadRequestsData();
+    subscribeToRequestEvents();
+});
+
+// Функция загрузки данных о заявках (постранично, с серверными фильтрами)
+// Выгрузка заявок с текущими фильтрами
+function exportRequests() {
+    const params = new URLSearchParams({ format: 'csv' });
+    const statusFilter = document.getElementById('status-filter').value;
+    const priorityFilter = document.getElementById('priority-filter').value;
+    if (statusFilter !== 'all') params.set('status', statusFilter);
+    if (priorityFilter !== 'all') params.set('priority', priorityFilter);
+    window.location = '/api/export/requests?' + params.toString();
+}
+function loadRequestsData(reset = true) {
+    const container = document.getElementById('requests-list');
+    const loadMoreButton = document.getElementById('load-more-button');
+    if (reset) {
+        requestsData = [];
+        nextCursor = null;
+        container.innerHTML = '<div class="loading">Загрузка заявок...</div>';
+    }
+
+    const params = new URLSearchParams({ limit: PAGE_SIZE });
+    const statusFilter = document.getElementById('status-filter').value;
+    const priorityFilter = document.getElementById('priority-filter').value;
+    if (statusFilter !== 'all') params.set('status', statusFilter);
+    if (priorityFilter !== 'all') params.set('priority', priorityFilter);
+    if (!reset && nextCursor !== null) params.set('after', nextCursor);
+
+    loadMoreButton.disabled = true;
+    fetch('/api/owner_requests?' + params.toString())
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(page => {
+            requestsData = requestsData.concat(page.items);
+            nextCursor = page.next_cursor;
+            displayRequestsList(requestsData);
+            loadMoreButton.style.display = page.has_more ? 'inline-block' : 'none';
+            loadMoreButton.disabled = false;
+        })
+        .catch(error => {
+            console.error('Ошибка загрузки заявок:', error);
+            loadMoreButton.disabled = false;
+            container.innerHTML = `
+                <div class="empty-state">
+                    <div class="empty-state-icon">⚠️</div>
+                    <h3>Ошибка загрузки</h3>
+                    <p>Не удалось загрузить заявки. Попробуйте обновить страницу.</p>
+                </div>
+            `;
+        });
+}
+
+// Отображение списка заявок
+function displayRequestsList(requests) {
+    const container = document.getElementById('requests-list');
+
+    if (requests.length === 0) {
+        container.innerHTML = `
+            <div class="empty-state">
+                <h3>Заявок пока нет</h3>
+                <p>Заказчики еще не подавали заявки на товары</p>
+            </div>
+        `;
+        return;
+    }
+
+    let html = `
+        <table>
+            <thead>
+                <tr>
+                    <th>ID заявки</th>
+                    <th>Заказчик</th>
+                    <th>Тип</th>
+                    <th>Приоритет</th>
+                    <th>Дата создания</th>
+                    <th>Действия</th>
+                </tr>
+            </thead>
+            <tbody>
+    `;
+
+    requests.forEach(request => {
+        const typeText = getTypeText(request.type);
+        const priorityText = getPriorityText(request.priority);
+        const priorityClass = `priority-${request.priority}`;
+        const date = new Date(request.created_at).toLocaleDateString('ru-RU');
+        const isNewRequest = request.status === 'new' || request.status === 'Новая';
+
+        html += `
+            <tr>
+                <td>${request.id}</td>
+                <td>
+                    <span class="customer-email">${request.email || 'Не указан'}</span>
+                </td>
+                <td>
+                    <span class="request-type">${typeText}</span>
+                </td>
+                <td>
+                    <span class="request-priority ${priorityClass}">${priorityText}</span>
+                </td>
+                <td>${date}</td>
+                <td class="actions">
+                    <button class="action-button view" onclick="showRequestDetails(${request.id})">
+                        Просмотр
+                    </button>
+                    ${isNewRequest ? `
+                        <button class="action-button approve" onclick="updateRequestStatus(${request.id}, 'approved')">
+                            Принять
+                        </button>
+                        <button class="action-button reject" onclick="updateRequestStatus(${request.id}, 'rejected')">
+                            Отклонить
+                        </button>
+                    ` : `
+                        <span style="color: rgba(255, 255, 255, 0.5); font-size: 12px;">
+                            ${request.status === 'completed' || request.status === 'Одобрена' ? 'Принята' :
+                              request.status === 'cancelled' || request.status === 'Отклонена' ? 'Отклонена' : 'Обработана'}
+                        </span>
+                    `}
+                </td>
+            </tr>
+        `;
+    });
+
+    html += '</tbody></table>';
+    container.innerHTML = html;
+}
+
+// Обновление статистики заявок из серверных счетчиков
+function refreshRequestsStats() {
+    fetch('/api/stats')
+        .then(response => response.json())
+        .then(stats => {
+            const byStatus = stats.requests_by_status || {};
+            document.getElementById('total-requests').textContent = stats.total_requests || 0;
+            document.getElementById('new-requests').textContent = byStatus['new'] || 0;
+            document.getElementById('approved-requests').textContent = byStatus['completed'] || 0;
+            document.getElementById('rejected-requests').textContent = byStatus['cancelled'] || 0;
+        })
+        .catch(error => console.error('Ошибка загрузки статистики:', error));
+}
+
+// Живые обновления: сервер присылает созданные и измененные заявки (SSE).
+// Сервер закрывает поток через полминуты, браузер переподключается сам и продолжает с Last-Event-ID.
+// Если открытых потоков у сервера слишком много (503), браузер сам не переподключается: пробуем по таймеру
+const REQUEST_EVENTS_RETRY_MS = 5000;
+let lastRequestEventId = null;
+function subscribeToRequestEvents() {
+    if (!window.EventSource) {
+        return;
+    }
+    const query = lastRequestEventId ? '?last_event_id=' + encodeURIComponent(lastRequestEventId) : '';
+    const source = new EventSource('/api/requests/stream' + query);
+    source.addEventListener('request', function(event) {
+        lastRequestEventId = event.lastEventId;
+        applyRequestEvent(JSON.parse(event.data));
+    });
+    source.onerror = function() {
+        if (source.readyState === EventSource.CLOSED) {
+            // Случайная добавка, чтобы отклоненные страницы не вернулись все разом
+            setTimeout(subscribeToRequestEvents, REQUEST_EVENTS_RETRY_MS * (1 + Math.random()));
+        }
+    };
+}
+
+// Обновить одну заявку в загруженном списке без перезагрузки всего списка
+function applyRequestEvent(payload) {
+    const request = payload.request;
+    const index = requestsData.findIndex(r => r.id === request.id);
+    const matches = request.status !== undefined && matchesRequestFilters(request);
+    if (index >= 0) {
+        if (matches) {
+            requestsData[index] = request;
+        } else {
+            requestsData.splice(index, 1);
+        }
+    } else if (payload.kind === 'created' && matches) {
+        requestsData.unshift(request);
+    }
+    displayRequestsList(requestsData);
+    refreshRequestsStats();
+}
+
+function matchesRequestFilters(request) {
+    const statusFilter = document.getElementById('status-filter').value;
+    const priorityFilter = document.getElementById('priority-filter').value;
+    return (statusFilter === 'all' || request.status === statusFilter) &&
+        (priorityFilter === 'all' || request.priority === priorityFilter);
+}
+
+// Фильтрация заявок выполняется на сервере
+function filterRequests() {
+    loadRequestsData(true);
+}
+
+// Показать детали заявки
+function showRequestDetails(requestId) {
+    const request = requestsData.find(r => r.id == requestId);
+
+    if (!request) {
+        alert('Заявка не найдена');
+        return;
+    }
+
+    document.getElementById('modal-request-id').textContent = request.id;
+    document.getElementById('modal-customer-email').textContent = request.email || 'Не указан';
+    document.getElementById('modal-type').textContent = getTypeText(request.type);
+    document.getElementById('modal-priority').textContent = getPriorityText(request.priority);
+    document.getElementById('modal-description').textContent = request.description || 'Нет описания';
+    document.getElementById('modal-status').textContent = getStatusText(request.status);
+    document.getElementById('modal-created-date').textContent = new Date(request.created_at).toLocaleDateString('ru-RU');
+
+    document.getElementById('request-details-modal').style.display = 'flex';
+}
+
+function updateRequestStatus(requestId, action) {
+    const status = action === 'approved' ? 'Одобрена' : 'Отклонена';
+    const actionText = action === 'approved' ? 'принять' : 'отклонить';
+
+    if (confirm(`Вы уверены, что хотите ${actionText} эту заявку?`)) {
+        fetch('/update_request_status/' + requestId, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                status: status
+            })
+        })
+        .then(response => {
+            if (!response.ok) {
+                return response.text().then(text => {
+                    throw new Error(`Server error: ${text}`);
+                });
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (data.success) {
+                alert(`Заявка успешно ${action === 'approved' ? 'принята' : 'отклонена'}!`);
+                loadRequestsData(); // Перезагружаем данные
+                refreshRequestsStats();
+            } else {
+                alert('Ошибка при обновлении статуса заявки: ' + data.message);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Произошла ошибка при обновлении статуса заявки: ' + error.message);
+        });
+    }
+}
+
+// Вспомогательные функции для текста статусов и типов
+function getStatusText(status) {
+    const statusMap = {
+        'new': 'Новая',
+        'Новая': 'Новая',
+        'in-progress': 'В работе',
+        'completed': 'Завершено',
+        'Одобрена': 'Одобрена',
+        'cancelled': 'Отменено',
+        'Отклонена': 'Отклонена'
+    };
+    return statusMap[status] || status;
+}
+
+function getTypeText(type) {
+    const typeMap = {
+        'order': 'Заказ товаров',
+        'return': 'Возврат',
+        'issue': 'Проблема с товаром',
+        'other': 'Другое'
+    };
+    return typeMap[type] || type;
+}
+
+function getPriorityText(priority) {
+    const priorityMap = {
+        'low': 'Низкий',
+        'medium': 'Средний',
+        'high': 'Высокий',
+        'urgent': 'Срочный'
+    };
+    return priorityMap[priority] || priority;
+}
@@ -0,0 +1,151 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const shelvesContainer = document.getElementById('shelves-container');
+    const addShelfButton = document.getElementById('add-shelf');
+    const removeShelfButton = document.getElementById('remove-shelf');
+    const removeAllShelvesButton = document.getElementById('remove-all-shelves');
+    const modal = document.getElementById('info-modal');
+    const modalClose = modal.querySelector('.close');
+    const modalTitle = document.getElementById('shelf-title');
+    const modalInfo = document.getElementById('shelf-info');
+
+    // Кнопка профиля
+    const profileButton = document.getElementById('profile-button');
+    const profileModal = document.getElementById('profile-modal');
+    profileButton.addEventListener('click', function(event) {
+        event.stopPropagation();
+        profileModal.style.display = profileModal.style.display === 'block' ? 'none' : 'block';
+    });
+    document.addEventListener('click', function(event) {
+        if (!profileButton.contains(event.target) && !profileModal.contains(event.target)) {
+            profileModal.style.display = 'none';
+        }
+    });
+
+    // Загружаем полки с сервера
+    function loadShelves() {
+        fetch("/get_shelves")
+        .then(response => response.json())
+        .then(shelves => {
+            shelvesContainer.innerHTML = '';
+            shelves.forEach(shelf => {
+                createShelf(shelf.id, shelf.name);
+            });
+        });
+    }
+
+    loadShelves();
+
+    // Добавление новой полки
+    addShelfButton.addEventListener('click', () => {
+        const shelfName = prompt("Введите название полки:");
+        if (shelfName) {
+            fetch("/add_shelf", {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/x-www-form-urlencoded',
+                },
+                body: `name=${encodeURIComponent(shelfName)}`
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    createShelf(data.shelf_id, shelfName);
+                } else {
+                    alert("Ошибка: " + data.message);
+                }
+            });
+        }
+    });
+
+    // Удаление полки
+    removeShelfButton.addEventListener('click', () => {
+        const shelfId = prompt("Введите ID полки для удаления:");
+        if (shelfId) {
+            fetch(`/remove_shelf/${shelfId}`, {
+                method: 'POST'
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    document.querySelector(`.shelf[data-id="${shelfId}"]`).remove();
+                } else {
+                    alert("Ошибка: " + data.message);
+                }
+            });
+        }
+    });
+
+    // Удаление всех полок
+    removeAllShelvesButton.addEventListener('click', () => {
+        if (confirm("Удалить все полки?")) {
+            fetch("/remove_all_shelves", {
+                method: 'POST'
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    shelvesContainer.innerHTML = '';
+                } else {
+                    alert("Ошибка: " + data.message);
+                }
+            });
+        }
+    });
+
+    // Закрытие модального окна
+    modalClose.addEventListener('click', () => {
+        modal.style.display = 'none';
+    });
+
+    window.addEventListener('click', (event) => {
+        if (event.target === modal) {
+            modal.style.display = 'none';
+        }
+    });
+
+    // Создание полки - ИСПРАВЛЕННАЯ ФУНКЦИЯ
+    function createShelf(id, name) {
+        const shelf = document.createElement('div');
+        shelf.className = 'shelf';
+        shelf.dataset.id = id;
+        shelf.innerHTML = `
+            <span>${name}</span>
+            <button class="info-button">i</button>
+        `;
+        const infoButton = shelf.querySelector('.info-button');
+        infoButton.addEventListener('click', () => {
+            fetch(`/get_shelf_products/${id}`)
+            .then(response => response.json())
+            .then(data => {
+                modalTitle.textContent = name;
+                modalInfo.innerHTML = `
+                    <h3>Товары на полке:</h3>
+                    <ul>
+                        ${data.products.length > 0 ? data.products.map(product => `<li>${product.name} (${product.article})</li>`).join('') : '<li>Нет товаров</li>'}
+                    </ul>
+                `;
+                modal.style.display = 'block';
+            })
+            .catch(error => {
+                console.error('Error loading shelf products:', error);
+                modalInfo.innerHTML = '<p>Ошибка загрузки данных о товарах</p>';
+                modal.style.display = 'block';
+            });
+        });
+        shelvesContainer.appendChild(shelf);
+    }
+
+    // Навигация
+    document.getElementById('add-product').addEventListener('click', function(event) {
+        event.preventDefault();
+        window.location.href = this.href;
+    });
+    document.getElementById('home').addEventListener('click', function(event) {
+        event.preventDefault();
+        window.location.href = this.href;
+    });
+    document.getElementById('all-shelves').addEventListener('click', function(event) {
+        event.preventDefault();
+        window.location.href = this.href;
+    });
+});
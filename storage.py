@@ -0,0 +1,125 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from PIL import Image
+
+# Хранилище загруженных изображений с адресацией по содержимому.
+# Файл записывается во временный файл один раз, с подсчетом SHA-256 по ходу записи, и хранится под
+# ключом originals/ab/cd/<хеш>: одинаковые снимки хранятся один раз, имена клиента не используются.
+# Бэкенд реализует только операции над ключами (exists/put_file/open/delete), поэтому локальную
+# файловую систему можно заменить общим хранилищем для нескольких узлов.
+CHUNK_SIZE = 64 * 1024
+THUMBNAIL_SIZE = 160
+def original_key(image_hash):
+    return f"originals/{image_hash[:2]}/{image_hash[2:4]}/{image_hash}"
+def thumbnail_key(image_hash):
+    return f"thumbnails/{image_hash[:2]}/{image_hash[2:4]}/{image_hash}.jpg"
+class ReceivedUpload:
+    """Загруженный файл во временном файле; хранится постоянно только после Storage.keep"""
+    def __init__(self, path, image_hash, size):
+        self.path = path
+        self.hash = image_hash
+        self.size = size
+    def open(self):
+        return open(self.path, 'rb')
+class Storage:
+    """Базовый класс бэкенда хранилища"""
+    def exists(self, key):
+        raise NotImplementedError
+    def put_file(self, key, path):
+        """Переместить локальный файл path в хранилище под ключом key"""
+        raise NotImplementedError
+    def open(self, key):
+        raise NotImplementedError
+    def delete(self, key):
+        raise NotImplementedError
+    def temp_dir(self):
+        """Каталог временных файлов; для локального бэкенда — на том же диске, чтобы перенос был атомарным"""
+        return None
+    def receive(self, stream):
+        """Записать поток во временный файл, посчитав хеш; используется как контекстный менеджер"""
+        digest = hashlib.sha256()
+        size = 0
+        fd, path = tempfile.mkstemp(prefix='upload_', dir=self.temp_dir())
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return _Receiving(ReceivedUpload(path, digest.hexdigest(), size))
+    def keep(self, upload):
+        """Сохранить загруженный файл под его хешем и создать миниатюру; возвращает хеш"""
+        if self.exists(original_key(upload.hash)):
+            return upload.hash
+        thumbnail = make_thumbnail(upload.path)
+        if thumbnail is not None:
+            fd, path = tempfile.mkstemp(prefix='thumb_', suffix='.jpg', dir=self.temp_dir())
+            with os.fdopen(fd, 'wb') as f:
+                f.write(thumbnail)
+            self.put_file(thumbnail_key(upload.hash), path)
+        self.put_file(original_key(upload.hash), upload.path)
+        return upload.hash
+class _Receiving:
+    def __init__(self, upload):
+        self.upload = upload
+    def __enter__(self):
+        return self.upload
+    def __exit__(self, *exc):
+        # Временный файл удаляется, если он не был перенесен в хранилище
+        if os.path.exists(self.upload.path):
+            os.remove(self.upload.path)
+        return False
+class LocalStorage(Storage):
+    """Локальная файловая система; root — корень дерева originals/ и thumbnails/"""
+    def __init__(self, root='uploads'):
+        self.root = root
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+    def put_file(self, key, path):
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(path, target)
+        except OSError:
+            # Другой диск: копируем и удаляем исходный файл
+            shutil.copyfile(path, target)
+            os.remove(path)
+    def open(self, key):
+        return open(self._path(key), 'rb')
+    def delete(self, key):
+        if self.exists(key):
+            os.remove(self._path(key))
+    def temp_dir(self):
+        return os.path.join(self.root, 'tmp')
+def make_thumbnail(path, size=THUMBNAIL_SIZE):
+    """Миниатюра JPEG (байты) или None, если файл не изображение"""
+    try:
+        with Image.open(path) as image:
+            if image.format == 'JPEG':
+                image.draft('RGB', (size * 2, size * 2))
+            image = image.convert('RGB')
+            image.thumbnail((size, size))
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=80)
+            return output.getvalue()
+    except (OSError, Image.DecompressionBombError, ValueError):
+        return None
+def image_mimetype(stream):
+    """MIME-тип изображения по содержимому"""
+    try:
+        with Image.open(stream) as image:
+            return Image.MIME.get(image.format, 'application/octet-stream')
+    except OSError:
+        return 'application/octet-stream'
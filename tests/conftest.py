@@ -0,0 +1,117 @@
+import json
+import os
+import sys
+import tempfile
+import uuid
+
+# База и файлы кэшей тестов — во временном каталоге; DATABASE_URL читается при импорте app
+TEST_DIR = tempfile.mkdtemp(prefix='gpt_art_tests_')
+DATABASE_PATH = os.path.join(TEST_DIR, 'test.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE_PATH}'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import app as app_module
+import migrate_db
+from benchmarks.load_test import make_qr_image
+from app import app as flask_app, db, Company, User, Product, StatCounter, rebuild_stats
+
+flask_app.config.update(
+    TESTING=True,
+    DECODE_CACHE_PATH=os.path.join(TEST_DIR, 'decode_cache.db'),
+    FRAGMENT_CACHE_PATH=os.path.join(TEST_DIR, 'fragment_cache.db'),
+    DECODE_JOB_DIR=os.path.join(TEST_DIR, 'decode_jobs'),
+    UPLOAD_STORAGE_OPTIONS={'root': os.path.join(TEST_DIR, 'uploads')},
+    ASSET_DIST_DIR=os.path.join(TEST_DIR, 'dist'),
+    DECODE_POOL_WORKERS=2,
+)
+app_module.asset_manifest.path = os.path.join(TEST_DIR, 'dist', 'manifest.json')
+def reset_database():
+    """Удалить файл базы и сбросить кэши процесса: id записей в новой базе начинаются заново"""
+    with flask_app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(DATABASE_PATH + suffix):
+            os.remove(DATABASE_PATH + suffix)
+    app_module.identity_cache.clear()
+    app_module.decode_memory_cache.clear()
+    app_module.fragment_memory_cache.clear()
+    app_module.decode_cache_counters.clear()
+    app_module.fragment_cache_counters.clear()
+    app_module._storage = None
+    app_module.asset_manifest.loaded = False
+    with flask_app.app_context():
+        for get_cache_db, table in ((app_module.get_decode_cache_db, 'decode_cache'),
+                                    (app_module.get_fragment_cache_db, 'fragment_cache')):
+            get_cache_db().execute(f"DELETE FROM {table}")
+# Фикстуры не держат контекст приложения: иначе запросы тестового клиента делили бы g и сессию базы.
+# Проверки базы в тестах выполняются внутри with app.app_context().
+@pytest.fixture
+def empty_app():
+    """Приложение с пустой базой без схемы (для тестов миграций)"""
+    reset_database()
+    return flask_app
+@pytest.fixture
+def app(empty_app, capsys):
+    """Приложение с базой, обновленной всеми миграциями"""
+    with empty_app.app_context():
+        migrate_db.upgrade()
+    capsys.readouterr()
+    return empty_app
+@pytest.fixture
+def client(app):
+    return app.test_client()
+def login_client(app, email, role, domain='acme', password='secret1'):
+    """Клиент, вошедший в компанию domain; пользователь регистрируется, если его еще нет"""
+    client = app.test_client()
+    with app.app_context():
+        company = Company.query.filter_by(domain=domain).first()
+        exists = company is not None and User.query.filter_by(email=email, company_id=company.id).first()
+    if not exists:
+        response = client.post('/register', data={'domain': domain, 'email': email, 'password1': password,
+                                                  'password2': password, 'role': role})
+    else:
+        response = client.post('/login', data={'domain': domain, 'email': email, 'password': password,
+                                               'role': role})
+    assert response.status_code == 302, response.get_data(as_text=True)
+    return client
+@pytest.fixture
+def owner(app):
+    return login_client(app, 'owner@acme', 'owner')
+@pytest.fixture
+def worker(app):
+    return login_client(app, 'worker@acme', 'worker')
+@pytest.fixture
+def customer(app):
+    return login_client(app, 'customer@acme', 'customer')
+def user_id(app, email, domain='acme'):
+    with app.app_context():
+        company = Company.query.filter_by(domain=domain).one()
+        return User.query.filter_by(email=email, company_id=company.id).one().id
+def qr_png(text):
+    """PNG с QR-кодом text"""
+    return make_qr_image(text)
+def product_payload(article, name='Bolt', price='5'):
+    return json.dumps({"article": article, "name": name, "price": price})
+def add_products(client, contents, shelf_id=None):
+    """Добавить товары через /api/scans; возвращает id товаров в порядке contents"""
+    keys = [uuid.uuid4().hex for _ in contents]
+    scans = [{'key': key, 'qr_content': content, 'shelf_id': shelf_id} for key, content in zip(keys, contents)]
+    limit = flask_app.config['SCAN_BATCH_MAX']
+    for start in range(0, len(scans), limit):
+        response = client.post('/api/scans', json={'scans': scans[start:start + limit]})
+        assert response.get_json()['created'] == keys[start:start + limit], response.get_data(as_text=True)
+    with flask_app.app_context():
+        ids = dict(db.session.query(Product.scan_key, Product.id).filter(Product.scan_key.in_(keys)))
+    return [ids[key] for key in keys]
+def stat_counters(app):
+    """Ненулевые счетчики статистики: {(company_id, scope, name): value}"""
+    with app.app_context():
+        return {(c.company_id, c.scope, c.name): c.value for c in StatCounter.query if c.value}
+def assert_stats_consistent(app):
+    """Счетчики, накопленные приращениями, совпадают с пересчитанными с нуля"""
+    incremental = stat_counters(app)
+    with app.app_context():
+        rebuild_stats()
+    assert incremental == stat_counters(app)
@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import json
+import os
+import pytest
+import assets
+import app as app_module
+from app import asset_url, vendor_script
+from conftest import login_client
+CSS = "/* header */\nbody  {\n    color : red ;\n    margin: 0;\n}\n.a > .b , .c { content: ' ; ' ; }\n" * 40
+JS = "// comment\nconst re = /a\\/b[/]/g;\nlet s = `x ${ {a: 1}.a } // not a comment`;\n/* block */ function f(a) {\n    return a / 2;\n}\n" * 20
+LIBRARY = b'!function(){window.lib=1}();'
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content.encode('utf-8') if isinstance(content, str) else content)
+@pytest.fixture
+def static_dir(tmp_path):
+    root = tmp_path / 'static'
+    write(str(root / 'css' / 'pages' / 'page.css'), CSS)
+    write(str(root / 'js' / 'pages' / 'page.js'), JS)
+    write(str(root / 'vendor' / 'lib.min.js'), LIBRARY)
+    write(str(root / assets.VENDOR_LOCK), json.dumps({
+        'vendor/lib.min.js': {'url': 'https://example.com/lib.min.js', 'sha256': hashlib.sha256(LIBRARY).hexdigest()}}))
+    return str(root)
+def test_minify_keeps_strings_and_regex():
+    assert assets.minify_css("a :hover { color : red ; } /* x */ .b > .c , d { content: ' ; ' ; }") == \
+        "a :hover{color : red} .b>.c,d{content: ' ; '}"
+    minified = assets.minify_js(JS)
+    assert '/a\\/b[/]/g' in minified and '// not a comment`' in minified
+    assert 'comment\n' not in minified.split('`')[0] and 'block' not in minified
+def test_build_writes_fingerprinted_files(static_dir, tmp_path):
+    dist = str(tmp_path / 'dist')
+    manifest, _ = assets.build(static_dir, dist)
+    assert set(manifest) == {'css/pages/page.css', 'js/pages/page.js', 'vendor/lib.min.js'}
+    built = os.path.join(dist, manifest['css/pages/page.css'])
+    with open(built, 'rb') as f:
+        content = f.read()
+    assert manifest['css/pages/page.css'] == f"css/pages/page.{hashlib.sha256(content).hexdigest()[:12]}.css"
+    with open(built + '.gz', 'rb') as f:
+        assert gzip.decompress(f.read()) == content
+    # Уже минифицированные библиотеки копируются как есть; маленькие файлы не сжимаются
+    with open(os.path.join(dist, manifest['vendor/lib.min.js']), 'rb') as f:
+        assert f.read() == LIBRARY
+    assert not os.path.exists(os.path.join(dist, manifest['vendor/lib.min.js']) + '.gz')
+    with open(os.path.join(dist, assets.MANIFEST_NAME), encoding='utf-8') as f:
+        assert json.load(f) == manifest
+    # Повторная сборка без изменений дает те же имена
+    assert assets.build(static_dir, dist)[0] == manifest
+def test_build_rejects_modified_vendor_file(static_dir, tmp_path):
+    write(os.path.join(static_dir, 'vendor', 'lib.min.js'), b'window.lib=2')
+    with pytest.raises(ValueError, match='lib.min.js: SHA-256 не совпадает'):
+        assets.build(static_dir, str(tmp_path / 'dist'))
+def test_build_rejects_missing_or_unpinned_vendor_files(static_dir, tmp_path):
+    os.remove(os.path.join(static_dir, 'vendor', 'lib.min.js'))
+    write(os.path.join(static_dir, 'vendor', 'extra.min.js'), b'1')
+    problems = assets.verify_vendor(static_dir)
+    assert problems == ['vendor/lib.min.js: файла нет (python assets.py vendor)',
+                        'vendor/extra.min.js: нет в vendor.lock.json']
+    write(os.path.join(static_dir, assets.VENDOR_LOCK), json.dumps({'vendor/extra.min.js': {'url': 'x', 'sha256': None},
+                                                                   'vendor/lib.min.js': {'url': 'y', 'sha256': None}}))
+    # Незакрепленная и не скачанная библиотека грузится с CDN и сборку не останавливает
+    assert assets.verify_vendor(static_dir) == [
+        'vendor/extra.min.js: SHA-256 не закреплен (python assets.py vendor --pin)']
+def test_committed_tree_builds(tmp_path):
+    assert assets.verify_vendor() == []
+    assets.build(dist_dir=str(tmp_path / 'dist'))
+def test_committed_lock_lists_scanner_libraries():
+    lock = assets.load_vendor_lock()
+    assert set(lock) == {'vendor/jsQR.min.js', 'vendor/quagga.min.js'}
+    assert all('cdn.jsdelivr.net' in entry['url'] and '@' in entry['url'] for entry in lock.values())
+def test_vendor_script_falls_back_to_cdn(app, static_dir, monkeypatch):
+    lock = {'vendor/jsQR.min.js': {'url': 'https://cdn.example/jsQR.min.js', 'sha256': None, 'integrity': None},
+            'vendor/lib.min.js': {'url': 'https://cdn.example/lib.min.js', 'sha256': None, 'integrity': None}}
+    monkeypatch.setattr(app_module, 'vendor_lock', lock)
+    monkeypatch.setattr(app, 'static_folder', static_dir)
+    with app.test_request_context():
+        assert vendor_script('vendor/jsQR.min.js') == '<script src="https://cdn.example/jsQR.min.js"></script>'
+        lock['vendor/jsQR.min.js']['integrity'] = assets.sri_hash(LIBRARY)
+        assert vendor_script('vendor/jsQR.min.js') == (
+            f'<script src="https://cdn.example/jsQR.min.js" integrity="{assets.sri_hash(LIBRARY)}" '
+            'crossorigin="anonymous"></script>')
+        # Скачанная в static/vendor библиотека отдается с сайта
+        assert vendor_script('vendor/lib.min.js') == '<script src="/static/vendor/lib.min.js"></script>'
+    assert assets.sri_hash(b'') == 'sha384-OLBgp1GsljhM2TJ+sbHjaiH9txEUvgdDTAzHv2P24donTt6/529l+9Ua0vFImLlb'
+def test_scanner_page_loads_libraries(app):
+    page = login_client(app, 'worker@acme', 'worker').get('/four').get_data(as_text=True)
+    for name, entry in assets.load_vendor_lock().items():
+        if not os.path.isfile(os.path.join(assets.STATIC_DIR, name)):
+            assert f'<script src="{entry["url"]}"' in page
+def test_asset_url_and_serving(app, client, static_dir):
+    assets.build(static_dir, app.config['ASSET_DIST_DIR'])
+    with app.test_request_context():
+        url = asset_url('css/pages/page.css')
+        # Ресурса нет в манифесте: исходный файл из static, без CDN
+        assert asset_url('vendor/jsQR.min.js') == '/static/vendor/jsQR.min.js'
+    assert url.startswith('/assets/css/pages/page.')
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert 'immutable' in response.headers['Cache-Control'] and 'max-age=31536000' in response.headers['Cache-Control']
+    plain = client.get(url)
+    assert 'Content-Encoding' not in plain.headers
+    assert gzip.decompress(response.data) == plain.data
+    assert client.get(url, headers={'If-None-Match': plain.headers['ETag']}).status_code == 304
+    for path in ('/assets/manifest.json', url + '.gz', '/assets/../app.py', '/assets/css/missing.css'):
+        assert client.get(path).status_code == 404
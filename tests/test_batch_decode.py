@@ -0,0 +1,40 @@
+import io
+import zipfile
+import pytest
+import app as app_module
+from app import Product
+from conftest import qr_png, product_payload
+@pytest.fixture(autouse=True)
+def shutdown_pool():
+    yield
+    if app_module._decode_pool is not None:
+        app_module._decode_pool.shutdown()
+        app_module._decode_pool = None
+def test_pool_uses_spawn(app):
+    with app.app_context():
+        assert app_module.get_decode_pool()._mp_context.get_start_method() == 'spawn'
+def test_upload_batch_decodes_files_and_zip_in_order(app, worker):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as z:
+        z.writestr('labels/b.png', qr_png(product_payload('B-2')))
+        z.writestr('labels/', '')
+    archive.seek(0)
+    response = worker.post('/upload_batch', data={'files': [
+        (io.BytesIO(qr_png(product_payload('A-1'))), 'a.png'),
+        (io.BytesIO(b'not an image'), 'broken.png'),
+        (archive, 'labels.zip'),
+    ]}, content_type='multipart/form-data')
+    body = response.get_json()
+    assert body['success'] and body['created'] == 2 and body['failed'] == 1
+    assert [(r['file'], r['success']) for r in body['results']] == [
+        ('a.png', True), ('broken.png', False), ('labels/b.png', True)]
+    with app.app_context():
+        products = {p.id: p for p in Product.query}
+        assert [products[r['product_id']].qr_content for r in body['results'] if r['success']] == \
+            [product_payload('A-1'), product_payload('B-2')]
+        assert all(p.image_hash for p in products.values())
+def test_upload_batch_rejects_foreign_shelf_and_empty_request(app, worker):
+    response = worker.post('/upload_batch', data={'shelf_id': '999', 'files': [(io.BytesIO(b'x'), 'a.png')]},
+                           content_type='multipart/form-data')
+    assert response.get_json()['success'] is False
+    assert worker.post('/upload_batch', data={}).get_json()['success'] is False
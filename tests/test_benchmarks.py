@@ -0,0 +1,46 @@
+import json
+import sys
+import threading
+import pytest
+from werkzeug.serving import make_server
+from benchmarks import generate_data, load_test
+from app import Company, Product, Request
+from conftest import assert_stats_consistent
+def run_main(monkeypatch, module, *args):
+    monkeypatch.setattr(sys, 'argv', [module.__name__] + [str(arg) for arg in args])
+    module.main()
+@pytest.fixture
+def server(app):
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+def test_generated_tenants_are_consistent(app, monkeypatch, tmp_path):
+    manifest = tmp_path / 'tenants.json'
+    run_main(monkeypatch, generate_data, '--companies', 2, '--products', 300, '--requests', 50, '--shelves', 10,
+             '--workers', 2, '--customers', 3, '--manifest', manifest)
+    tenants = json.loads(manifest.read_text(encoding='utf-8'))['tenants']
+    assert [tenant['domain'] for tenant in tenants] == ['bench1', 'bench2']
+    with app.app_context():
+        company_id = Company.query.filter_by(domain='bench2').one().id
+        assert Product.query.filter_by(company_id=company_id).count() == 300
+        assert Request.query.filter_by(company_id=company_id).count() == 50
+    assert_stats_consistent(app)
+    # Повторный запуск не создает компании заново
+    run_main(monkeypatch, generate_data, '--companies', 1, '--products', 10, '--manifest', manifest)
+    assert json.loads(manifest.read_text(encoding='utf-8'))['tenants'] == []
+def test_load_test_runs_every_role_without_errors(app, server, monkeypatch, tmp_path):
+    manifest, report = tmp_path / 'tenants.json', tmp_path / 'run.json'
+    run_main(monkeypatch, generate_data, '--products', 200, '--requests', 30, '--shelves', 5, '--workers', 1,
+             '--customers', 2, '--manifest', manifest)
+    run_main(monkeypatch, load_test, '--url', server, '--manifest', manifest, '--users', 3, '--duration', 1,
+             '--warmup', 0, '--revalidate', '--output', report)
+    result = json.loads(report.read_text(encoding='utf-8'))
+    assert result['errors'] == {} and result['total']['count'] > 0
+    assert {action.split('_')[0] for action in result['actions']} == {'owner', 'worker', 'customer', 'upload'}
+def test_load_test_helpers():
+    assert load_test.percentile([1, 2, 3, 4], 50) == 2 and load_test.percentile([], 99) == 0.0
+    assert load_test.assign_roles(10, load_test.parse_mix('owner=1,worker=3,customer=6'),
+                                  [{'users': {'owner': ['o'], 'worker': ['w'], 'customer': []}}]) == \
+        ['owner'] * 2 + ['worker'] * 8
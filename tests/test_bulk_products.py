@@ -0,0 +1,49 @@
+from app import Product, Shelf, Request, db
+from conftest import add_products, assert_stats_consistent, login_client, product_payload
+def add_shelf(client, name):
+    return client.post('/add_shelf', data={'name': name}).get_json()['shelf_id']
+def shelves_of(app, product_ids):
+    with app.app_context():
+        return [db.session.get(Product, product_id).shelf_id for product_id in product_ids]
+def bulk(client, operation, product_ids, **data):
+    return client.post('/bulk_products', json=dict(data, operation=operation, product_ids=product_ids))
+def test_bulk_move_edit_delete(app, worker, customer):
+    shelf = add_shelf(worker, 'A1')
+    ids = add_products(worker, [product_payload(f'A-{i}') for i in range(3)])
+    response = bulk(worker, 'move', ids[:2], shelf_id=shelf)
+    assert response.get_json()['affected'] == 2
+    assert shelves_of(app, ids) == [shelf, shelf, None]
+    assert bulk(worker, 'edit', ids[1:], qr_content=product_payload('B-1')).get_json()['affected'] == 2
+    customer.post(f'/create_request/{ids[2]}')
+    assert bulk(worker, 'delete', ids[::2]).get_json()['affected'] == 2
+    with app.app_context():
+        assert [p.qr_content for p in Product.query] == [product_payload('B-1')]
+        assert [r.product_id for r in Request.query] == [None]
+    assert_stats_consistent(app)
+def test_bulk_rejects_foreign_products_atomically(app, worker):
+    other = login_client(app, 'other@acme', 'worker')
+    mine = add_products(worker, [product_payload('A-1')])
+    theirs = add_products(other, [product_payload('B-1')])
+    response = bulk(worker, 'delete', mine + theirs)
+    assert response.status_code == 404 and response.get_json()['missing'] == theirs
+    assert bulk(worker, 'move', mine, shelf_id=add_shelf(other, 'B')).status_code == 404
+    assert bulk(worker, 'rename', mine).status_code == 400
+    with app.app_context():
+        assert Product.query.count() == 2
+def test_remove_all_shelves_clears_every_product_on_them(app, owner, worker):
+    other = login_client(app, 'other@acme', 'worker')
+    shelf = add_shelf(worker, 'A1')
+    other_shelf = add_shelf(other, 'B1')
+    own = add_products(worker, [product_payload('A-1')], shelf_id=shelf)
+    # Товар другого работника на полке worker и товар worker на чужой полке (переносит владелец)
+    foreign, moved = add_products(other, [product_payload('B-1')]), add_products(worker, [product_payload('A-2')])
+    assert bulk(owner, 'move', foreign, shelf_id=shelf).status_code == 200
+    assert bulk(owner, 'move', moved, shelf_id=other_shelf).status_code == 200
+    etag = other.get('/get_products').headers['ETag']
+    assert worker.post('/remove_all_shelves').get_json()['success']
+    assert shelves_of(app, own + foreign + moved) == [None, None, other_shelf]
+    with app.app_context():
+        assert [s.id for s in Shelf.query] == [other_shelf]
+    # Список товаров другого работника изменился: прежний ETag больше не подходит
+    assert other.get('/get_products', headers={'If-None-Match': etag}).status_code == 200
+    assert_stats_consistent(app)
@@ -0,0 +1,38 @@
+from conftest import add_products, login_client, product_payload
+def revalidate(client, url, response):
+    return client.get(url, headers={'If-None-Match': response.headers['ETag']})
+def test_unchanged_list_answers_304(app, worker):
+    add_products(worker, [product_payload('A-1')])
+    first = worker.get('/get_products')
+    assert first.status_code == 200 and 'no-cache' in first.headers['Cache-Control']
+    not_modified = revalidate(worker, '/get_products', first)
+    assert not_modified.status_code == 304 and not_modified.data == b''
+    assert not_modified.headers['ETag'] == first.headers['ETag']
+    # Другие параметры запроса — другой ETag
+    assert revalidate(worker, '/get_products?limit=1', first).status_code == 200
+    assert worker.get('/get_products', headers={
+        'If-Modified-Since': first.headers['Last-Modified']}).status_code == 304
+def test_write_changes_etag(app, worker):
+    first = worker.get('/get_products')
+    add_products(worker, [product_payload('A-1')])
+    changed = revalidate(worker, '/get_products', first)
+    assert changed.status_code == 200 and len(changed.get_json()['items']) == 1
+    # Список товаров зависит и от полок
+    worker.post('/add_shelf', data={'name': 'A1'})
+    assert revalidate(worker, '/get_products', changed).status_code == 200
+def test_versions_are_scoped_to_what_the_user_sees(app, owner, worker):
+    other = login_client(app, 'other@acme', 'worker')
+    mine, everything = worker.get('/get_products'), owner.get('/get_products')
+    add_products(other, [product_payload('B-1')])
+    # Работник видит только свои товары: чужая запись его ETag не меняет, а список владельца меняет
+    assert revalidate(worker, '/get_products', mine).status_code == 304
+    assert revalidate(owner, '/get_products', everything).status_code == 200
+    # ETag одного пользователя не подходит другому
+    assert revalidate(other, '/get_products', mine).status_code == 200
+def test_request_lists_follow_request_writes(app, owner, worker, customer):
+    product_id, = add_products(worker, [product_payload('A-1')])
+    before = owner.get('/api/owner_requests')
+    stats = customer.get('/api/stats')
+    customer.post(f'/create_request/{product_id}')
+    assert revalidate(owner, '/api/owner_requests', before).status_code == 200
+    assert revalidate(customer, '/api/stats', stats).status_code == 200
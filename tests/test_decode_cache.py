@@ -0,0 +1,44 @@
+import io
+import app as app_module
+from app import cached_decode, decode_cache_stats, prune_decode_cache
+from qr_decoder import DecodeResult, decode_qr
+from conftest import qr_png
+def counting(result):
+    calls = []
+    def decode(content):
+        calls.append(content)
+        return result
+    return decode, calls
+def test_memory_then_disk_then_decode(app):
+    decode, calls = counting(DecodeResult('X', 'reduced', 5.0))
+    with app.app_context():
+        assert cached_decode(b'image', 'single', decode)[1] is None
+        assert cached_decode(b'image', 'single', decode)[0][:2] == ('X', 'reduced')
+        app_module.decode_memory_cache.clear()
+        result, level = cached_decode(b'image', 'single', decode)
+        assert (result.data, level) == ('X', 'disk')
+        assert cached_decode(b'image', 'single', decode)[1] == 'memory'
+        # Другой режим и другое содержимое — другие записи
+        cached_decode(b'image', 'multi', decode)
+        cached_decode(b'other', 'single', decode)
+        assert calls == [b'image', b'image', b'other']
+        assert decode_cache_stats()['misses'] == 3 and decode_cache_stats()['disk_hits'] == 1
+def test_failed_decodes_are_cached_and_old_entries_pruned(app):
+    decode, calls = counting(DecodeResult(None, None, 1.0))
+    with app.app_context():
+        cached_decode(b'blank', 'single', decode)
+        assert cached_decode(b'blank', 'single', decode)[0].data is None
+        assert len(calls) == 1
+        app.config['DECODE_CACHE_MAX_AGE'], max_age = -1, app.config['DECODE_CACHE_MAX_AGE']
+        try:
+            assert prune_decode_cache() == 1
+        finally:
+            app.config['DECODE_CACHE_MAX_AGE'] = max_age
+def test_repeated_upload_is_served_from_cache(app, worker, monkeypatch):
+    png = qr_png('CACHED')
+    first = worker.post('/upload_qr', data={'file': (io.BytesIO(png), 'a.png')}).get_json()
+    calls = []
+    monkeypatch.setattr(app_module, 'decode_qr', lambda content: calls.append(content) or decode_qr(content))
+    second = worker.post('/upload_qr', data={'file': (io.BytesIO(png), 'b.png')}).get_json()
+    assert first['qr_content'] == second['qr_content'] == 'CACHED'
+    assert second['decode']['stage'] == first['decode']['stage'] and calls == []
@@ -0,0 +1,52 @@
+import io
+import os
+from datetime import datetime, timedelta, timezone
+from app import DecodeJob, db, claim_decode_job, run_decode_job, requeue_stale_decode_jobs, prune_decode_jobs
+from conftest import login_client, qr_png
+def enqueue(client, content=b'', **form):
+    data = dict(form, file=(io.BytesIO(content or qr_png('ASYNC')), 'a.png'), **{'async': '1'})
+    return client.post('/upload_qr', data=data)
+def run_next(app):
+    with app.app_context():
+        job = claim_decode_job()
+        if job is not None:
+            run_decode_job(job)
+            db.session.remove()
+        return job is not None
+def test_job_is_queued_decoded_and_polled(app, worker):
+    first = enqueue(worker)
+    assert first.status_code == 202
+    second = enqueue(worker, b'not an image').get_json()
+    assert worker.get(second['status_url']).get_json() == {
+        'success': True, 'job_id': second['job_id'], 'status': 'queued', 'position': 1}
+    assert run_next(app) and run_next(app) and not run_next(app)
+    done = worker.get(first.get_json()['status_url']).get_json()
+    assert done['status'] == 'done' and done['result']['qr_content'] == 'ASYNC'
+    # Ошибка распознавания — результат задания, а не сбой очереди
+    assert worker.get(second['status_url']).get_json()['result']['success'] is False
+    with app.app_context():
+        assert not any(os.path.exists(job.path) for job in DecodeJob.query)
+def test_jobs_are_private_and_queue_is_bounded(app, worker, owner):
+    job = enqueue(worker).get_json()
+    assert login_client(app, 'other@acme', 'worker').get(job['status_url']).status_code == 404
+    assert owner.get('/api/decode_jobs/stats').get_json()['queued'] == 1
+    app.config['DECODE_JOB_MAX_QUEUE'], limit = 1, app.config['DECODE_JOB_MAX_QUEUE']
+    try:
+        assert enqueue(worker).status_code == 503
+    finally:
+        app.config['DECODE_JOB_MAX_QUEUE'] = limit
+def test_stale_jobs_are_requeued_until_attempts_run_out(app, worker):
+    for _ in range(2):
+        enqueue(worker)
+    with app.app_context():
+        jobs = DecodeJob.query.order_by(DecodeJob.id).all()
+        for job, attempts in zip(jobs, (1, app.config['DECODE_JOB_MAX_ATTEMPTS'])):
+            job.status, job.attempts = 'running', attempts
+            job.started_at = datetime.now(timezone.utc) - timedelta(seconds=app.config['DECODE_JOB_TIMEOUT'] + 1)
+        db.session.commit()
+        assert requeue_stale_decode_jobs() == 2
+        assert [job.status for job in DecodeJob.query.order_by(DecodeJob.id)] == ['queued', 'failed']
+        failed = DecodeJob.query.filter_by(status='failed').one()
+        failed.finished_at = datetime.now(timezone.utc) - timedelta(seconds=app.config['DECODE_JOB_RETENTION'] + 1)
+        db.session.commit()
+        assert prune_decode_jobs() == 1 and DecodeJob.query.count() == 1
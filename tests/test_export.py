@@ -0,0 +1,40 @@
+import csv
+import gzip
+import io
+import json
+from conftest import add_products, login_client, product_payload
+def export(client, kind, **params):
+    response = client.get(f'/api/export/{kind}', query_string=params)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.headers['Content-Disposition'].startswith(f'attachment; filename="{kind}-')
+    return response
+def test_products_csv_and_ndjson(app, owner, worker):
+    shelf = worker.post('/add_shelf', data={'name': 'Полка 1'}).get_json()['shelf_id']
+    ids = add_products(worker, [product_payload('A-1', 'Болт', '5')], shelf_id=shelf) + \
+        add_products(worker, ['PLAIN-2'])
+    text = export(owner, 'products').get_data(as_text=True)
+    # BOM для Excel, дальше обычный CSV
+    assert text.startswith('\ufeff')
+    rows = list(csv.DictReader(io.StringIO(text[1:])))
+    assert [(int(r['id']), r['article'], r['name'], r['shelf_name']) for r in rows] == [
+        (ids[0], 'A-1', 'Болт', 'Полка 1'), (ids[1], 'PLAIN-2', 'Товар (QR: PLAIN-2)', '')]
+    lines = export(owner, 'products', format='ndjson', shelf_id=shelf).get_data(as_text=True).splitlines()
+    assert [json.loads(line)['price'] for line in lines] == ['5']
+def test_gzip_streams_many_batches(app, owner, worker):
+    add_products(worker, [product_payload(f'A-{i}') for i in range(2500)])
+    response = export(owner, 'products', format='ndjson', gzip='1')
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('.ndjson.gz"')
+    assert len(gzip.decompress(response.data).decode('utf-8').splitlines()) == 2500
+def test_export_scope_and_errors(app, owner, worker, customer):
+    other = login_client(app, 'other@acme', 'worker')
+    add_products(worker, [product_payload('A-1')])
+    add_products(other, [product_payload('B-1')])
+    assert len(export(worker, 'products', format='ndjson').data.splitlines()) == 1
+    assert len(export(owner, 'products', format='ndjson').data.splitlines()) == 2
+    other.post('/add_shelf', data={'name': 'B'})
+    assert export(worker, 'shelves', format='ndjson').data == b''
+    assert worker.get('/api/export/requests').status_code == 403
+    assert owner.get('/api/export/users').status_code == 404
+    assert owner.get('/api/export/products', query_string={'format': 'xml'}).status_code == 400
+    assert owner.get('/api/export/products', query_string={'limit': 'x'}).status_code == 400
@@ -0,0 +1,39 @@
+import app as app_module
+from conftest import add_products, login_client, product_payload
+OWNER_LIST = 'fragments/owner_products_list.html'
+def lookups(template=OWNER_LIST):
+    return app_module.fragment_cache_stats()['fragments'].get(template, {})
+def test_write_invalidates_cached_list(app, owner, worker):
+    add_products(worker, [product_payload('ART-1')])
+    first = owner.get('/owner_products').get_data(as_text=True)
+    assert owner.get('/owner_products').get_data(as_text=True) == first
+    assert (lookups()['misses'], lookups()['memory_hits']) == (1, 1)
+    add_products(worker, [product_payload('ART-2')])
+    assert app_module.fragment_cache_stats()['invalidations'] >= 1
+    page = owner.get('/owner_products').get_data(as_text=True)
+    assert 'ART-2' in page and lookups()['misses'] == 2
+    # Вид по SKU — отдельный слот
+    owner.get('/owner_products', query_string={'view': 'sku'})
+    assert lookups()['misses'] == 3
+def test_disk_tier_survives_memory_loss(app, owner, worker):
+    add_products(worker, [product_payload('ART-1')])
+    first = owner.get('/owner_products').get_data(as_text=True)
+    app_module.fragment_memory_cache.clear()
+    assert owner.get('/owner_products').get_data(as_text=True) == first
+    assert lookups()['disk_hits'] == 1
+    # Без файла кэша фрагмент перерисовывается
+    app_module.fragment_memory_cache.clear()
+    path = app.config['FRAGMENT_CACHE_PATH']
+    app.config['FRAGMENT_CACHE_PATH'] = None
+    try:
+        assert owner.get('/owner_products').get_data(as_text=True) == first
+    finally:
+        app.config['FRAGMENT_CACHE_PATH'] = path
+    assert (lookups()['disk_hits'], lookups()['misses']) == (1, 2)
+def test_slots_are_company_scoped(app, worker, customer):
+    add_products(worker, [product_payload('ART-ACME')])
+    assert 'ART-ACME' in customer.get('/customer_products').get_data(as_text=True)
+    other = login_client(app, 'customer@other', 'customer', domain='other')
+    page = other.get('/customer_products').get_data(as_text=True)
+    assert 'ART-ACME' not in page
+    assert lookups('fragments/customer_products_list.html')['misses'] == 2
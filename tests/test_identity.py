@@ -0,0 +1,35 @@
+import app as app_module
+from app import TTLCache, User, db
+from conftest import user_id
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    # Вытесняется давно не читавшаяся запись
+    assert cache.get('b') is None and cache.get('a') == 1 and len(cache) == 2
+    assert cache.pop_where(lambda key: key in ('a', 'b')) == 1 and len(cache) == 1
+    cache.ttl = -1
+    cache.set('d', 4)
+    assert cache.get('d') is None
+def test_user_is_loaded_once_and_invalidated_on_change(app, worker):
+    worker_id = user_id(app, 'worker@acme')
+    app_module.identity_cache.clear()
+    for _ in range(3):
+        assert worker.get('/get_products').status_code == 200
+    assert app_module.identity_cache.get(('user', worker_id)).role == 'worker'
+    with app.app_context():
+        db.session.get(User, worker_id).role = 'customer'
+        db.session.commit()
+    assert app_module.identity_cache.get(('user', worker_id)) is None
+    # Новая роль действует сразу, не дожидаясь истечения TTL
+    assert worker.post('/api/scans', json={'scans': [{'key': 'k', 'qr_content': 'X'}]}).status_code == 403
+def test_deleted_user_is_logged_out(app, worker):
+    worker_id = user_id(app, 'worker@acme')
+    assert worker.get('/get_products').status_code == 200
+    with app.app_context():
+        db.session.delete(db.session.get(User, worker_id))
+        db.session.commit()
+    assert worker.get('/get_products').get_json() == app_module.EMPTY_PAGE
+    assert worker.get('/four').status_code == 302
@@ -0,0 +1,48 @@
+import io
+import json
+from app import Product, Shelf, User, db, import_products
+from conftest import add_products, assert_stats_consistent, login_client, product_payload
+def upload(client, content, filename, **form):
+    return client.post('/import_products', data=dict(form, file=(io.BytesIO(content), filename)))
+def test_csv_import_creates_shelves_and_reports_bad_rows(app, worker):
+    existing = worker.post('/add_shelf', data={'name': 'A1'}).get_json()['shelf_id']
+    content = ('article,name,price,shelf_name,created_at\n'
+               'A-1,Болт,5,A1,2024-01-02T10:00:00+03:00\n'
+               ',,,A1,\n'
+               'A-2,Гайка,3,B2,\n'
+               'A-3,Шайба,1,,not a date\n').encode('utf-8-sig')
+    body = upload(worker, content, 'products.csv').get_json()
+    assert (body['created'], body['shelves_created'], body['error_count']) == (2, 1, 2)
+    assert [error['row'] for error in body['errors']] == [2, 4]
+    with app.app_context():
+        products = {json.loads(p.qr_content)['article']: p for p in Product.query}
+        assert products['A-1'].shelf_id == existing
+        assert str(products['A-1'].created_at) == '2024-01-02 07:00:00'
+        assert db.session.get(Shelf, products['A-2'].shelf_id).name == 'B2'
+    assert_stats_consistent(app)
+def test_export_file_imports_back(app, owner, worker):
+    add_products(worker, [product_payload('A-1'), 'PLAIN'])
+    exported = owner.get('/api/export/products', query_string={'format': 'ndjson', 'gzip': '1'}).data
+    other = login_client(app, 'worker@other', 'worker', domain='other')
+    body = upload(other, exported, 'products.ndjson.gz').get_json()
+    assert body['success'] and body['created'] == 2
+    with app.app_context():
+        assert sorted(p.qr_content for p in Product.query.filter_by(company_id=2)) == \
+            sorted([product_payload('A-1'), 'PLAIN'])
+def test_import_writes_in_batches(app, worker):
+    app.config['IMPORT_BATCH_SIZE'], batch_size = 3, app.config['IMPORT_BATCH_SIZE']
+    lines = '\n'.join(json.dumps({'article': f'A-{i}'}) for i in range(7)) + '\n{broken\n'
+    reports = []
+    try:
+        with app.app_context():
+            user = User.query.filter_by(email='worker@acme').one()
+            report = import_products(user, io.BytesIO(lines.encode()), 'ndjson',
+                                     progress=lambda r: reports.append(r['created']))
+    finally:
+        app.config['IMPORT_BATCH_SIZE'] = batch_size
+    assert reports == [3, 6, 7] and report['error_count'] == 1
+def test_import_errors(app, worker, customer):
+    assert upload(customer, b'a', 'a.csv').status_code == 403
+    assert upload(worker, b'a', 'a.csv', format='xml').status_code == 400
+    body = upload(worker, b'article\nA-1\n\xff\xfe\n', 'a.csv')
+    assert body.status_code == 400 and body.get_json()['aborted']
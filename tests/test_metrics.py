@@ -0,0 +1,39 @@
+import app as app_module
+from metrics import MetricsRegistry
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    counter = registry.counter('jobs_total', 'Задания')
+    histogram = registry.histogram('job_seconds', 'Время', buckets=(0.1, 1.0))
+    registry.collector('broken', 'gauge', 'Сломанный сборщик', lambda: 1 / 0)
+    counter.inc(endpoint='a"b')
+    counter.inc(2, endpoint='a"b')
+    histogram.observe(0.5)
+    histogram.observe(5)
+    errors = []
+    text = registry.render(on_error=lambda name, e: errors.append(name))
+    assert text.splitlines() == [
+        '# HELP jobs_total Задания', '# TYPE jobs_total counter', 'jobs_total{endpoint="a\\"b"} 3',
+        '# HELP job_seconds Время', '# TYPE job_seconds histogram',
+        'job_seconds_bucket{le="0.1"} 0', 'job_seconds_bucket{le="1"} 1', 'job_seconds_bucket{le="+Inf"} 2',
+        'job_seconds_sum 5.5', 'job_seconds_count 2']
+    assert errors == ['broken']
+def test_requests_and_queries_are_counted(app, worker):
+    before = app_module.http_requests.value(endpoint='get_products', method='GET', status='200')
+    queries = app_module.db_queries.value(endpoint='get_products')
+    worker.get('/get_products')
+    assert app_module.http_requests.value(endpoint='get_products', method='GET', status='200') == before + 1
+    assert app_module.db_queries.value(endpoint='get_products') > queries
+    text = worker.get('/metrics').get_data(as_text=True)
+    assert 'http_request_duration_seconds_bucket{endpoint="get_products",method="GET",le="+Inf"}' in text
+    assert 'decode_queue_jobs' in text and 'fragment_cache_memory_entries' in text
+def test_query_budget_and_token(app, client):
+    exceeded = app_module.db_budget_exceeded.value(endpoint='metrics_view')
+    app.config['METRICS_QUERY_BUDGET'], budget = -1, app.config['METRICS_QUERY_BUDGET']
+    app.config['METRICS_TOKEN'] = 'secret'
+    try:
+        assert client.get('/metrics').status_code == 403
+        response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        assert response.status_code == 200 and response.mimetype == 'text/plain'
+    finally:
+        app.config['METRICS_QUERY_BUDGET'], app.config['METRICS_TOKEN'] = budget, None
+    assert app_module.db_budget_exceeded.value(endpoint='metrics_view') == exceeded + 2
@@ -0,0 +1,131 @@
+from sqlalchemy import text, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+import migrate_db
+from app import db, Request, StatCounter
+
+# Схема базы исходной версии приложения (до версионированных миграций)
+BASELINE_SCHEMA = [
+    "CREATE TABLE company (id INTEGER PRIMARY KEY, domain VARCHAR(120) NOT NULL UNIQUE, "
+    "name VARCHAR(120) NOT NULL, created_at DATETIME)",
+    "CREATE TABLE user (id INTEGER PRIMARY KEY, email VARCHAR(120) NOT NULL, password VARCHAR(120) NOT NULL, "
+    "role VARCHAR(20) NOT NULL, company_id INTEGER NOT NULL REFERENCES company (id), "
+    "CONSTRAINT unique_email_per_company UNIQUE (email, company_id))",
+    "CREATE TABLE shelf (id INTEGER PRIMARY KEY, name VARCHAR(120) NOT NULL, "
+    "user_id INTEGER NOT NULL REFERENCES user (id), company_id INTEGER NOT NULL REFERENCES company (id))",
+    "CREATE TABLE product (id INTEGER PRIMARY KEY, qr_content VARCHAR(255) NOT NULL, "
+    "user_id INTEGER NOT NULL REFERENCES user (id), company_id INTEGER NOT NULL REFERENCES company (id), "
+    "shelf_id INTEGER REFERENCES shelf (id), created_at DATETIME)",
+    "CREATE TABLE request (id INTEGER PRIMARY KEY, customer_id INTEGER NOT NULL REFERENCES user (id), "
+    "product_id INTEGER REFERENCES product (id), company_id INTEGER NOT NULL REFERENCES company (id), "
+    "status VARCHAR(20) NOT NULL, created_at DATETIME, request_type VARCHAR(50), priority VARCHAR(20), "
+    "description TEXT)",
+]
+BASELINE_DATA = [
+    "INSERT INTO company (id, domain, name, created_at) VALUES (1, 'acme', 'Acme', '2024-01-01 00:00:00')",
+    "INSERT INTO user (id, email, password, role, company_id) VALUES "
+    "(1, 'owner@acme', 'x', 'owner', 1), (2, 'worker@acme', 'x', 'worker', 1), (3, 'customer@acme', 'x', 'customer', 1)",
+    "INSERT INTO shelf (id, name, user_id, company_id) VALUES (1, 'A1', 2, 1)",
+    "INSERT INTO product (id, qr_content, user_id, company_id, shelf_id, created_at) VALUES "
+    "(1, '{\"article\": \"A-1\", \"name\": \"Bolt\", \"price\": \"5\"}', 2, 1, 1, '2024-01-02 00:00:00'), "
+    "(2, 'PLAIN-2', 2, 1, NULL, '2024-01-03 00:00:00')",
+    # Две заявки заказчика на один товар — последствие гонки проверки в старой версии
+    "INSERT INTO request (id, customer_id, product_id, company_id, status, created_at) VALUES "
+    "(1, 3, 1, 1, 'new', '2024-01-04 00:00:00'), (2, 3, 1, 1, 'completed', '2024-01-05 00:00:00'), "
+    "(3, 3, NULL, 1, 'new', '2024-01-06 00:00:00'), (4, 3, NULL, 1, 'new', '2024-01-07 00:00:00')",
+]
+def create_baseline(app):
+    with app.app_context(), db.engine.begin() as conn:
+        for statement in BASELINE_SCHEMA + BASELINE_DATA:
+            conn.execute(text(statement))
+def request_indexes():
+    return {ix['name']: ix for ix in inspect(db.engine).get_indexes('request')}
+def test_upgrade_baseline_with_duplicate_requests(empty_app):
+    create_baseline(empty_app)
+    with empty_app.app_context():
+        migrate_db.upgrade(3)
+        # Миграция 3 строит индекс в исходном, неуникальном виде
+        assert not request_indexes()['ix_request_customer_product']['unique']
+        migrate_db.upgrade()
+        assert migrate_db.current_version() == max(m['version'] for m in migrate_db.MIGRATIONS)
+        assert request_indexes()['ix_request_customer_product_unique']['unique']
+        assert 'ix_request_customer_product' not in request_indexes()
+        # Из повторных заявок на товар осталась первая, остальные сохранены; общие заявки без товара не тронуты
+        assert [r.id for r in Request.query.order_by(Request.id)] == [1, 3, 4]
+        assert db.session.execute(text("SELECT id, status FROM request_duplicate")).all() == [(2, 'completed')]
+        counter = StatCounter.query.filter_by(company_id=1, scope='requests_status', name='completed').first()
+        assert counter is None or counter.value == 0
+        # Откат миграции 9 возвращает перенесенные заявки
+        migrate_db.downgrade(8)
+        assert [r.id for r in Request.query.order_by(Request.id)] == [1, 2, 3, 4]
+        assert not inspect(db.engine).has_table('request_duplicate')
+        assert not request_indexes()['ix_request_customer_product']['unique']
+        assert StatCounter.query.filter_by(company_id=1, scope='requests_status', name='completed').one().value == 1
+def test_downgrade_and_upgrade_again(empty_app):
+    create_baseline(empty_app)
+    with empty_app.app_context():
+        migrate_db.upgrade()
+        migrate_db.downgrade(2)
+        assert request_indexes() == {}
+        migrate_db.upgrade()
+        assert request_indexes()['ix_request_customer_product_unique']['unique']
+def test_fresh_database(empty_app):
+    with empty_app.app_context():
+        migrate_db.upgrade()
+        assert request_indexes()['ix_request_customer_product_unique']['unique']
+def test_check_explains_every_hot_query(empty_app, capsys):
+    create_baseline(empty_app)
+    with empty_app.app_context():
+        migrate_db.upgrade()
+        capsys.readouterr()
+        # На двух-трех строках после ANALYZE SQLite вправе выбрать SCAN, поэтому число не проверяем
+        migrate_db.check()
+    output = capsys.readouterr().out
+    assert output.count('ok ') + output.count('НЕТ ИНДЕКСА') == len(migrate_db.hot_queries())
+def test_check_fresh_database(empty_app):
+    with empty_app.app_context():
+        migrate_db.upgrade()
+        assert migrate_db.check() == 0
+def test_migrations_round_trip_to_baseline(empty_app, capsys):
+    create_baseline(empty_app)
+    latest = max(m['version'] for m in migrate_db.MIGRATIONS)
+    with empty_app.app_context():
+        migrate_db.upgrade()
+        capsys.readouterr()
+        migrate_db.upgrade()
+        assert 'Миграция' not in capsys.readouterr().out
+        # Откат до исходной схемы (миграция 1 удалила бы таблицы с данными)
+        migrate_db.downgrade(1)
+        migrate_db.status()
+        output = capsys.readouterr().out
+        assert output.count('ожидает') == latest - 1
+        migrate_db.upgrade()
+        assert migrate_db.current_version() == latest
+        # Данные исходной версии пережили откат и повторное применение
+        assert [r.id for r in Request.query.order_by(Request.id)] == [1, 3, 4]
+        assert db.session.execute(text("SELECT COUNT(*) FROM product WHERE sku_id IS NULL")).scalar() == 0
+def test_postgresql_builds_unique_indexes_concurrently():
+    dialect = postgresql.dialect()
+    assert migrate_db.index_ddl('ix_request_customer_product', 'request', ['customer_id', 'product_id'], True,
+                                dialect) == \
+        ('request', 'CREATE UNIQUE INDEX CONCURRENTLY ix_request_customer_product ON request (customer_id, product_id)')
+    table, ddl = migrate_db.index_ddl('ix_product_company_scan_key', None, None, False, dialect)
+    assert (table, ddl) == ('product', 'CREATE UNIQUE INDEX CONCURRENTLY ix_product_company_scan_key '
+                                       'ON product (company_id, scan_key)')
+    assert migrate_db.index_ddl('ix_shelf_company_user', None, None, False, dialect)[1].startswith(
+        'CREATE INDEX CONCURRENTLY ix_shelf_company_user ')
+    assert 'CONCURRENTLY' not in migrate_db.index_ddl('ix_product_company_scan_key', None, None, False,
+                                                      sqlite.dialect())[1]
+def test_fresh_database_goes_through_every_migration(empty_app, capsys):
+    with empty_app.app_context():
+        migrate_db.upgrade(1)
+        inspector = inspect(db.engine)
+        assert set(inspector.get_table_names()) == {'company', 'user', 'shelf', 'product', 'request', 'schema_version'}
+        assert 'scan_key' not in [c['name'] for c in inspector.get_columns('product')]
+        assert request_indexes() == {}
+        migrate_db.upgrade()
+        # После всех миграций схема совпадает с моделями
+        inspector = inspect(db.engine)
+        for table in db.metadata.tables.values():
+            assert {c['name'] for c in inspector.get_columns(table.name)} == set(table.columns.keys())
+            assert {ix.name for ix in table.indexes} <= {ix['name'] for ix in inspector.get_indexes(table.name)}
+    assert 'Миграция 9' in capsys.readouterr().out
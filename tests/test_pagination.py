@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from app import Product, Request, db
+from conftest import add_products, login_client, product_payload, user_id
+def pages(client, url, **params):
+    """Все страницы списка по курсору next_cursor"""
+    items, after = [], None
+    while True:
+        query = dict(params, after=after) if after is not None else params
+        page = client.get(url, query_string=query).get_json()
+        items.append([item['id'] for item in page['items']])
+        assert page['has_more'] == (page['next_cursor'] is not None)
+        if not page['has_more']:
+            return items
+        after = page['next_cursor']
+def test_products_keyset_pages(app, owner, worker):
+    ids = add_products(worker, [product_payload(f'A-{i}') for i in range(7)])
+    assert pages(owner, '/get_products', limit=3) == [ids[6:3:-1], ids[3:0:-1], ids[:1]]
+    assert pages(owner, '/get_products', limit=3, order='asc') == [ids[:3], ids[3:6], ids[6:]]
+    # Вставка между запросами страниц не сдвигает и не повторяет уже выданные строки
+    first = owner.get('/get_products', query_string={'limit': 3}).get_json()
+    add_products(worker, [product_payload('NEW')])
+    second = owner.get('/get_products', query_string={'limit': 3, 'after': first['next_cursor']}).get_json()
+    assert [item['id'] for item in second['items']] == ids[3:0:-1]
+def test_products_filters(app, owner, worker):
+    shelf = worker.post('/add_shelf', data={'name': 'A1'}).get_json()['shelf_id']
+    on_shelf = add_products(worker, [product_payload('A-1')], shelf_id=shelf)
+    loose = add_products(worker, [product_payload('A-2')])
+    other = add_products(login_client(app, 'other@acme', 'worker'), [product_payload('B-1')])
+    assert pages(owner, '/get_products', shelf_id=shelf) == [on_shelf]
+    assert pages(owner, '/get_products', shelf_id='none') == [other + loose]
+    # Работник видит только свои товары
+    assert pages(worker, '/get_products') == [loose + on_shelf]
+    with app.app_context():
+        db.session.get(Product, on_shelf[0]).created_at = datetime(2024, 1, 10, 12)
+        db.session.commit()
+    assert pages(owner, '/get_products', created_from='2024-01-10', created_to='2024-01-10') == [on_shelf]
+    assert pages(owner, '/get_products', created_to='2024-01-09') == [[]]
+    for bad in ({'limit': 'x'}, {'after': 'x'}, {'order': 'up'}, {'shelf_id': 'x'}, {'created_from': 'x'}):
+        assert owner.get('/get_products', query_string=bad).status_code == 400
+def test_request_lists(app, owner, worker, customer):
+    ids = add_products(worker, [product_payload(f'A-{i}') for i in range(3)])
+    for product_id in ids:
+        customer.post(f'/create_request/{product_id}')
+    customer.post('/create_custom_request', json={'type': 'service', 'priority': 'high', 'description': 'Call'})
+    other = login_client(app, 'other@acme', 'customer')
+    other.post(f'/create_request/{ids[0]}')
+    with app.app_context():
+        mine = [r.id for r in Request.query.filter_by(customer_id=user_id(app, 'customer@acme')).order_by(Request.id.desc())]
+        first = Request.query.order_by(Request.id).first()
+        first.status = 'completed'
+        first.created_at -= timedelta(days=30)
+        db.session.commit()
+    assert pages(customer, '/api/customer_requests', limit=2) == [mine[:2], mine[2:]]
+    assert len(pages(owner, '/api/owner_requests')[0]) == 5
+    assert pages(owner, '/api/owner_requests', status='completed') == [[mine[-1]]]
+    assert pages(owner, '/api/owner_requests', priority='high') == [[mine[0]]]
+    since = (datetime.now() - timedelta(days=7)).date().isoformat()
+    assert mine[-1] not in pages(owner, '/api/owner_requests', created_from=since)[0]
+    # Чужая роль получает пустую страницу
+    assert customer.get('/api/owner_requests').get_json()['items'] == []
+    assert owner.get('/api/customer_requests').get_json()['items'] == []
@@ -0,0 +1,28 @@
+import json
+import sys
+from benchmarks import qr_benchmark, qr_corpus
+def test_corpus_is_reproducible(tmp_path, capsys):
+    first = qr_corpus.generate(str(tmp_path / 'a'), 2, ['clean', 'multi'], seed=5)
+    second = qr_corpus.generate(str(tmp_path / 'b'), 2, ['clean', 'multi'], seed=5)
+    assert first == second
+    assert [image['mode'] for image in first] == ['single', 'single', 'multi', 'multi']
+    assert all(len(image['expected']) > 1 for image in first if image['mode'] == 'multi')
+    manifest = json.loads((tmp_path / 'a' / 'manifest.json').read_text(encoding='utf-8'))
+    assert manifest == {'seed': 5, 'images': first}
+def test_benchmark_reports_every_mode(tmp_path, monkeypatch, capsys):
+    corpus, report = tmp_path / 'corpus', tmp_path / 'qr.json'
+    qr_corpus.generate(str(corpus), 2, ['clean'], seed=1)
+    monkeypatch.setattr(sys, 'argv', ['qr_benchmark', '--corpus', str(corpus), '--workers', '2',
+                                      '--output', str(report)])
+    qr_benchmark.main()
+    result = json.loads(report.read_text(encoding='utf-8'))
+    assert set(result['modes']) == set(qr_benchmark.MODES)
+    for mode in result['modes'].values():
+        assert mode['images'] == 2 and mode['errors'] == 0 and mode['wrong'] == 0
+        assert mode['success_rate'] == 1.0 and set(mode['categories']) == {'clean'}
+    # Сравнение с предыдущим отчетом печатает разницу по режимам
+    monkeypatch.setattr(sys, 'argv', ['qr_benchmark', '--corpus', str(corpus), '--modes', 'single',
+                                      '--compare', str(report)])
+    capsys.readouterr()
+    qr_benchmark.main()
+    assert 'single' in capsys.readouterr().out
@@ -0,0 +1,58 @@
+import io
+import json
+import random
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+from benchmarks.qr_corpus import render_label, render_photo
+from app import Product
+from qr_decoder import decode_qr, decode_qr_multi, decode_path
+from conftest import product_payload, qr_png
+def test_decode_accepts_bytes_files_images_and_arrays():
+    payload = product_payload('A-1')
+    png = qr_png(payload)
+    array = cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_GRAYSCALE)
+    for source in (png, io.BytesIO(png), Image.open(io.BytesIO(png)), array, cv2.cvtColor(array, cv2.COLOR_GRAY2BGR)):
+        result = decode_qr(source)
+        assert (result.data, result.stage) == (payload, 'reduced')
+def test_small_code_in_large_photo_uses_full_resolution():
+    payload = product_payload('A-2')
+    # Модуль кода в 3 пикселя: на уменьшенном до 1024 изображении код не читается
+    photo = np.full((3000, 4000), 160, np.uint8)
+    label = render_label(payload, 3)
+    photo[1400:1400 + label.shape[0], 1900:1900 + label.shape[1]] = label
+    ok, jpeg = cv2.imencode('.jpg', photo, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    result = decode_qr(jpeg.tobytes())
+    assert result.data == payload and result.stage in ('roi', 'full')
+def test_no_code_and_broken_files(tmp_path):
+    ok, blank = cv2.imencode('.png', np.full((200, 200), 255, np.uint8))
+    assert decode_qr(blank.tobytes())[:2] == (None, None)
+    with pytest.raises(Exception):
+        decode_qr(b'not an image')
+    path = tmp_path / 'broken.png'
+    path.write_bytes(b'not an image')
+    outcome = decode_path(str(path))
+    assert outcome['data'] is None and outcome['error']
+def pallet_photo(seed=3):
+    photo, payloads, _ = render_photo(random.Random(seed), 'multi')
+    ok, jpeg = cv2.imencode('.jpg', photo, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return jpeg.tobytes(), payloads
+def test_multi_finds_every_label_on_pallet_photo():
+    photo, payloads = pallet_photo()
+    result = decode_qr_multi(photo)
+    assert sorted(code.data for code in result.codes) == sorted(payloads)
+    assert all(len(code.points) == 4 for code in result.codes)
+    # Один код: тот же результат, что у decode_qr
+    assert [code.data for code in decode_qr_multi(qr_png('ONE')).codes] == ['ONE']
+def test_upload_multi_returns_and_adds_every_code(app, worker):
+    photo, payloads = pallet_photo()
+    body = worker.post('/upload_qr', data={'file': (io.BytesIO(photo), 'pallet.jpg'), 'multi': '1'}).get_json()
+    assert body['success'] and sorted(code['qr_content'] for code in body['codes']) == sorted(payloads)
+    assert body['codes'][0]['product'] == json.loads(body['codes'][0]['qr_content'])
+    worker.post('/upload', data={'file': (io.BytesIO(photo), 'pallet.jpg'), 'multi': '1'})
+    with app.app_context():
+        products = Product.query.all()
+        assert sorted(p.qr_content for p in products) == sorted(payloads)
+        # Все товары снимка ссылаются на одно сохраненное изображение
+        assert len({p.image_hash for p in products}) == 1 and products[0].image_hash
@@ -0,0 +1,39 @@
+import app as app_module
+from conftest import add_products, login_client, product_payload
+def query_count(client, url, endpoint):
+    before = app_module.db_queries.value(endpoint=endpoint)
+    assert client.get(url).status_code == 200
+    return app_module.db_queries.value(endpoint=endpoint) - before
+PAGES = [
+    ('owner', '/get_products', 'get_products'),
+    ('owner', '/api/owner_requests', 'api_owner_requests'),
+    ('customer', '/api/customer_requests', 'api_customer_requests'),
+    ('customer', '/customer_products', 'customer_products'),
+    ('owner', '/owner_products', 'owner_products'),
+    ('worker', '/all_shelves', 'all_shelves'),
+]
+def fill(app, clients, count):
+    """count товаров на полках разных работников и заявки на них от разных заказчиков"""
+    for n in range(count):
+        worker = login_client(app, f'w{count}-{n}@acme', 'worker')
+        shelf = worker.post('/add_shelf', data={'name': f'S{n}'}).get_json()['shelf_id']
+        product_id, = add_products(worker, [product_payload(f'{count}-{n}')], shelf_id=shelf)
+        clients['customer'].post(f'/create_request/{product_id}')
+        login_client(app, f'c{count}-{n}@acme', 'customer').post(f'/create_request/{product_id}')
+    add_products(clients['worker'], [product_payload(f'{count}-w{n}') for n in range(count)])
+def test_list_queries_do_not_grow_with_rows(app, owner, worker, customer):
+    clients = {'owner': owner, 'worker': worker, 'customer': customer}
+    fill(app, clients, 2)
+    # Фрагменты страниц кэшируются: сравниваем отрисовку с нуля, с одинаково пустым кэшем пользователей
+    app_module.fragment_memory_cache.clear()
+    app_module.identity_cache.clear()
+    app.config['FRAGMENT_CACHE_PATH'], path = None, app.config['FRAGMENT_CACHE_PATH']
+    try:
+        small = [query_count(clients[role], url, endpoint) for role, url, endpoint in PAGES]
+        fill(app, clients, 12)
+        app_module.fragment_memory_cache.clear()
+        app_module.identity_cache.clear()
+        large = [query_count(clients[role], url, endpoint) for role, url, endpoint in PAGES]
+    finally:
+        app.config['FRAGMENT_CACHE_PATH'] = path
+    assert large == small
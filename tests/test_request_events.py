@@ -0,0 +1,58 @@
+import json
+import pytest
+import app as app_module
+from conftest import add_products, login_client, product_payload
+@pytest.fixture(autouse=True)
+def short_streams(app):
+    # Поток закрывается сам, и тестовый клиент может прочитать ответ целиком
+    saved = {name: app.config[name] for name in ('SSE_MAX_DURATION', 'SSE_POLL_INTERVAL')}
+    app.config.update(SSE_MAX_DURATION=0.2, SSE_POLL_INTERVAL=0.05)
+    yield
+    app.config.update(saved)
+def read_events(client, last_event_id=None):
+    headers = {'Last-Event-ID': str(last_event_id)} if last_event_id is not None else {}
+    response = client.get('/api/requests/stream', headers=headers)
+    assert response.mimetype == 'text/event-stream'
+    body = response.get_data(as_text=True)
+    # Как сервер после отправки ответа: закрытие освобождает место потока
+    response.close()
+    events = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'data' in fields:
+            events.append((int(fields['id']), json.loads(fields['data'])))
+    return events
+def test_reconnect_replays_missed_events(app, owner, worker, customer):
+    product_id, = add_products(worker, [product_payload('A-1')])
+    # Новое подключение без Last-Event-ID получает только будущие события
+    assert read_events(owner) == []
+    customer.post(f'/create_request/{product_id}')
+    events = read_events(owner, 0)
+    assert [event['kind'] for _, event in events] == ['created']
+    request_id = events[0][1]['request']['id']
+    owner.post(f'/update_request_status/{request_id}', json={'status': 'В работе'})
+    replayed = read_events(owner, events[-1][0])
+    assert [(event['kind'], event['request']['status']) for _, event in replayed] == [('updated', 'in-progress')]
+def test_customer_sees_only_own_events(app, worker, customer):
+    product_id, = add_products(worker, [product_payload('A-1')])
+    other = login_client(app, 'other@acme', 'customer')
+    other.post(f'/create_request/{product_id}')
+    customer.post(f'/create_request/{product_id}')
+    events = read_events(customer, 0)
+    assert len(events) == 1 and 'customer_email' not in events[0][1]['request']
+    assert worker.get('/api/requests/stream').status_code == 403
+def test_stream_limit_per_process(app, owner):
+    saved = app.config['SSE_MAX_STREAMS']
+    app.config['SSE_MAX_STREAMS'] = 1
+    try:
+        first = owner.get('/api/requests/stream', buffered=False)
+        assert first.status_code == 200
+        rejected = owner.get('/api/requests/stream')
+        assert rejected.status_code == 503 and rejected.headers['Retry-After'] == '3'
+        assert rejected.get_data(as_text=True).startswith('retry: ')
+        # Закрытый поток освобождает место
+        first.close()
+        assert read_events(owner) == []
+    finally:
+        app.config['SSE_MAX_STREAMS'] = saved
+    assert app_module.sse_streams.active == 0
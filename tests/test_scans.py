@@ -0,0 +1,39 @@
+from app import Product
+from conftest import assert_stats_consistent, login_client, product_payload
+def post_scans(client, scans):
+    return client.post('/api/scans', json={'scans': scans})
+def test_resent_batch_creates_no_duplicates(app, worker):
+    shelf = worker.post('/add_shelf', data={'name': 'A1'}).get_json()['shelf_id']
+    batch = [{'key': 'k1', 'qr_content': product_payload('A-1'), 'shelf_id': shelf},
+             {'key': 'k2', 'qr_content': product_payload('A-2')},
+             {'key': 'k2', 'qr_content': product_payload('A-2')}]
+    first = post_scans(worker, batch).get_json()
+    assert first['created'] == ['k1', 'k2'] and first['duplicates'] == []
+    # Ответ потерялся, клиент отправляет пакет еще раз вместе с новым сканированием
+    again = post_scans(worker, batch + [{'key': 'k3', 'qr_content': product_payload('A-3')}]).get_json()
+    assert again['created'] == ['k3'] and again['duplicates'] == ['k1', 'k2']
+    with app.app_context():
+        assert sorted((p.scan_key, p.shelf_id) for p in Product.query) == [('k1', shelf), ('k2', None), ('k3', None)]
+    assert_stats_consistent(app)
+def test_invalid_scans_are_rejected_individually(app, worker):
+    other = login_client(app, 'other@acme', 'worker')
+    foreign_shelf = other.post('/add_shelf', data={'name': 'B1'}).get_json()['shelf_id']
+    data = post_scans(worker, [{'key': 'ok', 'qr_content': 'PLAIN'},
+                               {'key': 'shelf', 'qr_content': 'PLAIN', 'shelf_id': foreign_shelf},
+                               {'key': 'empty', 'qr_content': ''},
+                               'not an object']).get_json()
+    assert data['created'] == ['ok']
+    assert [item['key'] for item in data['rejected']] == ['empty', None, 'shelf']
+def test_whole_batch_rejections(app, worker, customer):
+    assert post_scans(worker, []).status_code == 400
+    app.config['SCAN_BATCH_MAX'], limit = 2, app.config['SCAN_BATCH_MAX']
+    try:
+        response = post_scans(worker, [{'key': str(i), 'qr_content': 'X'} for i in range(3)])
+    finally:
+        app.config['SCAN_BATCH_MAX'] = limit
+    assert response.status_code == 400
+    assert post_scans(customer, [{'key': 'k', 'qr_content': 'X'}]).status_code == 403
+def test_expired_session_response_has_no_created(client):
+    # Страница сканера по этому ответу просит войти заново, а не считает пакет отправленным
+    response = post_scans(client, [{'key': 'k', 'qr_content': 'X'}])
+    assert response.status_code == 200 and 'created' not in response.get_json()
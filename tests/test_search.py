@@ -0,0 +1,25 @@
+import json
+from conftest import add_products, login_client
+def product(article, name):
+    return json.dumps({'article': article, 'name': name, 'price': '10'}, ensure_ascii=False)
+def search(client, query, **params):
+    return client.get('/api/search_products', query_string=dict(params, q=query)).get_json()
+def test_short_tokens_narrow_search(worker, customer):
+    add_products(worker, [product(f'ART-{i}', f'Name {i}') for i in range(1, 6)])
+    assert search(customer, 'Name')['total'] == 5
+    result = search(customer, 'Name 4')
+    assert result['total'] == 1
+    assert json.loads(result['items'][0]['qr_content'])['name'] == 'Name 4'
+def test_query_shorter_than_trigram(worker, customer):
+    add_products(worker, [product('AB-1', 'Болт M8'), product('CD-2', 'Гайка M6')])
+    result = search(customer, 'M8')
+    assert [json.loads(item['qr_content'])['article'] for item in result['items']] == ['AB-1']
+def test_suggest_keeps_short_tokens(worker, customer):
+    add_products(worker, [product(f'ART-{i}', f'Name {i}') for i in range(1, 6)] + [product('ART-4', 'Name 4')])
+    items = search(customer, 'Name 4', mode='prefix')['items']
+    assert items == [{'article': 'ART-4', 'name': 'Name 4', 'quantity': 2}]
+    assert len(search(customer, 'AR', mode='prefix')['items']) == 5
+def test_search_is_company_scoped(app, worker, customer):
+    other = login_client(app, 'worker@other', 'worker', domain='other')
+    add_products(other, [product('ART-1', 'Name 1')])
+    assert search(customer, 'Name')['total'] == 0
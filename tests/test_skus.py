@@ -0,0 +1,40 @@
+import json
+from app import db, Product, Sku, sku_fields, backfill_skus
+from conftest import add_products, login_client, product_payload
+def test_equivalent_labels_share_sku(app, worker):
+    same = ['{"article": "A-1", "name": "Bolt", "price": "5"}', '{"price":"5","name":" Bolt ","article":"A-1"}']
+    ids = add_products(worker, same + [product_payload('A-2'), 'PLAIN-3'])
+    with app.app_context():
+        skus = [db.session.get(Product, product_id).sku_id for product_id in ids]
+        assert skus[0] == skus[1] and len(set(skus)) == 3
+        plain = db.session.get(Sku, skus[3])
+        assert (plain.article, plain.name, plain.price) == ('PLAIN-3', 'Товар (QR: PLAIN-3)', '0')
+    assert sku_fields('42').article == '42'
+    assert sku_fields(json.dumps({'article': 7})).article == '7'
+def test_sku_stock_groups_by_shelf(app, worker, customer):
+    shelf = worker.post('/add_shelf', data={'name': 'A1'}).get_json()['shelf_id']
+    add_products(worker, [product_payload('A-1')] * 3, shelf_id=shelf)
+    first = add_products(worker, [product_payload('A-1'), product_payload('A-2')])[0]
+    stock = customer.get('/api/sku_stock').get_json()
+    assert [(item['article'], item['shelf'] and item['shelf']['name'], item['quantity']) for item in stock] == \
+        [('A-1', None, 1), ('A-1', 'A1', 3), ('A-2', None, 1)]
+    unshelved = customer.get('/api/sku_stock', query_string={'shelf_id': 'none'}).get_json()
+    assert [item['product_id'] for item in unshelved if item['article'] == 'A-1'] == [first]
+    assert customer.get('/api/sku_stock', query_string={'shelf_id': 'x'}).status_code == 400
+    # Работник видит только свои товары
+    other = login_client(app, 'worker2@acme', 'worker')
+    assert other.get('/api/sku_stock').get_json() == []
+def test_backfill_assigns_missing_skus(app, worker, customer):
+    ids = add_products(worker, [product_payload('A-1'), product_payload('A-1'), product_payload('A-2')])
+    with app.app_context():
+        expected = [db.session.get(Product, product_id).sku_id for product_id in ids]
+        db.session.execute(Product.__table__.update().values(sku_id=None))
+        db.session.commit()
+    assert customer.get('/api/sku_stock').get_json() == []
+    batches = []
+    with app.app_context():
+        assert backfill_skus(batch_size=2, progress=batches.append) == 3
+        assert batches == [2, 3]
+        assert [db.session.get(Product, product_id).sku_id for product_id in ids] == expected
+        assert backfill_skus() == 0
+    assert [item['quantity'] for item in customer.get('/api/sku_stock').get_json()] == [2, 1]
@@ -0,0 +1,46 @@
+import threading
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app import Product, db, commit_with_retry, is_transient_db_error
+from conftest import login_client, product_payload
+def locked(message='database is locked'):
+    return OperationalError('UPDATE product', {}, Exception(message))
+def test_connections_use_wal_and_busy_timeout(app):
+    with app.app_context():
+        assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert db.session.execute(text('PRAGMA busy_timeout')).scalar() == app.config['SQLITE_PRAGMAS']['busy_timeout']
+def test_commit_retries_transient_errors_only(app):
+    attempts = []
+    def work():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise locked()
+        return 'done'
+    with app.app_context():
+        assert commit_with_retry(work) == 'done' and len(attempts) == 3
+        attempts.clear()
+        def broken():
+            attempts.append(1)
+            raise locked('no such table: x')
+        with pytest.raises(OperationalError):
+            commit_with_retry(broken)
+        assert len(attempts) == 1
+    assert is_transient_db_error(locked('deadlock detected')) and not is_transient_db_error(locked('disk I/O error'))
+def test_concurrent_writers_do_not_fail(app):
+    clients = [login_client(app, f'worker{i}@acme', 'worker') for i in range(4)]
+    errors = []
+    def scan(client, i):
+        for batch in range(5):
+            response = client.post('/api/scans', json={'scans': [
+                {'key': f'{i}-{batch}-{n}', 'qr_content': product_payload(f'{i}-{batch}-{n}')} for n in range(20)]})
+            if response.status_code != 200 or len(response.get_json()['created']) != 20:
+                errors.append(response.get_data(as_text=True))
+    threads = [threading.Thread(target=scan, args=(client, i)) for i, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with app.app_context():
+        assert Product.query.count() == 4 * 5 * 20
@@ -0,0 +1,45 @@
+import os
+import runpy
+from app import Request, load_stats, rebuild_stats
+from conftest import add_products, assert_stats_consistent, product_payload, user_id
+def all_stats(app, customer_id, worker_id):
+    with app.app_context():
+        return [load_stats(1), load_stats(1, customer_id=customer_id), load_stats(1, user_id=worker_id)]
+def test_counters_follow_every_write(app, owner, worker, customer):
+    shelf = worker.post('/add_shelf', data={'name': 'A1'}).get_json()['shelf_id']
+    ids = add_products(worker, [product_payload('A-1'), product_payload('A-1'), product_payload('A-2')],
+                       shelf_id=shelf)
+    worker.post('/move_product_to_shelf', json={'product_id': ids[0], 'shelf_id': None})
+    worker.post('/update_product', json={'product_id': ids[1], 'qr_content': product_payload('A-3'), 'shelf_id': shelf})
+    worker.post(f'/delete_product/{ids[2]}')
+    customer.post(f'/create_request/{ids[0]}')
+    assert_stats_consistent(app)
+    stats = owner.get('/api/stats').get_json()
+    assert stats['total_products'] == 2 and stats['unique_products'] == 2
+    assert stats['products_without_shelf'] == 1 and stats['products_by_shelf'] == {str(shelf): 1}
+    assert stats['requests_by_status'] == {'new': 1} and stats['new_products_7d'] == 2
+def test_load_stats_same_before_and_after_rebuild(app, owner, worker, customer):
+    ids = add_products(worker, [product_payload('A-1'), product_payload('A-2')])
+    customer.post(f'/create_request/{ids[0]}')
+    customer.post(f'/create_request/{ids[1]}')
+    with app.app_context():
+        request_ids = [r.id for r in Request.query]
+    # Все заявки ушли из статуса new: его счетчик остался строкой со значением 0
+    for request_id in request_ids:
+        owner.post(f'/update_request_status/{request_id}', json={'status': 'Одобрена'})
+    customer_id, worker_id = user_id(app, 'customer@acme'), user_id(app, 'worker@acme')
+    incremental = all_stats(app, customer_id, worker_id)
+    assert incremental[0]['requests_by_status'] == {'completed': 2}
+    assert incremental[1]['my_requests_by_status'] == {'completed': 2}
+    with app.app_context():
+        rebuild_stats()
+    assert all_stats(app, customer_id, worker_id) == incremental
+def test_clear_db_script_keeps_counters_consistent(app, owner, worker, capsys):
+    shelf = worker.post('/add_shelf', data={'name': 'A1'}).get_json()['shelf_id']
+    add_products(worker, [product_payload('A-1'), product_payload('A-2')], shelf_id=shelf)
+    assert owner.get('/api/stats').get_json()['products_by_shelf'] == {str(shelf): 2}
+    runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'clear_db.py'))
+    stats = owner.get('/api/stats').get_json()
+    assert stats['products_by_shelf'] == {} and stats['products_without_shelf'] == 2
+    assert worker.get('/get_shelves').get_json() == []
+    assert_stats_consistent(app)
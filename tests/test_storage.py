@@ -0,0 +1,43 @@
+import hashlib
+import io
+import os
+from storage import LocalStorage, original_key, thumbnail_key
+from app import Product, get_storage
+from conftest import login_client, qr_png, user_id
+def test_same_content_is_stored_once(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    png = qr_png('STORED')
+    hashes = []
+    for _ in range(2):
+        with storage.receive(io.BytesIO(png)) as upload:
+            assert upload.size == len(png)
+            hashes.append(storage.keep(upload))
+    assert hashes == [hashlib.sha256(png).hexdigest()] * 2
+    with storage.open(original_key(hashes[0])) as f:
+        assert f.read() == png
+    assert storage.exists(thumbnail_key(hashes[0]))
+    # Временные файлы не остаются ни после сохранения, ни без него
+    with storage.receive(io.BytesIO(b'not kept')):
+        pass
+    assert os.listdir(storage.temp_dir()) == []
+def test_non_image_is_kept_without_thumbnail(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    with storage.receive(io.BytesIO(b'plain bytes')) as upload:
+        image_hash = storage.keep(upload)
+    assert storage.exists(original_key(image_hash)) and not storage.exists(thumbnail_key(image_hash))
+def test_uploaded_image_is_served_to_its_company_only(app, worker):
+    png = qr_png('IMAGE')
+    worker.post('/upload', data={'file': (io.BytesIO(png), 'a.png')})
+    with app.app_context():
+        product = Product.query.filter_by(user_id=user_id(app, 'worker@acme')).one()
+        assert product.image_hash == hashlib.sha256(png).hexdigest()
+        assert get_storage().exists(original_key(product.image_hash))
+    url = f'/images/{product.image_hash}'
+    response = worker.get(url)
+    assert response.data == png and response.mimetype == 'image/png'
+    assert 'immutable' in response.headers['Cache-Control'] and 'private' in response.headers['Cache-Control']
+    assert worker.get(url, headers={'If-None-Match': f'"{product.image_hash}"'}).status_code == 304
+    assert worker.get(url + '/thumb').mimetype == 'image/jpeg'
+    assert worker.get(url + '/large').status_code == 404
+    other = login_client(app, 'worker@other', 'worker', domain='other')
+    assert other.get(url).status_code == 404